@@ -1,15 +1,38 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
 import mysql.connector
 from mysql.connector import Error
 
-def obtener_conexion():
+from metricas import CursorMedido, CursorMedidoAsincrono, medir_conexion
+
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "user": os.environ.get("DB_USER", "root"),
+    "password": os.environ.get("DB_PASSWORD", "1234567"),  # Cambia si tienes contraseña
+    "database": os.environ.get("DB_NAME", "desarrollo_web"),
+    "port": int(os.environ.get("DB_PORT", "3306")),
+    # Sesión en UTC: el kardex y la API dan y reciben fechas UTC, sea cual sea la zona del servidor
+    "time_zone": "+00:00",
+}
+
+# Tamaño del pool por worker de gunicorn (cada proceso tiene su propio pool)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+# Segundos que una conexión puede quedar libre antes de descartarla
+POOL_MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", "300"))
+# Segundos máximos esperando una conexión libre
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+# Conexiones del pool de aiomysql del modo ASGI (asgi.py): una por consulta en curso, no por cliente conectado
+POOL_ASYNC_SIZE = int(os.environ.get("DB_POOL_ASYNC_SIZE", "20"))
+
+
+def _nueva_conexion():
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="1234567",  # Cambia si tienes contraseña
-            database="desarrollo_web",
-            port=3306
-        )
+        conn = mysql.connector.connect(**DB_CONFIG)
         if conn.is_connected():
             return conn
         else:
@@ -17,3 +40,250 @@ def obtener_conexion():
     except Error as e:
         print(f"Error al conectar a MySQL: {e}")
         raise
+
+
+class PoolConexiones:
+    def __init__(self, tamano=POOL_SIZE, max_idle=POOL_MAX_IDLE, timeout=POOL_TIMEOUT, fabrica=_nueva_conexion):
+        self.tamano = tamano
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._fabrica = fabrica
+        self._cond = threading.Condition()
+        self._iniciar_estado()
+
+    def _iniciar_estado(self):
+        self._pid = os.getpid()
+        self._libres = deque()  # (conexion, instante en que se devolvió)
+        self._en_uso = 0
+        self._en_espera = 0
+        self._esperas = 0
+        self._tiempo_espera_total = 0.0
+        self._tiempo_espera_max = 0.0
+        self._creadas = 0
+        self._descartadas = 0
+
+    def _verificar_proceso(self):
+        # Tras un fork (gunicorn) el hijo no debe reutilizar los sockets del padre
+        if self._pid != os.getpid():
+            self._iniciar_estado()
+
+    def _descartar(self, conn):
+        self._descartadas += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _sana(self, conn, devuelta):
+        if self.max_idle and time.monotonic() - devuelta > self.max_idle:
+            return False
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    def prestar(self):
+        inicio = time.monotonic()
+        esperado = False
+        with self._cond:
+            self._verificar_proceso()
+            while True:
+                while self._libres:
+                    conn, devuelta = self._libres.pop()
+                    if self._sana(conn, devuelta):
+                        self._en_uso += 1
+                        self._registrar_espera(inicio, esperado)
+                        return conn
+                    self._descartar(conn)
+                if self._en_uso < self.tamano:
+                    self._en_uso += 1
+                    break
+                restante = self.timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    raise Exception(f"No hay conexiones libres en el pool tras {self.timeout}s de espera.")
+                esperado = True
+                self._en_espera += 1
+                try:
+                    self._cond.wait(restante)
+                finally:
+                    self._en_espera -= 1
+        # La conexión nueva se abre fuera del lock para no bloquear al resto
+        try:
+            conn = self._fabrica()
+        except Exception:
+            with self._cond:
+                self._en_uso -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._creadas += 1
+            self._registrar_espera(inicio, esperado)
+        return conn
+
+    def _registrar_espera(self, inicio, esperado):
+        if not esperado:
+            return
+        espera = time.monotonic() - inicio
+        self._esperas += 1
+        self._tiempo_espera_total += espera
+        self._tiempo_espera_max = max(self._tiempo_espera_max, espera)
+
+    def devolver(self, conn, descartar=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                # Conexión heredada del proceso padre: no pertenece a este pool
+                return
+            self._en_uso -= 1
+            if not descartar:
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except Exception:
+                    descartar = True
+            if descartar:
+                self._descartar(conn)
+            else:
+                self._libres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def conexion(self):
+        conn = self.prestar()
+        try:
+            yield conn
+        except Error:
+            self.devolver(conn, descartar=True)
+            raise
+        except BaseException:
+            self.devolver(conn)
+            raise
+        else:
+            self.devolver(conn)
+
+    def cerrar(self):
+        with self._cond:
+            while self._libres:
+                conn, _ = self._libres.pop()
+                self._descartar(conn)
+
+    def estadisticas(self):
+        with self._cond:
+            self._verificar_proceso()
+            return {
+                "tamano": self.tamano,
+                "en_uso": self._en_uso,
+                "libres": len(self._libres),
+                "en_espera": self._en_espera,
+                "esperas": self._esperas,
+                "tiempo_espera_total": round(self._tiempo_espera_total, 6),
+                "tiempo_espera_max": round(self._tiempo_espera_max, 6),
+                "creadas": self._creadas,
+                "descartadas": self._descartadas,
+            }
+
+
+class ConexionPrestada:
+    """Envuelve una conexión del pool: close() la devuelve en lugar de cerrarla."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def cursor(self, *args, **kwargs):
+        return CursorMedido(self._conn.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.devolver(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # Red de seguridad para rutas de error que no llegan a llamar close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+pool = PoolConexiones()
+
+
+def obtener_conexion():
+    inicio = time.perf_counter()
+    conn = pool.prestar()
+    medir_conexion(time.perf_counter() - inicio)
+    return ConexionPrestada(pool, conn)
+
+
+class PoolAsincrono:
+    """Pool de aiomysql para el modo ASGI. Se crea con la primera consulta, ya dentro del bucle de eventos."""
+
+    def __init__(self, tamano=POOL_ASYNC_SIZE, max_idle=POOL_MAX_IDLE, timeout=POOL_TIMEOUT):
+        self.tamano = tamano
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._pool = None
+        self._lock = None
+
+    async def _obtener_pool(self):
+        if self._pool is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._pool is None:
+                    # Import diferido: el modo WSGI no necesita aiomysql instalado
+                    import aiomysql
+                    self._pool = await aiomysql.create_pool(
+                        minsize=0, maxsize=self.tamano, pool_recycle=int(self.max_idle) if self.max_idle else -1,
+                        host=DB_CONFIG["host"], port=DB_CONFIG["port"], user=DB_CONFIG["user"],
+                        password=DB_CONFIG["password"], db=DB_CONFIG["database"], autocommit=False,
+                        init_command=f"SET time_zone = '{DB_CONFIG['time_zone']}'",
+                    )
+        return self._pool
+
+    @asynccontextmanager
+    async def transaccion(self, diccionario=True):
+        import aiomysql
+        pool = await self._obtener_pool()
+        inicio = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise Exception(f"No hay conexiones libres en el pool asíncrono tras {self.timeout}s de espera.")
+        medir_conexion(time.perf_counter() - inicio)
+        cursor = CursorMedidoAsincrono(await conn.cursor(aiomysql.DictCursor if diccionario else aiomysql.Cursor))
+        try:
+            yield cursor
+            await conn.commit()
+        except BaseException:
+            try:
+                await conn.rollback()
+            except Exception:
+                conn.close()  # Conexión rota: el pool la descarta al devolverla
+            raise
+        finally:
+            await cursor.close()
+            pool.release(conn)
+
+    async def cerrar(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.close()
+            await pool.wait_closed()
+
+    def estadisticas(self):
+        if self._pool is None:
+            return {"tamano": self.tamano, "abiertas": 0, "libres": 0}
+        return {"tamano": self.tamano, "abiertas": self._pool.size, "libres": self._pool.freesize}
+
+
+pool_async = PoolAsincrono()
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeout
+from typing import Dict, Iterable, List, Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Método y coste de los hashes nuevos, en formato de werkzeug: "scrypt:32768:8:1", "pbkdf2:sha256:600000"...
+# Los ya guardados se comprueban con los parámetros con los que se crearon.
+HASH_METODO = os.environ.get("PASSWORD_HASH_METODO", "scrypt")
+HASH_HILOS = int(os.environ.get("HASH_HILOS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Hashes en curso o en cola como máximo; si no hay hueco en HASH_ESPERA_COLA segundos, se rechaza
+HASH_MAX_PENDIENTES = int(os.environ.get("HASH_MAX_PENDIENTES", str(4 * HASH_HILOS)))
+HASH_ESPERA_COLA = float(os.environ.get("HASH_ESPERA_COLA", "0.1"))
+HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", "10"))
+
+LOGIN_VENTANA = float(os.environ.get("LOGIN_VENTANA", "900"))
+LOGIN_MAX_POR_IP = int(os.environ.get("LOGIN_MAX_POR_IP", "50"))
+LOGIN_MAX_POR_EMAIL = int(os.environ.get("LOGIN_MAX_POR_EMAIL", "5"))
+# Con varios workers (o servidores en la misma máquina) los intentos se comparten en este SQLite
+LOGIN_INTENTOS_SQLITE = os.environ.get("LOGIN_INTENTOS_SQLITE")
+
+
+class HashSaturado(Exception):
+    """Hay demasiados hashes pendientes: mejor rechazar que hacer esperar a todos."""
+
+
+class EjecutorHash:
+    """Hilos dedicados a generar y comprobar contraseñas, con un máximo de trabajos pendientes.
+
+    scrypt y pbkdf2 de hashlib sueltan el GIL, así que los hilos de las peticiones que no
+    hacen login siguen atendiendo mientras tanto; y con la cola acotada, una ráfaga de
+    intentos no acapara la CPU del worker: lo que no encuentra hueco en espera_cola
+    segundos, o no termina en timeout segundos, se rechaza con HashSaturado.
+    """
+
+    def __init__(self, hilos: int = HASH_HILOS, max_pendientes: int = HASH_MAX_PENDIENTES,
+                 metodo: str = HASH_METODO, timeout: float = HASH_TIMEOUT, espera_cola: float = HASH_ESPERA_COLA):
+        self.hilos = hilos
+        self.max_pendientes = max_pendientes
+        self.espera_cola = espera_cola
+        self.metodo = metodo
+        self.timeout = timeout
+        self._huecos = threading.BoundedSemaphore(max_pendientes)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.hechos = 0
+        self.rechazados = 0
+        self.segundos = 0.0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Los hilos no sobreviven a un fork: cada worker de gunicorn crea los suyos
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.hilos, thread_name_prefix="hash")
+                self._pid = os.getpid()
+            return self._executor
+
+    def _medir(self, funcion, *args):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args)
+        finally:
+            with self._lock:
+                self.hechos += 1
+                self.segundos += time.perf_counter() - inicio
+
+    def _rechazar(self, motivo: str):
+        with self._lock:
+            self.rechazados += 1
+        raise HashSaturado(motivo)
+
+    def _ejecutar(self, funcion, *args):
+        if not self._huecos.acquire(timeout=self.espera_cola):
+            self._rechazar("Demasiadas comprobaciones de contraseña en curso")
+        try:
+            futuro = self._pool().submit(self._medir, funcion, *args)
+        except BaseException:
+            self._huecos.release()
+            raise
+        futuro.add_done_callback(lambda _: self._huecos.release())
+        try:
+            return futuro.result(self.timeout)
+        except FuturoTimeout:
+            # Un hash que tarda más de timeout es saturación: 503 como si no hubiera hueco
+            self._rechazar("La comprobación de contraseña tardó demasiado")
+
+    async def _ejecutar_async(self, funcion, *args):
+        # Modo ASGI: la espera por un hueco y por el resultado no bloquean el bucle de eventos
+        if not self._huecos.acquire(blocking=False) and not await asyncio.to_thread(self._huecos.acquire, timeout=self.espera_cola):
+            self._rechazar("Demasiadas comprobaciones de contraseña en curso")
+        try:
+            futuro = self._pool().submit(self._medir, funcion, *args)
+        except BaseException:
+            self._huecos.release()
+            raise
+        futuro.add_done_callback(lambda _: self._huecos.release())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(futuro), self.timeout)
+        except asyncio.TimeoutError:
+            self._rechazar("La comprobación de contraseña tardó demasiado")
+
+    def generar(self, password: str) -> str:
+        return self._ejecutar(generate_password_hash, password, self.metodo)
+
+    def comprobar(self, hash_guardado: str, password: str) -> bool:
+        return self._ejecutar(check_password_hash, hash_guardado, password)
+
+    async def comprobar_async(self, hash_guardado: str, password: str) -> bool:
+        return await self._ejecutar_async(check_password_hash, hash_guardado, password)
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            return {
+                "hilos": self.hilos,
+                "max_pendientes": self.max_pendientes,
+                "hechos": self.hechos,
+                "rechazados": self.rechazados,
+                "segundos": round(self.segundos, 3),
+                "media_ms": round(self.segundos / self.hechos * 1000, 2) if self.hechos else 0.0,
+            }
+
+
+class IntentosMemoria:
+    """Instantes de los intentos por clave, en memoria del proceso (LRU de max_claves)."""
+
+    def __init__(self, max_claves: int = 100_000, max_por_clave: int = 1000):
+        self.max_claves = max_claves
+        self.max_por_clave = max_por_clave
+        self._datos: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def instantes(self, clave: str, desde: float) -> List[float]:
+        with self._lock:
+            cola = self._datos.get(clave)
+            if cola is None:
+                return []
+            while cola and cola[0] <= desde:
+                cola.popleft()
+            if not cola:
+                del self._datos[clave]
+                return []
+            return list(cola)
+
+    def agregar(self, claves: Iterable[str], instante: float):
+        with self._lock:
+            for clave in claves:
+                cola = self._datos.get(clave)
+                if cola is None:
+                    cola = self._datos[clave] = deque(maxlen=self.max_por_clave)
+                cola.append(instante)
+                self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_claves:
+                self._datos.popitem(last=False)
+
+    def borrar(self, clave: str):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def purgar(self, desde: float):
+        with self._lock:
+            for clave in [c for c, cola in self._datos.items() if not cola or cola[-1] <= desde]:
+                del self._datos[clave]
+
+
+class IntentosSQLite:
+    """Los mismos intentos en un archivo SQLite (WAL) que comparten todos los procesos."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conexion() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS intentos_login (clave TEXT NOT NULL, instante REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_intentos_login ON intentos_login (clave, instante)")
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def instantes(self, clave: str, desde: float) -> List[float]:
+        filas = self._conexion().execute(
+            "SELECT instante FROM intentos_login WHERE clave = ? AND instante > ? ORDER BY instante", (clave, desde)
+        ).fetchall()
+        return [fila[0] for fila in filas]
+
+    def agregar(self, claves: Iterable[str], instante: float):
+        with self._conexion() as conn:
+            conn.executemany("INSERT INTO intentos_login (clave, instante) VALUES (?, ?)",
+                             [(clave, instante) for clave in claves])
+
+    def borrar(self, clave: str):
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM intentos_login WHERE clave = ?", (clave,))
+
+    def purgar(self, desde: float):
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM intentos_login WHERE instante <= ?", (desde,))
+
+
+class LimitadorIntentos:
+    """Ventana deslizante de intentos por IP y por email.
+
+    Un intento se deja pasar mientras ni su IP ni su email acumulen el máximo en los
+    últimos `ventana` segundos. Se consulta antes de tocar la BD o el hash, así que
+    rechazar un intento no cuesta CPU. A la IP se le anota cada intento antes de calcular
+    el hash (también los que luego no caben en EjecutorHash); al email, solo las
+    contraseñas incorrectas, y un login correcto se las borra.
+    """
+
+    def __init__(self, ventana: float = LOGIN_VENTANA, max_por_ip: int = LOGIN_MAX_POR_IP,
+                 max_por_email: int = LOGIN_MAX_POR_EMAIL, almacen=None):
+        self.ventana = ventana
+        self.limites = {"ip": max_por_ip, "email": max_por_email}
+        self.almacen = almacen or IntentosMemoria(max_por_clave=max(max_por_ip, max_por_email))
+        self._proxima_purga = time.time() + ventana
+        self.rechazados = 0
+
+    @staticmethod
+    def _claves(ip: Optional[str], email: Optional[str]) -> Dict[str, str]:
+        claves = {}
+        if ip:
+            claves["ip"] = f"ip:{ip}"
+        if email:
+            claves["email"] = f"email:{email.strip().lower()}"
+        return claves
+
+    def espera(self, ip: Optional[str] = None, email: Optional[str] = None) -> float:
+        """Segundos hasta que se pueda volver a intentar (0 si se puede ya)."""
+        ahora = time.time()
+        espera = 0.0
+        for tipo, clave in self._claves(ip, email).items():
+            limite = self.limites[tipo]
+            if limite <= 0:
+                continue
+            instantes = self.almacen.instantes(clave, ahora - self.ventana)
+            if len(instantes) >= limite:
+                # Hasta que salga de la ventana el intento que deja el número por debajo del máximo
+                espera = max(espera, instantes[len(instantes) - limite] + self.ventana - ahora)
+        if espera > 0:
+            self.rechazados += 1
+        return espera
+
+    def intento(self, ip: Optional[str] = None, email: Optional[str] = None):
+        ahora = time.time()
+        self.almacen.agregar(self._claves(ip, email).values(), ahora)
+        if ahora >= self._proxima_purga:
+            self._proxima_purga = ahora + self.ventana
+            self.almacen.purgar(ahora - self.ventana)
+
+    def exito(self, email: str):
+        self.almacen.borrar(self._claves(None, email)["email"])
+
+
+def crear_limitador() -> LimitadorIntentos:
+    if LOGIN_INTENTOS_SQLITE:
+        return LimitadorIntentos(almacen=IntentosSQLite(LOGIN_INTENTOS_SQLITE))
+    return LimitadorIntentos()
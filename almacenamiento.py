@@ -0,0 +1,1101 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metricas import CursorMedido
+
+BACKENDS = ("mysql", "sqlite", "memoria")
+SQLITE_PATH = Path(__file__).parent / "inventario.db"
+
+COLUMNAS = "id_producto, nombre, precio, stock, IFNULL(imagen, '') AS imagen, revision"
+
+
+def _sin_zona(fecha: datetime) -> datetime:
+    # El kardex guarda fechas sin zona en UTC (MySQL con la sesión fijada en UTC en conexion.DB_CONFIG)
+    return fecha.astimezone(timezone.utc).replace(tzinfo=None) if fecha.tzinfo else fecha
+
+
+class AjusteRevertido(Exception):
+    """Uso interno: revierte un lote de ajustes de stock con alguna línea fallida."""
+
+
+class RepositorioProductos:
+    """Persistencia del catálogo que usa Inventario.
+
+    Todas las implementaciones comparten el esquema: tabla productos (id_producto,
+    nombre, precio, stock, imagen, revision, actualizado_en), el registro productos_cambios
+    (version, id_producto, operacion, creado_en) que usan los workers para sincronizarse y
+    el kardex: stock_movimientos (id, id_producto, delta, tipo, creado_en), de solo anexado,
+    con sus instantáneas periódicas en stock_instantaneas. Las filas se devuelven como dict
+    con las claves de Producto.from_row.
+    """
+
+    nombre = ""
+
+    def preparar(self):
+        raise NotImplementedError
+
+    def cargar(self) -> Tuple[int, Iterable[Dict]]:
+        """(versión del registro de cambios, todas las filas en orden de id).
+
+        Las filas pueden llegar como iterador por bloques: así la carga inicial no tiene
+        a la vez todas las filas y todo el catálogo en memoria.
+        """
+        raise NotImplementedError
+
+    def insertar(self, producto) -> int:
+        raise NotImplementedError
+
+    def actualizar(self, producto, revision: Optional[int] = None,
+                   stock_anterior: Optional[int] = None) -> Optional[Dict]:
+        """Reescribe el producto y devuelve la fila resultante, o None si no se aplicó.
+
+        Con revision solo se aplica si nadie lo ha modificado desde esa revisión y con
+        stock_anterior si el stock sigue siendo ese (bloqueo optimista). Si producto.stock
+        es None el stock no se toca: los ajustes relativos no cambian la revisión.
+        """
+        raise NotImplementedError
+
+    def escribir_pendientes(self, actualizaciones, bajas) -> List[int]:
+        """Aplica en una transacción lo acumulado por la escritura diferida.
+
+        actualizaciones es una lista de (producto, revision, stock_anterior) con las mismas
+        condiciones que actualizar; bajas, una lista de ids. Devuelve los ids cuya
+        actualización se rechazó porque el producto cambió o ya no existe.
+        """
+        raise NotImplementedError
+
+    def ajustar_stock(self, ajustes, todo_o_nada: bool = False) -> Tuple[Dict[int, int], List[Tuple[int, str]], Optional[int]]:
+        """Suma cada delta al stock con un UPDATE relativo, todo en una transacción.
+
+        ajustes es una lista de (id_producto, delta). Una línea falla si el producto no
+        existe o si el stock quedaría negativo. Devuelve (stock final de cada producto
+        ajustado, [(índice de la línea, motivo)], versión del registro de cambios de la
+        transacción). Con todo_o_nada una sola línea fallida revierte el lote entero.
+        """
+        raise NotImplementedError
+
+    def eliminar(self, id_producto: int) -> bool:
+        raise NotImplementedError
+
+    def guardar_lote(self, productos) -> List[int]:
+        raise NotImplementedError
+
+    def aplicar_operaciones(self, operaciones, todo_o_nada: bool = False) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+        """Aplica altas, modificaciones, bajas y ajustes de stock en una transacción, en orden.
+
+        operaciones es una lista de ("agregar", producto), ("actualizar", producto, revision,
+        stock_anterior), ("eliminar", id_producto) o ("ajustar", id_producto, delta), con las
+        mismas condiciones que insertar, actualizar, eliminar y ajustar_stock. Una operación
+        que no se puede aplicar (conflicto, no existe, stock insuficiente) se informa y el
+        resto sigue, salvo con todo_o_nada. Devuelve (id del producto de cada operación o
+        None si falló, [(índice, motivo)]).
+        """
+        raise NotImplementedError
+
+    def leer(self, ids) -> Dict[int, Optional[Dict]]:
+        raise NotImplementedError
+
+    def cambios_desde(self, version: int) -> Tuple[Optional[int], List[Dict]]:
+        """(versión mínima conservada, cambios con version > la indicada en orden).
+
+        Cada cambio es {"version", "id_producto", "operacion", "creado_en"}, con creado_en en
+        segundos desde epoch: la misma fecha para todos los workers (Last-Modified).
+        """
+        raise NotImplementedError
+
+    def purgar_cambios(self, conservar_horas: int = 24) -> int:
+        raise NotImplementedError
+
+    def iterar(self, lote: int = 1000) -> Iterator[Dict]:
+        raise NotImplementedError
+
+    def stock_en(self, id_producto: int, fecha: datetime) -> int:
+        """Stock del producto en esa fecha (incluida): la instantánea más reciente anterior
+        más los movimientos posteriores a ella. 0 si aún no existía o ya se había dado de baja.
+        """
+        raise NotImplementedError
+
+    def movimientos_stock(self, id_producto: int, desde: datetime, hasta: datetime,
+                          limite: Optional[int] = None) -> Tuple[int, List[Dict]]:
+        """(stock justo antes de desde, movimientos entre desde y hasta incluidas, en orden).
+
+        Cada movimiento es {"id", "creado_en", "delta", "tipo", "stock"} con el stock que
+        dejó. tipo: I alta, A ajuste relativo, U modificación, D baja, S saldo inicial (el
+        stock que ya había al crear el kardex).
+        """
+        raise NotImplementedError
+
+    def tomar_instantaneas(self, hasta: Optional[datetime] = None, retraso: float = 60) -> int:
+        """Guarda el stock de cada producto con movimientos desde la instantánea anterior.
+
+        Solo llega hasta los movimientos de hace más de retraso segundos (y hasta la fecha
+        hasta, si se indica): uno más reciente podría ser de una transacción aún abierta.
+        Devuelve cuántas instantáneas escribió.
+        """
+        raise NotImplementedError
+
+
+class RepositorioSQL(RepositorioProductos):
+    """Implementación común a MySQL y SQLite; las subclases aportan conexión y dialecto."""
+
+    SQL_UPSERT = ""
+    SQL_PURGAR = ""
+    # productos_cambios.creado_en en segundos desde epoch
+    SQL_EPOCH_CAMBIO = ""
+    # Último corte de instantáneas (bloqueado si el dialecto lo permite) y fecha de hace %s segundos
+    SQL_CORTE_ANTERIOR = ""
+    SQL_HACE_SEGUNDOS = ""
+    # Filas por INSERT de varias filas en guardar_lote (4 parámetros por fila: bajo el límite
+    # de 999 variables de las versiones antiguas de SQLite)
+    FILAS_POR_INSERT = 200
+
+    @contextmanager
+    def transaccion(self, escritura: bool = False):
+        raise NotImplementedError
+        yield
+
+    def _sql(self, sql: str) -> str:
+        return sql
+
+    def _crear_esquema(self, cursor):
+        raise NotImplementedError
+
+    def _filas(self, cursor) -> List[Dict]:
+        return cursor.fetchall()
+
+    def _ejecutar(self, cursor, sql, params=()):
+        cursor.execute(self._sql(sql), params)
+
+    def _todas(self, cursor, sql, params=()) -> List[Dict]:
+        self._ejecutar(cursor, sql, params)
+        return self._filas(cursor)
+
+    def _fecha(self, fecha: datetime):
+        return _sin_zona(fecha)
+
+    def _a_fecha(self, valor) -> datetime:
+        return valor
+
+    def _registrar_cambio(self, cursor, id_producto: int, operacion: str):
+        # operacion: 'I' alta, 'U' modificación, 'D' baja
+        self._ejecutar(cursor, "INSERT INTO productos_cambios (id_producto, operacion) VALUES (%s, %s)",
+                       (id_producto, operacion))
+
+    def preparar(self):
+        with self.transaccion(escritura=True) as cursor:
+            self._crear_esquema(cursor)
+
+    def cargar(self):
+        # La versión se lee antes que las filas: lo que cambie entre medias se vuelve a aplicar
+        with self.transaccion() as cursor:
+            version = self._todas(cursor, "SELECT IFNULL(MAX(version), 0) AS version FROM productos_cambios")[0]["version"]
+        return version, self.iterar(lote=5000)
+
+    def insertar(self, producto) -> int:
+        with self.transaccion(escritura=True) as cursor:
+            if producto.id_producto is not None:
+                self._ejecutar(cursor,
+                               "INSERT INTO productos (id_producto, nombre, precio, stock, imagen) VALUES (%s, %s, %s, %s, %s)",
+                               producto.to_tuple(include_id=True))
+                id_producto = producto.id_producto
+            else:
+                self._ejecutar(cursor, "INSERT INTO productos (nombre, precio, stock, imagen) VALUES (%s, %s, %s, %s)",
+                               producto.to_tuple(include_id=False))
+                id_producto = cursor.lastrowid
+            self._registrar_cambio(cursor, id_producto, "I")
+        return id_producto
+
+    @staticmethod
+    def _sql_actualizar(producto, revision, stock_anterior):
+        campos = ["nombre = %s", "precio = %s", "imagen = %s", "revision = revision + 1"]
+        valores = [producto.nombre, producto.precio, producto.imagen]
+        if producto.stock is not None:
+            campos.append("stock = %s")
+            valores.append(producto.stock)
+        condiciones = ["id_producto = %s"]
+        valores.append(producto.id_producto)
+        if revision is not None:
+            condiciones.append("revision = %s")
+            valores.append(revision)
+        if stock_anterior is not None:
+            condiciones.append("stock = %s")
+            valores.append(stock_anterior)
+        return f"UPDATE productos SET {', '.join(campos)} WHERE {' AND '.join(condiciones)}", tuple(valores)
+
+    def actualizar(self, producto, revision=None, stock_anterior=None):
+        with self.transaccion(escritura=True) as cursor:
+            self._ejecutar(cursor, *self._sql_actualizar(producto, revision, stock_anterior))
+            if cursor.rowcount == 0:
+                return None
+            self._registrar_cambio(cursor, producto.id_producto, "U")
+            return self._todas(cursor, f"SELECT {COLUMNAS} FROM productos WHERE id_producto = %s",
+                               (producto.id_producto,))[0]
+
+    def escribir_pendientes(self, actualizaciones, bajas):
+        rechazados, cambios = [], []
+        with self.transaccion(escritura=True) as cursor:
+            for producto, revision, stock_anterior in sorted(actualizaciones, key=lambda a: a[0].id_producto):
+                self._ejecutar(cursor, *self._sql_actualizar(producto, revision, stock_anterior))
+                if cursor.rowcount == 0:
+                    rechazados.append(producto.id_producto)
+                else:
+                    cambios.append((producto.id_producto, "U"))
+            if bajas:
+                cursor.executemany(self._sql("DELETE FROM productos WHERE id_producto = %s"), [(i,) for i in bajas])
+                cambios.extend((i, "D") for i in bajas)
+            if cambios:
+                cursor.executemany(self._sql("INSERT INTO productos_cambios (id_producto, operacion) VALUES (%s, %s)"),
+                                   cambios)
+        return rechazados
+
+    def ajustar_stock(self, ajustes, todo_o_nada=False):
+        # Se recorren por id (orden estable): dos lotes concurrentes bloquean las filas en el
+        # mismo orden y no pueden quedar en interbloqueo
+        orden = sorted(range(len(ajustes)), key=lambda i: ajustes[i][0])
+        fallidas: List[Tuple[int, str]] = []
+        try:
+            with self.transaccion(escritura=True) as cursor:
+                tocados = []
+                for i in orden:
+                    id_producto, delta = ajustes[i]
+                    self._ejecutar(cursor, """
+                        UPDATE productos SET stock = stock + %s
+                        WHERE id_producto = %s AND stock + %s >= 0
+                    """, (delta, id_producto, delta))
+                    if cursor.rowcount > 0:
+                        tocados.append(id_producto)
+                        continue
+                    existe = self._todas(cursor, "SELECT stock FROM productos WHERE id_producto = %s", (id_producto,))
+                    fallidas.append((i, "stock insuficiente" if existe else "no existe"))
+                if todo_o_nada and fallidas:
+                    raise AjusteRevertido()
+                if not tocados:
+                    return {}, sorted(fallidas), None
+                ids = list(dict.fromkeys(tocados))
+                # La versión de la transacción ordena los resultados de lotes concurrentes sobre
+                # un mismo producto: quien bloquea la fila después inserta aquí después
+                self._registrar_cambio(cursor, ids[0], "U")
+                version = cursor.lastrowid
+                if len(ids) > 1:
+                    cursor.executemany(self._sql("INSERT INTO productos_cambios (id_producto, operacion) VALUES (%s, %s)"),
+                                       [(i, "U") for i in ids[1:]])
+                marcadores = ", ".join(["%s"] * len(ids))
+                stock = {
+                    fila["id_producto"]: fila["stock"]
+                    for fila in self._todas(cursor, f"SELECT id_producto, stock FROM productos WHERE id_producto IN ({marcadores})",
+                                            tuple(ids))
+                }
+        except AjusteRevertido:
+            return {}, sorted(fallidas), None
+        return stock, sorted(fallidas), version
+
+    def eliminar(self, id_producto: int) -> bool:
+        with self.transaccion(escritura=True) as cursor:
+            self._ejecutar(cursor, "DELETE FROM productos WHERE id_producto = %s", (id_producto,))
+            borrado = cursor.rowcount > 0
+            self._registrar_cambio(cursor, id_producto, "D")
+        return borrado
+
+    def _insertar_varios(self, cursor, filas) -> List[int]:
+        """Inserta filas (nombre, precio, stock, imagen) en un solo INSERT; devuelve sus ids en orden."""
+        raise NotImplementedError
+
+    def guardar_lote(self, productos) -> List[int]:
+        # Los que traen id van en un único executemany (upsert); los que no, en INSERT de varias
+        # filas por bloques. En productos_cambios cada fila nueva queda como alta ('I')
+        with self.transaccion(escritura=True) as cursor:
+            con_id = [p.to_tuple(include_id=True) for p in productos if p.id_producto is not None]
+            existentes = set()
+            for desde in range(0, len(con_id), self.FILAS_POR_INSERT):
+                bloque = [fila[0] for fila in con_id[desde:desde + self.FILAS_POR_INSERT]]
+                marcadores = ", ".join(["%s"] * len(bloque))
+                existentes.update(f["id_producto"] for f in self._todas(
+                    cursor, f"SELECT id_producto FROM productos WHERE id_producto IN ({marcadores})", tuple(bloque)))
+            if con_id:
+                cursor.executemany(self._sql(self.SQL_UPSERT), con_id)
+            nuevos = [p for p in productos if p.id_producto is None]
+            for desde in range(0, len(nuevos), self.FILAS_POR_INSERT):
+                bloque = nuevos[desde:desde + self.FILAS_POR_INSERT]
+                for producto, id_producto in zip(bloque, self._insertar_varios(cursor, [p.to_tuple(include_id=False) for p in bloque])):
+                    producto.id_producto = id_producto
+            ids = list(dict.fromkeys(p.id_producto for p in productos))
+            cursor.executemany(self._sql("INSERT INTO productos_cambios (id_producto, operacion) VALUES (%s, %s)"),
+                               [(i, "U" if i in existentes else "I") for i in ids])
+        return ids
+
+    def aplicar_operaciones(self, operaciones, todo_o_nada=False):
+        # En el orden recibido (una alta puede ir seguida de un ajuste del mismo producto)
+        ids: List[Optional[int]] = [None] * len(operaciones)
+        fallidas: List[Tuple[int, str]] = []
+        try:
+            with self.transaccion(escritura=True) as cursor:
+                cambios = []
+                for i, (tipo, *datos) in enumerate(operaciones):
+                    motivo = None
+                    if tipo == "agregar":
+                        producto, = datos
+                        if producto.id_producto is not None:
+                            self._ejecutar(cursor, "INSERT INTO productos (id_producto, nombre, precio, stock, imagen) "
+                                                   "VALUES (%s, %s, %s, %s, %s)", producto.to_tuple(include_id=True))
+                            ids[i] = producto.id_producto
+                        else:
+                            self._ejecutar(cursor, "INSERT INTO productos (nombre, precio, stock, imagen) VALUES (%s, %s, %s, %s)",
+                                           producto.to_tuple(include_id=False))
+                            ids[i] = cursor.lastrowid
+                        cambios.append((ids[i], "I"))
+                        continue
+                    if tipo == "actualizar":
+                        producto, revision, stock_anterior = datos
+                        self._ejecutar(cursor, *self._sql_actualizar(producto, revision, stock_anterior))
+                        id_producto, operacion, motivo = producto.id_producto, "U", "conflicto"
+                    elif tipo == "eliminar":
+                        id_producto, = datos
+                        self._ejecutar(cursor, "DELETE FROM productos WHERE id_producto = %s", (id_producto,))
+                        operacion, motivo = "D", "no existe"
+                    elif tipo == "ajustar":
+                        id_producto, delta = datos
+                        self._ejecutar(cursor, """
+                            UPDATE productos SET stock = stock + %s
+                            WHERE id_producto = %s AND stock + %s >= 0
+                        """, (delta, id_producto, delta))
+                        operacion = "U"
+                        if cursor.rowcount == 0:
+                            # Tras el SELECT, rowcount sería el de filas leídas (1 en mysql-connector)
+                            existe = self._todas(cursor, "SELECT stock FROM productos WHERE id_producto = %s", (id_producto,))
+                            fallidas.append((i, "stock insuficiente" if existe else "no existe"))
+                            continue
+                    else:
+                        raise ValueError(f"Operación desconocida: {tipo!r}")
+                    if cursor.rowcount > 0:
+                        ids[i] = id_producto
+                        cambios.append((id_producto, operacion))
+                    else:
+                        fallidas.append((i, motivo))
+                if todo_o_nada and fallidas:
+                    raise AjusteRevertido()
+                if cambios:
+                    cursor.executemany(self._sql("INSERT INTO productos_cambios (id_producto, operacion) VALUES (%s, %s)"),
+                                       cambios)
+        except AjusteRevertido:
+            return [None] * len(operaciones), fallidas
+        return ids, fallidas
+
+    def leer(self, ids) -> Dict[int, Optional[Dict]]:
+        leidos: Dict[int, Optional[Dict]] = dict.fromkeys(ids)
+        ids = list(leidos)
+        with self.transaccion() as cursor:
+            for inicio in range(0, len(ids), 500):
+                lote = ids[inicio:inicio + 500]
+                marcadores = ", ".join(["%s"] * len(lote))
+                for fila in self._todas(cursor, f"SELECT {COLUMNAS} FROM productos WHERE id_producto IN ({marcadores})",
+                                        tuple(lote)):
+                    leidos[fila["id_producto"]] = fila
+        return leidos
+
+    def cambios_desde(self, version: int):
+        with self.transaccion() as cursor:
+            minima = self._todas(cursor, "SELECT MIN(version) AS minima FROM productos_cambios")[0]["minima"]
+            cambios = self._todas(cursor, f"""
+                SELECT version, id_producto, operacion, {self.SQL_EPOCH_CAMBIO} AS creado_en
+                FROM productos_cambios
+                WHERE version > %s
+                ORDER BY version
+            """, (version,))
+        return minima, cambios
+
+    def purgar_cambios(self, conservar_horas: int = 24) -> int:
+        with self.transaccion(escritura=True) as cursor:
+            self._ejecutar(cursor, self.SQL_PURGAR, (conservar_horas,))
+            return cursor.rowcount
+
+    def iterar(self, lote: int = 1000) -> Iterator[Dict]:
+        # Recorre la tabla por id en bloques (keyset); la conexión se libera entre bloques
+        ultimo = 0
+        while True:
+            with self.transaccion() as cursor:
+                filas = self._todas(cursor, f"""
+                    SELECT {COLUMNAS}
+                    FROM productos
+                    WHERE id_producto > %s
+                    ORDER BY id_producto
+                    LIMIT %s
+                """, (ultimo, lote))
+            yield from filas
+            if len(filas) < lote:
+                return
+            ultimo = filas[-1]["id_producto"]
+
+    def _stock_en(self, cursor, id_producto: int, fecha, incluida: bool = True) -> int:
+        # Instantánea más reciente hasta la fecha y, encima, los movimientos que no recoge
+        hasta = "<=" if incluida else "<"
+        instantanea = self._todas(cursor, f"""
+            SELECT fecha, hasta_movimiento, stock
+            FROM stock_instantaneas
+            WHERE id_producto = %s AND fecha {hasta} %s
+            ORDER BY fecha DESC, hasta_movimiento DESC
+            LIMIT 1
+        """, (id_producto, fecha))
+        condiciones, params = [f"creado_en {hasta} %s"], [id_producto, fecha]
+        base = 0
+        if instantanea:
+            base = instantanea[0]["stock"]
+            condiciones += ["creado_en >= %s", "id > %s"]
+            params += [instantanea[0]["fecha"], instantanea[0]["hasta_movimiento"]]
+        resto = self._todas(cursor, f"""
+            SELECT IFNULL(SUM(delta), 0) AS stock
+            FROM stock_movimientos
+            WHERE id_producto = %s AND {' AND '.join(condiciones)}
+        """, tuple(params))[0]["stock"]
+        return int(base + resto)
+
+    def stock_en(self, id_producto: int, fecha: datetime) -> int:
+        with self.transaccion() as cursor:
+            return self._stock_en(cursor, id_producto, self._fecha(fecha))
+
+    def movimientos_stock(self, id_producto, desde, hasta, limite=None):
+        with self.transaccion() as cursor:
+            inicial = self._stock_en(cursor, id_producto, self._fecha(desde), incluida=False)
+            movimientos = self._todas(cursor, f"""
+                SELECT id, creado_en, delta, tipo
+                FROM stock_movimientos
+                WHERE id_producto = %s AND creado_en >= %s AND creado_en <= %s
+                ORDER BY creado_en, id
+                {"LIMIT %s" if limite else ""}
+            """, (id_producto, self._fecha(desde), self._fecha(hasta)) + ((limite,) if limite else ()))
+        stock = inicial
+        for movimiento in movimientos:
+            stock += movimiento["delta"]
+            movimiento["stock"] = stock
+            movimiento["creado_en"] = self._a_fecha(movimiento["creado_en"])
+        return inicial, movimientos
+
+    def tomar_instantaneas(self, hasta=None, retraso=60):
+        with self.transaccion(escritura=True) as cursor:
+            anterior = self._todas(cursor, self.SQL_CORTE_ANTERIOR)[0]["corte"]
+            # Se corta antes del primer movimiento demasiado reciente (o posterior a hasta): se
+            # recorre por id desde el corte anterior, sin necesitar un índice por fecha
+            condiciones, params = [f"creado_en > {self.SQL_HACE_SEGUNDOS}"], [anterior, retraso]
+            if hasta is not None:
+                condiciones.append("creado_en > %s")
+                params.append(self._fecha(hasta))
+            primero = self._todas(cursor, f"""
+                SELECT id FROM stock_movimientos
+                WHERE id > %s AND ({' OR '.join(condiciones)})
+                ORDER BY id
+                LIMIT 1
+            """, tuple(params))
+            if primero:
+                corte = primero[0]["id"] - 1
+            else:
+                corte = self._todas(cursor, "SELECT IFNULL(MAX(id), 0) AS corte FROM stock_movimientos")[0]["corte"]
+            if corte <= anterior:
+                return 0
+            self._ejecutar(cursor, """
+                INSERT INTO stock_instantaneas (id_producto, fecha, hasta_movimiento, stock)
+                SELECT m.id_producto, MAX(m.creado_en), MAX(m.id), SUM(m.delta) + IFNULL((
+                    SELECT i.stock FROM stock_instantaneas i
+                    WHERE i.id_producto = m.id_producto
+                    ORDER BY i.fecha DESC, i.hasta_movimiento DESC
+                    LIMIT 1
+                ), 0)
+                FROM stock_movimientos m
+                WHERE m.id > %s AND m.id <= %s
+                GROUP BY m.id_producto
+            """, (anterior, corte))
+            escritas = cursor.rowcount
+            self._ejecutar(cursor, "INSERT INTO stock_cortes (corte) VALUES (%s)", (corte,))
+        return escritas
+
+
+class RepositorioMySQL(RepositorioSQL):
+    nombre = "mysql"
+    SQL_UPSERT = """
+        INSERT INTO productos (id_producto, nombre, precio, stock, imagen)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE nombre = VALUES(nombre), precio = VALUES(precio),
+            stock = VALUES(stock), imagen = VALUES(imagen), revision = revision + 1
+    """
+    SQL_PURGAR = "DELETE FROM productos_cambios WHERE creado_en < NOW() - INTERVAL %s HOUR"
+    SQL_EPOCH_CAMBIO = "UNIX_TIMESTAMP(creado_en)"
+    SQL_CORTE_ANTERIOR = "SELECT IFNULL(MAX(corte), 0) AS corte FROM stock_cortes FOR UPDATE"
+    SQL_HACE_SEGUNDOS = "SYSDATE(3) - INTERVAL ROUND(%s * 1000000) MICROSECOND"
+    # Los disparadores usan SYSDATE (la hora al ejecutarse, no al empezar la sentencia): con
+    # la fila de productos bloqueada, el orden por fecha de un producto es el de sus ids.
+    # Las columnas son TIMESTAMP, así que se guardan en UTC desde cualquier sesión (también la
+    # de otro cliente en hora local); el repositorio las lee en UTC porque fija así su sesión
+    DISPARADORES_KARDEX = {
+        "stock_movimiento_alta": """
+            AFTER INSERT ON productos FOR EACH ROW
+            INSERT INTO stock_movimientos (id_producto, delta, tipo, creado_en)
+            VALUES (NEW.id_producto, NEW.stock, 'I', SYSDATE(3))
+        """,
+        "stock_movimiento_cambio": """
+            AFTER UPDATE ON productos FOR EACH ROW
+            INSERT INTO stock_movimientos (id_producto, delta, tipo, creado_en)
+            SELECT NEW.id_producto, NEW.stock - OLD.stock, IF(NEW.revision = OLD.revision, 'A', 'U'), SYSDATE(3)
+            FROM DUAL WHERE NEW.stock <> OLD.stock
+        """,
+        "stock_movimiento_baja": """
+            AFTER DELETE ON productos FOR EACH ROW
+            INSERT INTO stock_movimientos (id_producto, delta, tipo, creado_en)
+            VALUES (OLD.id_producto, -OLD.stock, 'D', SYSDATE(3))
+        """,
+    }
+
+    def _insertar_varios(self, cursor, filas):
+        # LAST_INSERT_ID() es el id de la primera fila: InnoDB da ids consecutivos a un INSERT
+        # con el número de filas conocido (auto_increment_increment = 1)
+        marcadores = ", ".join(["(%s, %s, %s, %s)"] * len(filas))
+        cursor.execute(f"INSERT INTO productos (nombre, precio, stock, imagen) VALUES {marcadores}",
+                       [valor for fila in filas for valor in fila])
+        return list(range(cursor.lastrowid, cursor.lastrowid + cursor.rowcount))
+
+    @contextmanager
+    def transaccion(self, escritura: bool = False):
+        # Import diferido: los otros backends no necesitan mysql-connector instalado
+        from conexion.conexion import obtener_conexion
+        conn = obtener_conexion()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _crear_esquema(self, cursor):
+        cursor.execute("""
+            SELECT COUNT(*) AS n
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = 'productos'
+        """)
+        if cursor.fetchone()["n"] == 0:
+            cursor.execute("""
+                CREATE TABLE productos (
+                    id_producto INT AUTO_INCREMENT PRIMARY KEY,
+                    nombre VARCHAR(100) NOT NULL,
+                    precio DECIMAL(10, 2) NOT NULL,
+                    stock INT NOT NULL,
+                    imagen VARCHAR(100),
+                    revision INT NOT NULL DEFAULT 0,
+                    actualizado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+            """)
+            print("✅ Tabla 'productos' creada")
+
+        # Columnas añadidas después de la primera versión de la tabla
+        for columna, definicion in [
+            ("imagen", "VARCHAR(100)"),
+            ("revision", "INT NOT NULL DEFAULT 0"),
+            ("actualizado_en", "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+        ]:
+            cursor.execute("""
+                SELECT COUNT(*) AS n
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'productos'
+                AND COLUMN_NAME = %s
+            """, (columna,))
+            if cursor.fetchone()["n"] == 0:
+                cursor.execute(f"ALTER TABLE productos ADD COLUMN {columna} {definicion}")
+                print(f"✅ Columna '{columna}' añadida a la tabla 'productos'")
+
+        # Registro de cambios: cada worker aplica solo lo posterior a su última versión
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS productos_cambios (
+                version BIGINT AUTO_INCREMENT PRIMARY KEY,
+                id_producto INT NOT NULL,
+                operacion CHAR(1) NOT NULL,
+                creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_cambios_creado_en (creado_en)
+            )
+        """)
+        self._crear_kardex(cursor)
+
+    def _crear_kardex(self, cursor):
+        # Kardex: cada cambio de stock queda como movimiento, escrito por disparadores en la misma
+        # transacción que lo produce (también las escrituras diferidas, los upsert y el modo ASGI)
+        cursor.execute("""
+            SELECT COUNT(*) AS n
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = 'stock_movimientos'
+        """)
+        nuevo = cursor.fetchone()["n"] == 0
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_movimientos (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                id_producto INT NOT NULL,
+                delta INT NOT NULL,
+                tipo CHAR(1) NOT NULL,
+                creado_en TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+                INDEX idx_movimientos_producto (id_producto, creado_en)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_instantaneas (
+                id_producto INT NOT NULL,
+                fecha TIMESTAMP(3) NOT NULL,
+                hasta_movimiento BIGINT NOT NULL,
+                stock INT NOT NULL,
+                PRIMARY KEY (id_producto, fecha, hasta_movimiento)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_cortes (
+                corte BIGINT PRIMARY KEY,
+                creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        if nuevo:
+            # Saldo inicial: el stock que ya había antes de llevar el kardex
+            cursor.execute("INSERT INTO stock_movimientos (id_producto, delta, tipo) SELECT id_producto, stock, 'S' FROM productos")
+            print("✅ Tabla 'stock_movimientos' creada con el saldo inicial de cada producto")
+        for nombre, definicion in self.DISPARADORES_KARDEX.items():
+            cursor.execute("""
+                SELECT COUNT(*) AS n
+                FROM INFORMATION_SCHEMA.TRIGGERS
+                WHERE TRIGGER_SCHEMA = DATABASE()
+                AND TRIGGER_NAME = %s
+            """, (nombre,))
+            if cursor.fetchone()["n"] == 0:
+                cursor.execute(f"CREATE TRIGGER {nombre} {definicion}")
+
+
+class RepositorioSQLite(RepositorioSQL):
+    """SQLite en modo WAL: lectores y un escritor concurrentes, también entre procesos.
+
+    Una conexión por hilo (y por proceso: tras un fork se abre otra). sqlite3 reutiliza
+    las sentencias preparadas de su cache; las SQL se traducen a '?' una sola vez.
+    """
+
+    nombre = "sqlite"
+    SQL_UPSERT = """
+        INSERT INTO productos (id_producto, nombre, precio, stock, imagen)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT(id_producto) DO UPDATE SET nombre = excluded.nombre, precio = excluded.precio,
+            stock = excluded.stock, imagen = excluded.imagen, revision = productos.revision + 1
+    """
+    SQL_PURGAR = "DELETE FROM productos_cambios WHERE creado_en < datetime('now', printf('%d hours', -%s))"
+    SQL_EPOCH_CAMBIO = "CAST(ROUND((julianday(creado_en) - 2440587.5) * 86400) AS INTEGER)"
+    SQL_CORTE_ANTERIOR = "SELECT IFNULL(MAX(corte), 0) AS corte FROM stock_cortes"
+    SQL_HACE_SEGUNDOS = "strftime('%Y-%m-%d %H:%M:%f', 'now', printf('%.3f seconds', -%s))"
+    FORMATO_FECHA = "%Y-%m-%d %H:%M:%S.%f"
+
+    def __init__(self, path=None):
+        self.path = str(path or os.environ.get("INVENTARIO_SQLITE_PATH", SQLITE_PATH))
+        self._local = threading.local()
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=512, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _traducir(sql: str) -> str:
+        return sql.replace("%s", "?")
+
+    def _sql(self, sql: str) -> str:
+        return self._traducir(sql)
+
+    def _filas(self, cursor) -> List[Dict]:
+        return [dict(fila) for fila in cursor.fetchall()]
+
+    def _fecha(self, fecha: datetime) -> str:
+        # Mismo formato que strftime('%Y-%m-%d %H:%M:%f'): las fechas se comparan como texto
+        return _sin_zona(fecha).strftime(self.FORMATO_FECHA)[:-3]
+
+    def _a_fecha(self, valor) -> datetime:
+        return datetime.fromisoformat(valor)
+
+    def _insertar_varios(self, cursor, filas):
+        # RETURNING (SQLite 3.35) no garantiza el orden de las filas, pero los ids de un mismo
+        # INSERT crecen en el orden de VALUES
+        marcadores = ", ".join(["(%s, %s, %s, %s)"] * len(filas))
+        self._ejecutar(cursor, f"INSERT INTO productos (nombre, precio, stock, imagen) VALUES {marcadores} RETURNING id_producto",
+                       [valor for fila in filas for valor in fila])
+        return sorted(fila[0] for fila in cursor.fetchall())
+
+    @contextmanager
+    def transaccion(self, escritura: bool = False):
+        conn = self._conexion()
+        # IMMEDIATE toma el lock de escritura al empezar: evita el SQLITE_BUSY al "subir" de lector a escritor
+        conn.execute("BEGIN IMMEDIATE" if escritura else "BEGIN")
+        cursor = CursorMedido(conn.cursor())
+        try:
+            yield cursor
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.close()
+
+    def _crear_esquema(self, cursor):
+        columnas = {fila["name"] for fila in self._todas(cursor, "PRAGMA table_info(productos)")}
+        if "cantidad" in columnas and "stock" not in columnas:
+            # Esquema antiguo de la versión SQLite (id, nombre, cantidad, precio): se migra y se conserva
+            cursor.execute("ALTER TABLE productos RENAME TO productos_legacy")
+            columnas = set()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS productos (
+                id_producto INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre TEXT NOT NULL,
+                precio REAL NOT NULL,
+                stock INTEGER NOT NULL,
+                imagen TEXT,
+                revision INTEGER NOT NULL DEFAULT 0,
+                actualizado_en TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        if columnas and "revision" not in columnas:
+            cursor.execute("ALTER TABLE productos ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        if not columnas and self._todas(cursor, "SELECT name FROM sqlite_master WHERE name = 'productos_legacy'"):
+            cursor.execute("""
+                INSERT INTO productos (id_producto, nombre, precio, stock)
+                SELECT id, nombre, precio, cantidad FROM productos_legacy
+            """)
+            print("✅ Productos migrados desde el esquema SQLite antiguo (queda en 'productos_legacy')")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS productos_actualizado_en
+            AFTER UPDATE OF nombre, precio, stock, imagen, revision ON productos
+            BEGIN
+                UPDATE productos SET actualizado_en = CURRENT_TIMESTAMP WHERE id_producto = NEW.id_producto;
+            END
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS productos_cambios (
+                version INTEGER PRIMARY KEY AUTOINCREMENT,
+                id_producto INTEGER NOT NULL,
+                operacion TEXT NOT NULL,
+                creado_en TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cambios_creado_en ON productos_cambios (creado_en)")
+        self._crear_kardex(cursor)
+
+    def _crear_kardex(self, cursor):
+        # Kardex: cada cambio de stock queda como movimiento, escrito por disparadores en la misma
+        # transacción que lo produce (también las escrituras diferidas y los upsert)
+        nuevo = not self._todas(cursor, "SELECT name FROM sqlite_master WHERE name = 'stock_movimientos'")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_movimientos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                id_producto INTEGER NOT NULL,
+                delta INTEGER NOT NULL,
+                tipo TEXT NOT NULL,
+                creado_en TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_producto ON stock_movimientos (id_producto, creado_en)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_instantaneas (
+                id_producto INTEGER NOT NULL,
+                fecha TEXT NOT NULL,
+                hasta_movimiento INTEGER NOT NULL,
+                stock INTEGER NOT NULL,
+                PRIMARY KEY (id_producto, fecha, hasta_movimiento)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_cortes (
+                corte INTEGER PRIMARY KEY,
+                creado_en TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        if nuevo:
+            # Saldo inicial: el stock que ya había antes de llevar el kardex
+            cursor.execute("INSERT INTO stock_movimientos (id_producto, delta, tipo) SELECT id_producto, stock, 'S' FROM productos")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS stock_movimiento_alta
+            AFTER INSERT ON productos
+            BEGIN
+                INSERT INTO stock_movimientos (id_producto, delta, tipo) VALUES (NEW.id_producto, NEW.stock, 'I');
+            END
+        """)
+        # Sin cambio de revisión es un ajuste relativo (ajustar_stock); con él, una modificación
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS stock_movimiento_cambio
+            AFTER UPDATE OF stock ON productos
+            WHEN NEW.stock <> OLD.stock
+            BEGIN
+                INSERT INTO stock_movimientos (id_producto, delta, tipo)
+                VALUES (NEW.id_producto, NEW.stock - OLD.stock, CASE WHEN NEW.revision = OLD.revision THEN 'A' ELSE 'U' END);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS stock_movimiento_baja
+            AFTER DELETE ON productos
+            BEGIN
+                INSERT INTO stock_movimientos (id_producto, delta, tipo) VALUES (OLD.id_producto, -OLD.stock, 'D');
+            END
+        """)
+
+
+class RepositorioMemoria(RepositorioProductos):
+    """Sin base de datos: todo en memoria del proceso. Útil para pruebas y benchmarks."""
+
+    nombre = "memoria"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._filas: Dict[int, Dict] = {}
+        self._cambios: List[Dict] = []
+        self._siguiente_id = 1
+        self._siguiente_version = 1
+        # Kardex: el id de cada movimiento es su posición + 1
+        self._movimientos: List[Dict] = []
+        self._instantaneas: Dict[int, List[Dict]] = {}
+        self._corte = 0
+
+    def preparar(self):
+        pass
+
+    def _fila(self, producto, id_producto) -> Dict:
+        nombre, precio, stock, imagen = producto.to_tuple(include_id=False)
+        anterior = self._filas.get(id_producto)
+        return {"id_producto": id_producto, "nombre": nombre, "precio": precio, "stock": stock, "imagen": imagen or "",
+                "revision": anterior["revision"] + 1 if anterior else 0}
+
+    def _mover(self, id_producto: int, delta: int, tipo: str):
+        # Como los disparadores de los backends SQL: altas y bajas siempre; el resto si cambia el stock
+        if delta or tipo in ("I", "D"):
+            self._movimientos.append({"id": len(self._movimientos) + 1, "id_producto": id_producto, "delta": delta,
+                                      "tipo": tipo, "creado_en": _sin_zona(datetime.now(timezone.utc))})
+
+    def _registrar_cambio(self, id_producto: int, operacion: str):
+        self._cambios.append({"version": self._siguiente_version, "id_producto": id_producto,
+                              "operacion": operacion, "creado_en": time.time()})
+        self._siguiente_version += 1
+
+    def cargar(self):
+        with self._lock:
+            return self._siguiente_version - 1, [dict(self._filas[i]) for i in sorted(self._filas)]
+
+    def insertar(self, producto) -> int:
+        with self._lock:
+            id_producto = producto.id_producto if producto.id_producto is not None else self._siguiente_id
+            if id_producto in self._filas:
+                raise ValueError(f"Ya existe un producto con id {id_producto}")
+            self._filas[id_producto] = self._fila(producto, id_producto)
+            self._siguiente_id = max(self._siguiente_id, id_producto + 1)
+            self._mover(id_producto, self._filas[id_producto]["stock"], "I")
+            self._registrar_cambio(id_producto, "I")
+            return id_producto
+
+    def actualizar(self, producto, revision=None, stock_anterior=None):
+        with self._lock:
+            actual = self._filas.get(producto.id_producto)
+            if actual is None or revision is not None and actual["revision"] != revision \
+                    or stock_anterior is not None and actual["stock"] != stock_anterior:
+                return None
+            fila = self._fila(producto, producto.id_producto)
+            if producto.stock is None:
+                fila["stock"] = actual["stock"]
+            self._filas[producto.id_producto] = fila
+            self._mover(producto.id_producto, fila["stock"] - actual["stock"], "U")
+            self._registrar_cambio(producto.id_producto, "U")
+            return dict(fila)
+
+    def escribir_pendientes(self, actualizaciones, bajas):
+        with self._lock:
+            rechazados = [
+                producto.id_producto for producto, revision, stock_anterior in actualizaciones
+                if self.actualizar(producto, revision, stock_anterior) is None
+            ]
+            for id_producto in bajas:
+                self.eliminar(id_producto)
+            return rechazados
+
+    def ajustar_stock(self, ajustes, todo_o_nada=False):
+        with self._lock:
+            stock: Dict[int, int] = {}
+            aplicados = []
+            fallidas = []
+            for i, (id_producto, delta) in enumerate(ajustes):
+                actual = stock.get(id_producto, self._filas[id_producto]["stock"] if id_producto in self._filas else None)
+                if actual is None:
+                    fallidas.append((i, "no existe"))
+                elif actual + delta < 0:
+                    fallidas.append((i, "stock insuficiente"))
+                else:
+                    stock[id_producto] = actual + delta
+                    aplicados.append((id_producto, delta))
+            if not stock or todo_o_nada and fallidas:
+                return {}, fallidas, None
+            version = self._siguiente_version
+            for id_producto, delta in aplicados:
+                self._mover(id_producto, delta, "A")
+            for id_producto, nuevo in stock.items():
+                self._filas[id_producto]["stock"] = nuevo
+                self._registrar_cambio(id_producto, "U")
+            return stock, fallidas, version
+
+    def eliminar(self, id_producto: int) -> bool:
+        with self._lock:
+            fila = self._filas.pop(id_producto, None)
+            if fila is not None:
+                self._mover(id_producto, -fila["stock"], "D")
+            self._registrar_cambio(id_producto, "D")
+            borrado = fila is not None
+            return borrado
+
+    def guardar_lote(self, productos) -> List[int]:
+        with self._lock:
+            altas = set()
+            for producto in productos:
+                if producto.id_producto is None:
+                    producto.id_producto = self._siguiente_id
+                anterior = self._filas.get(producto.id_producto)
+                if anterior is None:
+                    altas.add(producto.id_producto)
+                fila = self._filas[producto.id_producto] = self._fila(producto, producto.id_producto)
+                if anterior is None:
+                    self._mover(producto.id_producto, fila["stock"], "I")
+                else:
+                    self._mover(producto.id_producto, fila["stock"] - anterior["stock"], "U")
+                self._siguiente_id = max(self._siguiente_id, producto.id_producto + 1)
+            ids = list(dict.fromkeys(p.id_producto for p in productos))
+            for id_producto in ids:
+                self._registrar_cambio(id_producto, "I" if id_producto in altas else "U")
+            return ids
+
+    def aplicar_operaciones(self, operaciones, todo_o_nada=False):
+        with self._lock:
+            respaldo = ({i: dict(f) for i, f in self._filas.items()}, len(self._cambios),
+                        self._siguiente_id, self._siguiente_version, len(self._movimientos))
+            ids: List[Optional[int]] = [None] * len(operaciones)
+            fallidas: List[Tuple[int, str]] = []
+            try:
+                for i, (tipo, *datos) in enumerate(operaciones):
+                    if tipo == "agregar":
+                        ids[i] = self.insertar(datos[0])
+                    elif tipo == "actualizar":
+                        if self.actualizar(*datos) is None:
+                            fallidas.append((i, "conflicto"))
+                        else:
+                            ids[i] = datos[0].id_producto
+                    elif tipo == "eliminar":
+                        if datos[0] not in self._filas:
+                            fallidas.append((i, "no existe"))
+                        else:
+                            ids[i] = datos[0]
+                            self.eliminar(datos[0])
+                    elif tipo == "ajustar":
+                        stock, fallo, _ = self.ajustar_stock([tuple(datos)])
+                        if fallo:
+                            fallidas.append((i, fallo[0][1]))
+                        else:
+                            ids[i] = datos[0]
+                    else:
+                        raise ValueError(f"Operación desconocida: {tipo!r}")
+                if todo_o_nada and fallidas:
+                    raise AjusteRevertido()
+            except Exception as e:
+                # Como un rollback: se deja todo como estaba
+                self._filas, cambios, self._siguiente_id, self._siguiente_version, movimientos = respaldo
+                del self._cambios[cambios:]
+                del self._movimientos[movimientos:]
+                if isinstance(e, AjusteRevertido):
+                    return [None] * len(operaciones), fallidas
+                raise
+            return ids, fallidas
+
+    def leer(self, ids):
+        with self._lock:
+            return {i: dict(self._filas[i]) if i in self._filas else None for i in ids}
+
+    def cambios_desde(self, version: int):
+        with self._lock:
+            minima = self._cambios[0]["version"] if self._cambios else None
+            return minima, [
+                {**{k: c[k] for k in ("version", "id_producto", "operacion")}, "creado_en": int(c["creado_en"])}
+                for c in self._cambios if c["version"] > version
+            ]
+
+    def purgar_cambios(self, conservar_horas: int = 24) -> int:
+        with self._lock:
+            limite = time.time() - conservar_horas * 3600
+            antes = len(self._cambios)
+            self._cambios = [c for c in self._cambios if c["creado_en"] >= limite]
+            return antes - len(self._cambios)
+
+    def iterar(self, lote: int = 1000):
+        with self._lock:
+            ids = sorted(self._filas)
+        for id_producto in ids:
+            fila = self.leer([id_producto])[id_producto]
+            if fila is not None:
+                yield fila
+
+    def stock_en(self, id_producto: int, fecha: datetime) -> int:
+        # Sin índices: se suma todo el historial del producto (las instantáneas no hacen falta)
+        fecha = _sin_zona(fecha)
+        with self._lock:
+            return sum(m["delta"] for m in self._movimientos if m["id_producto"] == id_producto and m["creado_en"] <= fecha)
+
+    def movimientos_stock(self, id_producto, desde, hasta, limite=None):
+        desde, hasta = _sin_zona(desde), _sin_zona(hasta)
+        with self._lock:
+            propios = [m for m in self._movimientos if m["id_producto"] == id_producto and m["creado_en"] <= hasta]
+        inicial = sum(m["delta"] for m in propios if m["creado_en"] < desde)
+        movimientos = sorted((dict(m) for m in propios if m["creado_en"] >= desde), key=lambda m: (m["creado_en"], m["id"]))
+        movimientos = movimientos[:limite] if limite else movimientos
+        stock = inicial
+        for movimiento in movimientos:
+            del movimiento["id_producto"]
+            stock += movimiento["delta"]
+            movimiento["stock"] = stock
+        return inicial, movimientos
+
+    def tomar_instantaneas(self, hasta=None, retraso=60):
+        limite = _sin_zona(datetime.now(timezone.utc)) - timedelta(seconds=retraso)
+        if hasta is not None:
+            limite = min(limite, _sin_zona(hasta))
+        with self._lock:
+            corte = self._corte
+            while corte < len(self._movimientos) and self._movimientos[corte]["creado_en"] <= limite:
+                corte += 1
+            nuevas: Dict[int, Dict] = {}
+            for movimiento in self._movimientos[self._corte:corte]:
+                id_producto = movimiento["id_producto"]
+                if id_producto not in nuevas:
+                    previas = self._instantaneas.get(id_producto)
+                    nuevas[id_producto] = {"stock": previas[-1]["stock"] if previas else 0}
+                nuevas[id_producto].update(stock=nuevas[id_producto]["stock"] + movimiento["delta"],
+                                           fecha=movimiento["creado_en"], hasta_movimiento=movimiento["id"])
+            for id_producto, instantanea in nuevas.items():
+                self._instantaneas.setdefault(id_producto, []).append(instantanea)
+            self._corte = corte
+            return len(nuevas)
+
+
+def crear_repositorio(backend: Optional[str] = None) -> RepositorioProductos:
+    """Crea el repositorio indicado o el de INVENTARIO_BACKEND (por defecto MySQL)."""
+    backend = (backend or os.environ.get("INVENTARIO_BACKEND", "mysql")).lower()
+    if backend == "mysql":
+        return RepositorioMySQL()
+    if backend == "sqlite":
+        return RepositorioSQLite()
+    if backend == "memoria":
+        return RepositorioMemoria()
+    raise ValueError(f"Backend de inventario desconocido: {backend!r} (use {', '.join(BACKENDS)})")
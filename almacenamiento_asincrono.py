@@ -0,0 +1,148 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from almacenamiento import COLUMNAS, AjusteRevertido, RepositorioMySQL, RepositorioProductos, RepositorioSQL
+
+
+class RepositorioAsincrono:
+    """Las operaciones de RepositorioProductos que usa una petición, como corrutinas (modo ASGI).
+
+    Esta versión ejecuta el repositorio síncrono en un hilo (asyncio.to_thread): sirve para
+    SQLite y memoria, que no tienen esperas de red. RepositorioMySQLAsincrono las hace con
+    aiomysql sin ocupar ningún hilo.
+    """
+
+    def __init__(self, repositorio: RepositorioProductos):
+        self.repositorio = repositorio
+        self.nombre = repositorio.nombre
+
+    async def insertar(self, producto) -> int:
+        return await asyncio.to_thread(self.repositorio.insertar, producto)
+
+    async def actualizar(self, producto, revision: Optional[int] = None,
+                         stock_anterior: Optional[int] = None) -> Optional[Dict]:
+        return await asyncio.to_thread(self.repositorio.actualizar, producto, revision, stock_anterior)
+
+    async def ajustar_stock(self, ajustes, todo_o_nada: bool = False):
+        return await asyncio.to_thread(self.repositorio.ajustar_stock, ajustes, todo_o_nada)
+
+    async def eliminar(self, id_producto: int) -> bool:
+        return await asyncio.to_thread(self.repositorio.eliminar, id_producto)
+
+    async def leer(self, ids) -> Dict[int, Optional[Dict]]:
+        return await asyncio.to_thread(self.repositorio.leer, ids)
+
+    async def cambios_desde(self, version: int) -> Tuple[Optional[int], List[Dict]]:
+        return await asyncio.to_thread(self.repositorio.cambios_desde, version)
+
+
+class RepositorioMySQLAsincrono(RepositorioAsincrono):
+    """Las mismas consultas que RepositorioMySQL, con el pool de aiomysql (conexion.pool_async)."""
+
+    def _transaccion(self):
+        # Import diferido, como en RepositorioMySQL
+        from conexion.conexion import pool_async
+        return pool_async.transaccion()
+
+    @staticmethod
+    async def _registrar_cambio(cursor, id_producto: int, operacion: str):
+        await cursor.execute("INSERT INTO productos_cambios (id_producto, operacion) VALUES (%s, %s)",
+                             (id_producto, operacion))
+
+    async def insertar(self, producto) -> int:
+        async with self._transaccion() as cursor:
+            if producto.id_producto is not None:
+                await cursor.execute(
+                    "INSERT INTO productos (id_producto, nombre, precio, stock, imagen) VALUES (%s, %s, %s, %s, %s)",
+                    producto.to_tuple(include_id=True))
+                id_producto = producto.id_producto
+            else:
+                await cursor.execute("INSERT INTO productos (nombre, precio, stock, imagen) VALUES (%s, %s, %s, %s)",
+                                     producto.to_tuple(include_id=False))
+                id_producto = cursor.lastrowid
+            await self._registrar_cambio(cursor, id_producto, "I")
+        return id_producto
+
+    async def actualizar(self, producto, revision=None, stock_anterior=None):
+        async with self._transaccion() as cursor:
+            await cursor.execute(*RepositorioSQL._sql_actualizar(producto, revision, stock_anterior))
+            if cursor.rowcount == 0:
+                return None
+            await self._registrar_cambio(cursor, producto.id_producto, "U")
+            await cursor.execute(f"SELECT {COLUMNAS} FROM productos WHERE id_producto = %s", (producto.id_producto,))
+            return await cursor.fetchone()
+
+    async def ajustar_stock(self, ajustes, todo_o_nada=False):
+        # Mismo orden por id que RepositorioSQL.ajustar_stock (sin interbloqueos entre lotes)
+        orden = sorted(range(len(ajustes)), key=lambda i: ajustes[i][0])
+        fallidas: List[Tuple[int, str]] = []
+        try:
+            async with self._transaccion() as cursor:
+                tocados = []
+                for i in orden:
+                    id_producto, delta = ajustes[i]
+                    await cursor.execute("""
+                        UPDATE productos SET stock = stock + %s
+                        WHERE id_producto = %s AND stock + %s >= 0
+                    """, (delta, id_producto, delta))
+                    if cursor.rowcount > 0:
+                        tocados.append(id_producto)
+                        continue
+                    await cursor.execute("SELECT stock FROM productos WHERE id_producto = %s", (id_producto,))
+                    existe = await cursor.fetchone()
+                    fallidas.append((i, "stock insuficiente" if existe else "no existe"))
+                if todo_o_nada and fallidas:
+                    raise AjusteRevertido()
+                if not tocados:
+                    return {}, sorted(fallidas), None
+                ids = list(dict.fromkeys(tocados))
+                await self._registrar_cambio(cursor, ids[0], "U")
+                version = cursor.lastrowid
+                if len(ids) > 1:
+                    await cursor.executemany("INSERT INTO productos_cambios (id_producto, operacion) VALUES (%s, %s)",
+                                             [(i, "U") for i in ids[1:]])
+                marcadores = ", ".join(["%s"] * len(ids))
+                await cursor.execute(f"SELECT id_producto, stock FROM productos WHERE id_producto IN ({marcadores})",
+                                     tuple(ids))
+                stock = {fila["id_producto"]: fila["stock"] for fila in await cursor.fetchall()}
+        except AjusteRevertido:
+            return {}, sorted(fallidas), None
+        return stock, sorted(fallidas), version
+
+    async def eliminar(self, id_producto: int) -> bool:
+        async with self._transaccion() as cursor:
+            await cursor.execute("DELETE FROM productos WHERE id_producto = %s", (id_producto,))
+            borrado = cursor.rowcount > 0
+            await self._registrar_cambio(cursor, id_producto, "D")
+        return borrado
+
+    async def leer(self, ids) -> Dict[int, Optional[Dict]]:
+        leidos: Dict[int, Optional[Dict]] = dict.fromkeys(ids)
+        ids = list(leidos)
+        async with self._transaccion() as cursor:
+            for inicio in range(0, len(ids), 500):
+                lote = ids[inicio:inicio + 500]
+                marcadores = ", ".join(["%s"] * len(lote))
+                await cursor.execute(f"SELECT {COLUMNAS} FROM productos WHERE id_producto IN ({marcadores})", tuple(lote))
+                for fila in await cursor.fetchall():
+                    leidos[fila["id_producto"]] = fila
+        return leidos
+
+    async def cambios_desde(self, version: int):
+        async with self._transaccion() as cursor:
+            await cursor.execute("SELECT MIN(version) AS minima FROM productos_cambios")
+            minima = (await cursor.fetchone())["minima"]
+            await cursor.execute("""
+                SELECT version, id_producto, operacion, UNIX_TIMESTAMP(creado_en) AS creado_en
+                FROM productos_cambios
+                WHERE version > %s
+                ORDER BY version
+            """, (version,))
+            cambios = await cursor.fetchall()
+        return minima, list(cambios)
+
+
+def crear_repositorio_asincrono(repositorio: RepositorioProductos) -> RepositorioAsincrono:
+    if isinstance(repositorio, RepositorioMySQL):
+        return RepositorioMySQLAsincrono(repositorio)
+    return RepositorioAsincrono(repositorio)
@@ -0,0 +1,302 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context, url_for
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+from importacion import MAX_ERRORES, TAMANO_LOTE, importar_filas, leer_filas, validar_fila
+from inventario import Inventario, Producto
+
+# API JSON versionada sobre Inventario: /api/v1/...
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+MAX_LIMIT = 500
+NDJSON = "application/x-ndjson"
+DIAS_MOVIMIENTOS = 30
+
+
+def _inventario() -> Inventario:
+    inv = current_app.extensions["inventario"].obtener()
+    if inv is None:
+        abort(503, "Inventario no disponible")
+    return inv
+
+
+def producto_json(producto: Producto) -> Dict:
+    return {
+        "id_producto": producto.id_producto,
+        "nombre": producto.nombre,
+        "precio": float(producto.precio),
+        "stock": producto.stock,
+        "imagen": producto.imagen or None,
+        "revision": producto.revision,
+    }
+
+
+def etag_producto(producto: Producto) -> str:
+    # Por contenido: igual en todos los workers mientras el producto no cambie
+    datos = json.dumps(producto_json(producto), sort_keys=True).encode("utf-8")
+    return hashlib.sha1(datos).hexdigest()[:20]
+
+
+def _condicional(respuesta: Response, etag: str, modificado_en: Optional[float] = None) -> Response:
+    # Con If-None-Match / If-Modified-Since que coinciden, make_conditional la convierte en 304 sin cuerpo
+    respuesta.set_etag(etag)
+    if modificado_en is not None:
+        respuesta.last_modified = modificado_en
+    respuesta.cache_control.no_cache = True  # Se puede guardar, pero hay que revalidar
+    return respuesta.make_conditional(request)
+
+
+def _cuerpo_json() -> Dict:
+    if not request.is_json:
+        abort(415, "Se esperaba Content-Type: application/json")
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        abort(400, "Se esperaba un objeto JSON")
+    return datos
+
+
+@api.before_request
+def requerir_sesion():
+    # Misma sesión que la web, pero sin redirigir al login: una integración necesita un 401
+    if not current_user.is_authenticated and not current_app.config.get("LOGIN_DISABLED"):
+        abort(401, "Inicia sesión en /login")
+
+
+@api.errorhandler(HTTPException)
+def error_json(e):
+    return jsonify({"error": e.description, "estado": e.code}), e.code
+
+
+@api.route("/productos")
+def listar():
+    """Lista con paginación por cursor (?cursor, ?limit, ?orden, ?q).
+
+    Con ?formato=ndjson o Accept: application/x-ndjson se envían todos los productos
+    desde el cursor, uno por línea y en streaming, sin límite.
+    """
+    inv = _inventario()
+    etag, modificado_en = inv.marca()
+    orden = request.args.get("orden", "id")
+    cursor = request.args.get("cursor") or None
+    q = request.args.get("q", "").strip() or None
+    ndjson = request.args.get("formato") == "ndjson" or request.accept_mimetypes.best == NDJSON
+    if ndjson:
+        try:
+            productos = inv.recorrer(cursor, orden, q)
+            primero = next(productos, None)
+        except ValueError as e:
+            abort(400, str(e))
+
+        def lineas():
+            if primero is not None:
+                yield json.dumps(producto_json(primero), ensure_ascii=False) + "\n"
+            for producto in productos:
+                yield json.dumps(producto_json(producto), ensure_ascii=False) + "\n"
+
+        respuesta = Response(stream_with_context(lineas()), mimetype=NDJSON)
+        respuesta.vary.add("Accept")
+        return _condicional(respuesta, f"{etag}-ndjson", modificado_en)
+    limit = max(1, min(request.args.get("limit", current_app.config.get("PAGE_SIZE", 50), type=int), MAX_LIMIT))
+    try:
+        productos, siguiente = inv.listar_pagina(cursor, limit, orden, q)
+    except ValueError as e:
+        abort(400, str(e))
+    respuesta = jsonify({"productos": [producto_json(p) for p in productos], "siguiente": siguiente, "limit": limit})
+    if siguiente:
+        enlace = url_for("api.listar", cursor=siguiente, limit=limit, orden=orden, q=q, _external=True)
+        respuesta.headers["Link"] = f'<{enlace}>; rel="next"'
+    respuesta.vary.add("Accept")
+    return _condicional(respuesta, etag, modificado_en)
+
+
+@api.route("/productos/<int:id_producto>")
+def obtener(id_producto):
+    producto = _inventario().obtener(id_producto)
+    if producto is None:
+        abort(404, "Producto no encontrado")
+    return _condicional(jsonify(producto_json(producto)), etag_producto(producto))
+
+
+@api.route("/productos", methods=["POST"])
+def crear():
+    datos = _cuerpo_json()
+    producto, errores = validar_fila(datos)
+    if errores:
+        return jsonify({"error": "Datos inválidos", "errores": errores}), 422
+    inv = _inventario()
+    if not inv.agregar_producto(producto):
+        abort(409, "No se pudo crear el producto (¿el id ya existe?)")
+    creado = inv.obtener(producto.id_producto) or producto
+    respuesta = jsonify(producto_json(creado))
+    respuesta.status_code = 201
+    respuesta.headers["Location"] = url_for("api.obtener", id_producto=creado.id_producto)
+    respuesta.set_etag(etag_producto(creado))
+    return respuesta
+
+
+@api.route("/productos/<int:id_producto>", methods=["PUT", "PATCH"])
+def actualizar(id_producto):
+    """Modifica los campos enviados (PUT y PATCH admiten envíos parciales).
+
+    Bloqueo optimista: con If-Match (el ETag del producto) o con "revision" / "stock_anterior"
+    en el cuerpo, si el producto cambió mientras tanto responde 412 o 409 y no se aplica.
+    """
+    datos = _cuerpo_json()
+    inv = _inventario()
+    producto = inv.obtener(id_producto)
+    if producto is None:
+        abort(404, "Producto no encontrado")
+    if request.if_match and not request.if_match.contains(etag_producto(producto)):
+        abort(412, "El producto cambió (If-Match no coincide)")
+    combinado = {**producto_json(producto), **{k: v for k, v in datos.items() if k in ("nombre", "precio", "stock", "imagen")}}
+    combinado["id_producto"] = id_producto
+    nuevo, errores = validar_fila(combinado)
+    if errores:
+        return jsonify({"error": "Datos inválidos", "errores": errores}), 422
+    # Sin revisión explícita vale la del producto que se comprobó con If-Match (o la del cache)
+    revision = datos.get("revision", producto.revision)
+    stock_anterior = datos.get("stock_anterior", producto.stock if "stock" in datos else None)
+    if not isinstance(revision, int) or stock_anterior is not None and not isinstance(stock_anterior, int):
+        abort(400, "revision y stock_anterior deben ser enteros")
+    ok = inv.actualizar_producto(
+        id_producto,
+        nombre=nuevo.nombre if "nombre" in datos else None,
+        precio=nuevo.precio if "precio" in datos else None,
+        stock=nuevo.stock if "stock" in datos else None,
+        imagen=(nuevo.imagen or "") if "imagen" in datos else None,
+        revision=revision,
+        stock_anterior=stock_anterior,
+    )
+    if not ok:
+        actual = inv.obtener(id_producto)
+        return jsonify({"error": "El producto cambió mientras tanto",
+                        "actual": producto_json(actual) if actual else None}), 409
+    actualizado = inv.obtener(id_producto)
+    respuesta = jsonify(producto_json(actualizado))
+    respuesta.set_etag(etag_producto(actualizado))
+    return respuesta
+
+
+@api.route("/productos/<int:id_producto>", methods=["DELETE"])
+def eliminar(id_producto):
+    if not _inventario().eliminar_producto(id_producto):
+        abort(404, "Producto no encontrado")
+    return "", 204
+
+
+@api.route("/productos/lote", methods=["POST"])
+def guardar_lote():
+    """Alta o modificación (por id_producto) de muchos productos.
+
+    El cuerpo es una lista JSON o NDJSON (un producto por línea, Content-Type
+    application/x-ndjson, se lee en streaming). Se valida cada fila como en la
+    importación y se guarda en transacciones de ?lote filas. Devuelve el resumen con
+    los errores por línea; 200 si todo se guardó, 207 si alguna fila falló.
+    """
+    inv = _inventario()
+    tamano = max(1, min(request.args.get("lote", TAMANO_LOTE, type=int), 10 * TAMANO_LOTE))
+    if request.mimetype == NDJSON:
+        texto = (linea.decode("utf-8", errors="replace") for linea in request.stream)
+        filas = leer_filas(texto, "jsonl")
+    elif request.is_json:
+        datos = request.get_json(silent=True)
+        if not isinstance(datos, list):
+            abort(400, "Se esperaba una lista JSON de productos")
+        filas = ((n, f if isinstance(f, dict) else {"__error__": "Se esperaba un objeto JSON"})
+                 for n, f in enumerate(datos, start=1))
+    else:
+        abort(415, f"Se esperaba Content-Type: application/json o {NDJSON}")
+    resumen = importar_filas(inv, filas, tamano)
+    resumen["errores_truncados"] = resumen["con_error"] > MAX_ERRORES
+    return jsonify(resumen), 207 if resumen["con_error"] else 200
+
+
+@api.route("/productos/stock", methods=["POST"])
+def ajustar_stock():
+    """Ajustes relativos de stock en una transacción.
+
+    {"ajustes": [{"id_producto": 1, "delta": -2}, ...], "todo_o_nada": false}. Responde con
+    el resultado de Inventario.ajustar_stock_lote: 200 si se aplicaron todas las líneas, 207
+    si solo algunas y 409 si ninguna (con todo_o_nada, una línea fallida las anula todas).
+    """
+    datos = _cuerpo_json()
+    lineas, todo_o_nada = leer_ajustes(datos)
+    try:
+        resultado = _inventario().ajustar_stock_lote(lineas, todo_o_nada=todo_o_nada)
+    except Exception:
+        abort(503, "No se pudo ajustar el stock")
+    cuerpo, estado = respuesta_ajustes(resultado)
+    return jsonify(cuerpo), estado
+
+
+def _fecha_param(nombre: str, defecto: datetime) -> datetime:
+    valor = request.args.get(nombre)
+    if not valor:
+        return defecto
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        abort(400, f"{nombre} debe ser una fecha ISO 8601 (por ejemplo 2024-05-31T23:59:59)")
+
+
+@api.route("/productos/<int:id_producto>/stock")
+def stock_en(id_producto):
+    """Stock del producto en ?fecha (ISO 8601, UTC si no lleva zona; por defecto ahora).
+
+    Sale del kardex, así que también responde para productos ya dados de baja (stock 0).
+    """
+    fecha = _fecha_param("fecha", datetime.now(timezone.utc).replace(tzinfo=None))
+    try:
+        stock = _inventario().stock_en(id_producto, fecha)
+    except Exception:
+        abort(503, "No se pudo consultar el kardex")
+    return jsonify({"id_producto": id_producto, "fecha": fecha.isoformat(), "stock": stock})
+
+
+@api.route("/productos/<int:id_producto>/movimientos")
+def movimientos(id_producto):
+    """Movimientos de stock entre ?desde y ?hasta (por defecto, los últimos 30 días).
+
+    Cada uno con el stock que dejó; stock_inicial es el de justo antes de desde. Con más
+    de ?limit movimientos se devuelven los primeros y "truncado" es true: se sigue pidiendo
+    desde el creado_en del último.
+    """
+    hasta = _fecha_param("hasta", datetime.now(timezone.utc).replace(tzinfo=None))
+    desde = _fecha_param("desde", hasta - timedelta(days=DIAS_MOVIMIENTOS))
+    limit = max(1, min(request.args.get("limit", MAX_LIMIT, type=int), MAX_LIMIT))
+    try:
+        stock_inicial, lista = _inventario().movimientos_stock(id_producto, desde, hasta, limit + 1)
+    except Exception:
+        abort(503, "No se pudo consultar el kardex")
+    return jsonify({
+        "id_producto": id_producto,
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "stock_inicial": stock_inicial,
+        "movimientos": [{**m, "creado_en": m["creado_en"].isoformat()} for m in lista[:limit]],
+        "truncado": len(lista) > limit,
+    })
+
+
+# Compartidas con la versión asíncrona de la ruta (asgi.py)
+def leer_ajustes(datos: Dict):
+    ajustes = datos.get("ajustes")
+    if not isinstance(ajustes, list) or not all(isinstance(a, dict) for a in ajustes):
+        abort(400, "Se esperaba \"ajustes\": [{\"id_producto\", \"delta\"}, ...]")
+    try:
+        lineas = [(int(a["id_producto"]), a.get("delta")) for a in ajustes]
+    except (KeyError, TypeError, ValueError):
+        abort(400, "Cada ajuste necesita un id_producto entero")
+    return lineas, bool(datos.get("todo_o_nada"))
+
+
+def respuesta_ajustes(resultado: Dict):
+    resultado["stock"] = {str(k): v for k, v in resultado["stock"].items()}
+    if not resultado["fallidas"]:
+        return resultado, 200
+    return resultado, 207 if resultado["aplicadas"] else 409
@@ -1,23 +1,50 @@
+import gc
+import io
 import logging
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Response, jsonify, render_template, request, redirect, url_for, flash, stream_with_context
 from datetime import datetime
+from markupsafe import Markup
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 from forms import ProductoForm, RegisterForm, LoginForm
 from inventario import Inventario, Producto
-from models import cargar_usuario_por_id, cargar_usuario_por_email
-from conexion.conexion import obtener_conexion
+from arranque import RecursoPerezoso
+from fragmentos import CacheFragmentos
+from api import api
+from importacion import FORMATOS, detectar_formato, exportar, importar
+from imagenes import AlmacenImagenes
+from estaticos import Estaticos
+from models import cargar_usuario_cacheado, cargar_usuario_por_email, cache_usuarios
+from conexion.conexion import obtener_conexion, pool, pool_async
+from metricas import contador_consultas, instrumentar, registro
+from acceso import EjecutorHash, HashSaturado, crear_limitador
 
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s %(levelname)s: %(message)s")
+# LOG_LEVEL=DEBUG para ver todo; los avisos de consultas y peticiones lentas salen en WARNING (logger "metricas")
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 app = Flask(__name__, template_folder="templates", static_folder="static")
 app.config['SECRET_KEY'] = "mi_clave_secreta"
+# Añade la cabecera X-Consultas-DB a cada respuesta (la usa bench/rutas.py en modo HTTP)
+app.config['EXPONER_CONSULTAS'] = os.environ.get('EXPONER_CONSULTAS') == '1'
+# Sin login (solo para benchmarks como bench/concurrencia.py): Flask-Login y la API no piden sesión
+app.config['LOGIN_DISABLED'] = os.environ.get('LOGIN_DISABLED') == '1'
 
 # Configuración para subir imágenes
-UPLOAD_FOLDER = 'static/images'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+UPLOAD_FOLDER = os.path.join(app.static_folder, 'images')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Guardadas por hash de contenido; miniaturas y versión web se generan en segundo plano
+almacen_imagenes = AlmacenImagenes(UPLOAD_FOLDER, hilos=int(os.environ.get('IMAGE_WORKERS', '2')))
+
+# static/ con nombres con hash, caché de un año y .br/.gz (tras python -m cli.estaticos; sin construir, como antes)
+estaticos = Estaticos(app)
+
+# Paginación de listados de productos
+app.config['PAGE_SIZE'] = 50
+app.config['MAX_PAGE_SIZE'] = 500
+# Contraseñas: hashes en hilos aparte con cola acotada y límite de intentos por IP y email (acceso.py)
+ejecutor_hash = EjecutorHash()
+limitador_login = crear_limitador()
+# Tablas de productos ya renderizadas (por página y estado del catálogo), LRU de FRAGMENTOS_MAX_MB por worker
+cache_fragmentos = CacheFragmentos(max_bytes=int(float(os.environ.get('FRAGMENTOS_MAX_MB', '32')) * 2 ** 20))
 
 # Inicializar Flask-Login
 login_manager = LoginManager(app)
@@ -25,25 +52,87 @@ login_manager.login_view = 'login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return cargar_usuario_por_id(user_id)
+    return cargar_usuario_cacheado(user_id)
+
+def crear_inventario():
+    return Inventario(
+        intervalo_sync=float(os.environ.get('INVENTARIO_SYNC_INTERVAL', '2')),
+        # Escritura diferida: modificaciones y bajas se agrupan en transacciones (cerrar al salir las vuelca)
+        escritura_diferida=os.environ.get('INVENTARIO_ESCRITURA_DIFERIDA') == '1',
+        max_lote=int(os.environ.get('INVENTARIO_MAX_LOTE', '500')),
+        max_espera=float(os.environ.get('INVENTARIO_MAX_ESPERA', '0.5')),
+        catalogo=os.environ.get('INVENTARIO_CATALOGO', 'objetos'),
+        # El esquema lo prepara python -m cli.migrar al desplegar, no cada arranque
+        preparar=os.environ.get('INVENTARIO_PREPARAR') == '1',
+    )
+
+# Importar app no toca la BD: el inventario se carga con la primera petición que lo necesita
+# y, si falla, se reintenta más tarde en vez de quedarse sin inventario
+inventario_perezoso = RecursoPerezoso(crear_inventario, "el inventario")
+
+def obtener_inventario():
+    return inventario_perezoso.obtener()
+
+# API JSON (/api/v1): usa el mismo inventario perezoso
+app.extensions['inventario'] = inventario_perezoso
+app.register_blueprint(api)
+
+def crear_app(precargar=False):
+    """Devuelve la app; con precargar, carga ya el catálogo.
+
+    Con gunicorn --preload -w 4 'app:crear_app(precargar=True)' se carga una sola vez en el
+    proceso maestro y los workers lo heredan al hacer fork, compartiendo esas páginas de
+    memoria (copy-on-write) en lugar de cargar cada uno el suyo.
+    """
+    if precargar and obtener_inventario() is not None:
+        # Los objetos cargados pasan a la generación permanente: el recolector no los recorre
+        # y así no escribe en sus páginas (lo que las copiaría en cada worker)
+        gc.freeze()
+    return app
+
+def indicadores_metricas():
+    # Valores del momento para /metrics (por worker)
+    inv = inventario_perezoso.obtener() if inventario_perezoso.listo else None
+    indicadores = {
+        "db_pool": ("Estado del pool de conexiones a MySQL", pool.estadisticas()),
+        "db_pool_async": ("Estado del pool de aiomysql (modo ASGI)", pool_async.estadisticas()),
+        "cache_usuarios": ("Cache de usuarios de la sesión", cache_usuarios.estadisticas()),
+        "cache_tablas": ("Cache de tablas de productos renderizadas", cache_fragmentos.estadisticas()),
+        "hash_contrasenas": ("Hilos de hash de contraseñas", ejecutor_hash.estadisticas()),
+    }
+    if inv:
+        resumen = inv.resumen(limite_bajo_stock=0)
+        resumen.update({f"banda_{banda}": n for banda, n in resumen.pop("bandas").items()})
+        indicadores["inventario"] = ("Resumen del inventario en memoria", resumen)
+        if inv.estadisticas_escritura():
+            indicadores["inventario_escritura"] = ("Escritura diferida del inventario", inv.estadisticas_escritura())
+    return indicadores
+
+# Antes que el resto de hooks: la medición de cada petición empieza aquí (y /metrics)
+instrumentar(app, indicadores_metricas)
+
+@app.before_request
+def sincronizar_inventario():
+    # Trae los cambios hechos por otros workers (como mucho una consulta cada INVENTARIO_SYNC_INTERVAL s)
+    inv = obtener_inventario()
+    if inv:
+        inv.sincronizar_si_toca()
 
-# Inicializar inventario
-try:
-    inv = Inventario()
-except Exception as e:
-    print(f"No se pudo inicializar el inventario: {e}")
-    inv = None
+@app.after_request
+def exponer_consultas(response):
+    if app.config['EXPONER_CONSULTAS']:
+        response.headers['X-Consultas-DB'] = str(contador_consultas.consultas)
+    return response
 
 @app.context_processor
 def inject_now():
     return {'now': datetime.utcnow}
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-@app.template_filter('sum')
-def sum_filter(items, attribute):
-    return sum(getattr(item, attribute) for item in items)
+@app.template_global()
+def imagen_url(imagen, variante='miniatura'):
+    if not imagen:
+        return url_for('static', filename='images/default.jpg')
+    return url_for('static', filename=almacen_imagenes.variante(imagen, variante))
 
 @app.route('/')
 def index():
@@ -58,17 +147,54 @@ def test_db():
         db_name = cursor.fetchone()[0]
         cursor.close()
         conn.close()
-        return f"[✓] Conexión exitosa a la base de datos: {db_name}"
+        inv = obtener_inventario()
+        escritura = inv.estadisticas_escritura() if inv else None
+        return (f"[✓] Conexión exitosa a la base de datos: {db_name} | Pool: {pool.estadisticas()} | "
+                f"Cache usuarios: {cache_usuarios.estadisticas()} | Cache tablas: {cache_fragmentos.estadisticas()} | Inventario: {inventario_perezoso.estado()} | "
+                f"Escritura diferida: {escritura}")
     except Exception as e:
         return f"[✗] Error de conexión a MySQL: {e}"
 
+def pagina_productos():
+    q = request.args.get('q', '').strip()
+    orden = request.args.get('orden', 'id')
+    cursor = request.args.get('cursor') or None
+    try:
+        limit = int(request.args.get('limit', app.config['PAGE_SIZE']))
+    except ValueError:
+        limit = app.config['PAGE_SIZE']
+    limit = max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+    siguiente = None
+    inv = obtener_inventario()
+    if not inv:
+        tabla = Markup(render_template('productos/tabla.html', productos=[]))
+    else:
+        try:
+            tabla, siguiente = tabla_productos(inv, q, orden, cursor, limit)
+        except ValueError as e:
+            flash(str(e), 'warning')
+            orden, cursor = 'id', None
+            tabla, siguiente = tabla_productos(inv, q, orden, cursor, limit)
+    return {'tabla': tabla, 'q': q, 'orden': orden, 'limit': limit,
+            'cursor': cursor, 'siguiente': siguiente}
+
+def tabla_productos(inv, q, orden, cursor, limit):
+    # Si el catálogo no cambió desde que se renderizó esta página, se reutiliza el HTML sin pasar por Jinja
+    marca, _ = inv.marca()  # Antes de leer: un cambio posterior invalida lo que se guarde ahora
+    clave = (q, orden, cursor, limit, almacen_imagenes.generacion)
+    guardado = cache_fragmentos.obtener(marca, clave)
+    if guardado is None:
+        productos, siguiente = inv.listar_pagina(cursor, limit, orden, q or None)
+        tabla = Markup(render_template('productos/tabla.html', productos=productos))
+        guardado = (tabla, siguiente)
+        cache_fragmentos.guardar(marca, clave, guardado, len(tabla))
+    return guardado
+
 # --- CRUD de productos ---
 @app.route('/productos')
 @login_required
 def listar_productos():
-    q = request.args.get('q', '').strip()
-    productos = inv.buscar_por_nombre(q) if q and inv else (inv.mostrar_todos() if inv else [])
-    return render_template('productos/index.html', title="Productos", productos=productos, q=q)
+    return render_template('productos/index.html', title="Productos", **pagina_productos())
 
 @app.route('/productos/crear', methods=['GET', 'POST'])
 @login_required
@@ -83,12 +209,11 @@ def crear_producto():
         imagen_filename = None
         if 'imagen' in request.files:
             file = request.files['imagen']
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                imagen_filename = filename
+            if file and file.filename:
+                imagen_filename = almacen_imagenes.guardar(file) or imagen_filename
 
         producto = Producto(id_producto=None, nombre=nombre, precio=precio, stock=stock, imagen=imagen_filename)
+        inv = obtener_inventario()
         ok = inv.agregar_producto(producto) if inv else False
         flash('Producto agregado.' if ok else 'Error al agregar producto.', 'success' if ok else 'danger')
         return redirect(url_for('listar_productos'))
@@ -97,6 +222,7 @@ def crear_producto():
 @app.route('/productos/editar/<int:id_producto>', methods=['GET', 'POST'])
 @login_required
 def editar_producto(id_producto):
+    inv = obtener_inventario()
     if not inv:
         flash('Inventario no disponible.', 'danger')
         return redirect(url_for('listar_productos'))
@@ -118,19 +244,26 @@ def editar_producto(id_producto):
         imagen_filename = producto.imagen
         if 'imagen' in request.files:
             file = request.files['imagen']
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                imagen_filename = filename
+            if file and file.filename:
+                imagen_filename = almacen_imagenes.guardar(file) or imagen_filename
 
-        inv.actualizar_producto(id_producto, nombre=nombre, precio=precio, stock=stock, imagen=imagen_filename)
-        flash('Producto actualizado.', 'success')
-        return redirect(url_for('listar_productos'))
+        # Revisión y stock que vio el usuario: si otro los cambió mientras editaba, no se pisan
+        revision = request.form.get('revision', type=int)
+        stock_original = request.form.get('stock_original', type=int)
+        if stock == stock_original:
+            stock = None  # Sin tocar: así no se deshacen ventas hechas mientras tanto
+        if inv.actualizar_producto(id_producto, nombre=nombre, precio=precio, stock=stock, imagen=imagen_filename,
+                                   revision=revision, stock_anterior=stock_original):
+            flash('Producto actualizado.', 'success')
+            return redirect(url_for('listar_productos'))
+        flash('El producto cambió mientras lo editabas. Revisa los datos actuales y guarda de nuevo.', 'warning')
+        return redirect(url_for('editar_producto', id_producto=id_producto))
     return render_template('productos/editar.html', title="Editar Producto", form=form, producto=producto)
 
 @app.route('/productos/eliminar/<int:id_producto>', methods=['GET', 'POST'])
 @login_required
 def eliminar_producto(id_producto):
+    inv = obtener_inventario()
     if not inv:
         flash('Inventario no disponible.', 'danger')
         return redirect(url_for('listar_productos'))
@@ -144,23 +277,90 @@ def eliminar_producto(id_producto):
         return redirect(url_for('listar_productos'))
     return render_template('productos/eliminar.html', title="Eliminar Producto", producto=producto)
 
+@app.route('/productos/importar', methods=['GET', 'POST'])
+@login_required
+def importar_productos():
+    resumen = None
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        inv = obtener_inventario()
+        if not inv:
+            flash('Inventario no disponible.', 'danger')
+        elif not archivo or not archivo.filename:
+            flash('Selecciona un archivo CSV o JSON Lines.', 'danger')
+        else:
+            try:
+                formato = detectar_formato(archivo.filename)
+                # Se lee el archivo subido como texto, línea a línea
+                texto = io.TextIOWrapper(archivo.stream, encoding='utf-8', newline='')
+                resumen = importar(inv, texto, formato)
+                ok = resumen['con_error'] == 0
+                flash(f"Importación terminada: {resumen['guardadas']} guardadas, {resumen['con_error']} con error.",
+                      'success' if ok else 'warning')
+            except (ValueError, UnicodeDecodeError) as e:
+                flash(f'Error al importar: {e}', 'danger')
+    return render_template('productos/importar.html', title="Importar Productos", resumen=resumen)
+
+@app.route('/productos/exportar')
+@login_required
+def exportar_productos():
+    inv = obtener_inventario()
+    if not inv:
+        flash('Inventario no disponible.', 'danger')
+        return redirect(url_for('listar_productos'))
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS:
+        flash('Formato de exportación no soportado.', 'danger')
+        return redirect(url_for('listar_productos'))
+    tipo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(exportar(inv.iterar_desde_db(), formato)),
+        mimetype=tipo,
+        headers={'Content-Disposition': f'attachment; filename=productos.{formato}'}
+    )
+
 # Ruta para el inventario
 @app.route('/inventario')
 @login_required
 def inventario():
-    q = request.args.get('q', '').strip()
-    productos = inv.buscar_por_nombre(q) if q and inv else (inv.mostrar_todos() if inv else [])
-    return render_template('productos/inventario.html', title="Inventario", productos=productos, q=q)
+    return render_template('productos/inventario.html', title="Inventario", **pagina_productos())
+
+# Resumen del inventario: totales mantenidos por Inventario en cada cambio, no se recorre el catálogo
+@app.route('/inventario/resumen')
+@login_required
+def resumen_inventario():
+    inv = obtener_inventario()
+    resumen = inv.resumen() if inv else None
+    return render_template('productos/resumen.html', title="Resumen del Inventario", resumen=resumen)
+
+@app.route('/inventario/resumen.json')
+@login_required
+def resumen_inventario_json():
+    inv = obtener_inventario()
+    if not inv:
+        return jsonify({'error': 'Inventario no disponible'}), 503
+    resumen = inv.resumen(limite_bajo_stock=request.args.get('limite', 20, type=int))
+    resumen['productos_bajo_stock'] = [
+        {'id_producto': p.id_producto, 'nombre': p.nombre, 'stock': p.stock}
+        for p in resumen['productos_bajo_stock']
+    ]
+    return jsonify(resumen)
 
 # --- Login y Registro ---
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     form = RegisterForm()
+    if request.method == 'POST':
+        espera = limitador_login.espera(ip=request.remote_addr)
+        if espera:
+            return demasiados_intentos('auth/register.html', form, espera)
     if form.validate_on_submit():
         nombre = form.nombre.data
         email = form.email.data
-        password = generate_password_hash(form.password.data)
         try:
+            # Cada alta cuenta como intento de la IP: generar el hash es lo caro
+            limitador_login.intento(ip=request.remote_addr)
+            password = ejecutor_hash.generar(form.password.data)
             conn = obtener_conexion()
             cursor = conn.cursor()
             cursor.execute("INSERT INTO usuarios (nombre, email, password) VALUES (%s, %s, %s)", (nombre, email, password))
@@ -169,23 +369,62 @@ def register():
             conn.close()
             flash('Usuario registrado correctamente. Por favor, inicia sesión.', 'success')
             return redirect(url_for('login'))
+        except HashSaturado:
+            return servidor_saturado('auth/register.html', form)
         except Exception as e:
             flash(f'Error al registrar usuario: {e}', 'danger')
     return render_template('auth/register.html', form=form)
 
+# Clave del environ con la que asgi.py pasa a login() el usuario y la contraseña ya comprobados
+LOGIN_PRECARGADO = 'asgi.login'
+
+def demasiados_intentos(plantilla, form, espera):
+    registro.sumar("login_intentos_total", (("resultado", "limitado"),))
+    espera = max(1, int(espera + 0.999))
+    flash(f'Demasiados intentos. Vuelve a intentarlo en {espera} s.', 'danger')
+    return render_template(plantilla, form=form), 429, {'Retry-After': str(espera)}
+
+def servidor_saturado(plantilla, form):
+    # La cola de hashes está llena o el hash tardó más de HASH_TIMEOUT: no es culpa del cliente
+    registro.sumar("login_intentos_total", (("resultado", "saturado"),))
+    flash('Hay demasiadas peticiones de acceso en curso. Inténtalo de nuevo en unos segundos.', 'danger')
+    return render_template(plantilla, form=form), 503, {'Retry-After': '1'}
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
+    if request.method == 'POST':
+        # Antes de validar el formulario, buscar al usuario o calcular ningún hash
+        espera = limitador_login.espera(ip=request.remote_addr, email=request.form.get('email'))
+        if espera:
+            return demasiados_intentos('auth/login.html', form, espera)
     if form.validate_on_submit():
         email = form.email.data
         password = form.password.data
-        usuario = cargar_usuario_por_email(email)
-        if usuario and check_password_hash(usuario.password, password):
+        precarga = request.environ.get(LOGIN_PRECARGADO)
+        if precarga is not None and precarga['email'] == email:
+            # Modo ASGI: asgi.py ya anotó el intento, buscó al usuario y comprobó la contraseña sin bloquear
+            usuario, valida = precarga['usuario'], precarga['valida']
+        else:
+            limitador_login.intento(ip=request.remote_addr)
+            usuario = cargar_usuario_por_email(email)
+            try:
+                valida = usuario is not None and ejecutor_hash.comprobar(usuario.password, password)
+            except HashSaturado:
+                valida = None
+        if valida is None:
+            return servidor_saturado('auth/login.html', form)
+        if valida:
+            limitador_login.exito(email)
+            registro.sumar("login_intentos_total", (("resultado", "ok"),))
             login_user(usuario)
+            cache_usuarios.guardar(usuario)
             next_page = request.args.get('next')
             flash('Sesión iniciada correctamente', 'success')
             return redirect(next_page or url_for('listar_productos'))
         else:
+            limitador_login.intento(email=email)
+            registro.sumar("login_intentos_total", (("resultado", "fallo"),))
             flash('Email o contraseña incorrectos', 'danger')
     return render_template('auth/login.html', form=form)
 
@@ -1,11 +1,15 @@
 import os
 import json
 import csv
-from flask import Flask, render_template, request, redirect, url_for
+import io
+from flask import Flask, Response, abort, jsonify, render_template, request, redirect, url_for
 from pathlib import Path
+from registros import ArchivoIndexado, RegistroJSONL
 
 # SQLAlchemy
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, event, select, Column, Integer, String
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 BASE_DIR = Path(__file__).parent
@@ -16,11 +20,39 @@ DATOS_DIR.mkdir(exist_ok=True)
 
 TXT_PATH = DATOS_DIR / "datos.txt"
 JSON_PATH = DATOS_DIR / "datos.json"
+JSONL_PATH = DATOS_DIR / "datos.jsonl"
 CSV_PATH = DATOS_DIR / "datos.csv"
-SQLITE_PATH = DB_DIR / "usuarios.db"
+SQLITE_PATH = Path(os.environ.get("USUARIOS_SQLITE_PATH", DB_DIR / "usuarios.db"))
+POR_PAGINA = 50
+# Usuarios por INSERT en /usuarios/lote y filas por bloque al exportar
+LOTE_USUARIOS = int(os.environ.get("USUARIOS_LOTE", "1000"))
+MAX_ERRORES = 100
+NDJSON = "application/x-ndjson"
+
+# Pool del engine (por proceso): conexiones abiertas que se reutilizan entre peticiones
+POOL_SIZE = int(os.environ.get("USUARIOS_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.environ.get("USUARIOS_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.environ.get("USUARIOS_POOL_TIMEOUT", "10"))
+
+# Los registros JSON se guardan en JSON Lines (solo anexado); el array antiguo se migra una vez
+registro_json = RegistroJSONL(JSONL_PATH)
+registro_json.migrar_desde_array(JSON_PATH)
+# TXT y CSV llevan un índice de offsets (.idx) para leer una página sin recorrer el archivo
+archivo_txt = ArchivoIndexado(TXT_PATH)
+archivo_csv = ArchivoIndexado(CSV_PATH, es_csv=True, cabecera="nombre,detalle\r\n")
 
 # Configuración SQLAlchemy
-engine = create_engine(f"sqlite:///{SQLITE_PATH}", echo=False, future=True)
+engine = create_engine(f"sqlite:///{SQLITE_PATH}", echo=False, future=True, pool_size=POOL_SIZE,
+                       max_overflow=POOL_MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT, connect_args={"timeout": 30})
+
+@event.listens_for(engine, "connect")
+def configurar_sqlite(conn, _):
+    # WAL: las lecturas (listados, exportación) no bloquean a las altas ni al revés
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 Base = declarative_base()
 SessionLocal = sessionmaker(bind=engine)
 
@@ -34,6 +66,21 @@ Base.metadata.create_all(bind=engine)
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 
+def pagina_actual():
+    try:
+        return max(int(request.args.get("pagina", 1)), 1)
+    except ValueError:
+        return 1
+
+def leer_indexado(archivo, titulo):
+    # ?ultimas=N muestra los N registros más recientes; si no, se pagina con ?pagina=
+    ultimas = request.args.get("ultimas", "")
+    if ultimas.isdigit():
+        return render_template("resultado.html", titulo=titulo, items=archivo.ultimas(min(int(ultimas), 1000)))
+    pagina = pagina_actual()
+    items, hay_mas = archivo.leer_pagina(pagina, POR_PAGINA)
+    return render_template("resultado.html", titulo=titulo, items=items, pagina=pagina, hay_mas=hay_mas)
+
 # Rutas principales
 @app.route("/")
 def index():
@@ -46,17 +93,12 @@ def guardar_txt():
     detalle = request.form.get("detalle", "").strip()
     if not nombre:
         return "Nombre requerido", 400
-    with open(TXT_PATH, "a", encoding="utf-8") as f:
-        f.write(f"{nombre} | {detalle}\n")
+    archivo_txt.agregar(f"{nombre} | {detalle}\n")
     return redirect(url_for("leer_txt"))
 
 @app.route("/leer_txt")
 def leer_txt():
-    contenido = []
-    if TXT_PATH.exists():
-        with open(TXT_PATH, "r", encoding="utf-8") as f:
-            contenido = [line.strip() for line in f.readlines()]
-    return render_template("resultado.html", titulo="Contenido TXT", items=contenido)
+    return leer_indexado(archivo_txt, "Contenido TXT")
 
 # JSON
 @app.route("/guardar_json", methods=["POST"])
@@ -64,28 +106,15 @@ def guardar_json():
     item = {"nombre": request.form.get("nombre","").strip(), "detalle": request.form.get("detalle","").strip()}
     if item["nombre"] == "":
         return "Nombre requerido", 400
-    data = []
-    if JSON_PATH.exists():
-        with open(JSON_PATH, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-            except Exception:
-                data = []
-    data.append(item)
-    with open(JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    registro_json.agregar(item)
     return redirect(url_for("leer_json"))
 
 @app.route("/leer_json")
 def leer_json():
-    data = []
-    if JSON_PATH.exists():
-        with open(JSON_PATH, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-            except Exception:
-                data = []
-    return render_template("resultado.html", titulo="Contenido JSON", items=[f'{d.get("nombre")} - {d.get("detalle")}' for d in data])
+    pagina = pagina_actual()
+    data, hay_mas = registro_json.leer_pagina(pagina, POR_PAGINA)
+    return render_template("resultado.html", titulo="Contenido JSON", items=[f'{d.get("nombre")} - {d.get("detalle")}' for d in data],
+                           pagina=pagina, hay_mas=hay_mas)
 
 # CSV
 @app.route("/guardar_csv", methods=["POST"])
@@ -94,32 +123,55 @@ def guardar_csv():
     detalle = request.form.get("detalle","").strip()
     if nombre == "":
         return "Nombre requerido", 400
-    file_exists = CSV_PATH.exists()
-    with open(CSV_PATH, "a", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(["nombre","detalle"])
-        writer.writerow([nombre, detalle])
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([nombre, detalle])
+    archivo_csv.agregar(buffer.getvalue())
     return redirect(url_for("leer_csv"))
 
 @app.route("/leer_csv")
 def leer_csv():
-    rows = []
-    if CSV_PATH.exists():
-        with open(CSV_PATH, "r", encoding="utf-8") as csvfile:
-            reader = csv.reader(csvfile)
-            rows = [", ".join(row) for row in reader]
-    return render_template("resultado.html", titulo="Contenido CSV", items=rows)
+    return leer_indexado(archivo_csv, "Contenido CSV")
 
 # SQLite (Usuarios) usando SQLAlchemy
 @app.route("/usuarios")
 def usuarios():
+    # Paginación por clave: ?desde=<último id de la página anterior>, cualquier página cuesta lo mismo
+    desde = request.args.get("desde", 0, type=int)
     session = SessionLocal()
     try:
-        usuarios = session.query(Usuario).all()
-        return render_template("resultado.html", titulo="Usuarios (SQLite)", items=[f"{u.id} | {u.nombre} | {u.email}" for u in usuarios])
+        filas = session.execute(
+            select(Usuario.id, Usuario.nombre, Usuario.email)
+            .where(Usuario.id > desde).order_by(Usuario.id).limit(POR_PAGINA + 1)
+        ).all()
     finally:
         session.close()
+    hay_mas = len(filas) > POR_PAGINA
+    filas = filas[:POR_PAGINA]
+    return render_template("resultado.html", titulo="Usuarios (SQLite)", items=[f"{u.id} | {u.nombre} | {u.email}" for u in filas],
+                           desde=desde, siguiente=url_for("usuarios", desde=filas[-1].id) if hay_mas else None)
+
+@app.route("/usuarios/exportar")
+def usuarios_exportar():
+    # Todos los usuarios en CSV, en streaming: yield_per trae las filas por bloques sin cargarlas todas
+    def generar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(["id", "nombre", "email"])
+        session = SessionLocal()
+        try:
+            resultado = session.execute(
+                select(Usuario.id, Usuario.nombre, Usuario.email).order_by(Usuario.id)
+                .execution_options(yield_per=LOTE_USUARIOS)
+            )
+            for bloque in resultado.partitions():
+                escritor.writerows(bloque)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        finally:
+            session.close()
+        yield buffer.getvalue()
+    return Response(generar(), mimetype="text/csv", headers={"Content-Disposition": "attachment; filename=usuarios.csv"})
 
 @app.route("/usuarios/agregar", methods=["POST"])
 def usuarios_agregar():
@@ -129,15 +181,68 @@ def usuarios_agregar():
         return "Nombre y email requeridos", 400
     session = SessionLocal()
     try:
-        # comprobar duplicado por email
-        if session.query(Usuario).filter_by(email=email).first():
-            return "Email ya existe", 400
-        u = Usuario(nombre=nombre, email=email)
-        session.add(u)
+        # El duplicado lo detecta el índice único de email al insertar, sin consultar antes
+        session.add(Usuario(nombre=nombre, email=email))
         session.commit()
+    except IntegrityError:
+        session.rollback()
+        return "Email ya existe", 400
     finally:
         session.close()
     return redirect(url_for("usuarios"))
 
+def filas_usuarios():
+    # (línea, fila) de una lista JSON, de NDJSON o de CSV con cabecera nombre,email (estos dos en streaming)
+    # request.stream no tiene buffer: leerlo por líneas sin BufferedReader va byte a byte
+    if request.mimetype == NDJSON:
+        def ndjson():
+            for n, linea in enumerate(io.BufferedReader(request.stream), start=1):
+                if linea.strip():
+                    try:
+                        yield n, json.loads(linea)
+                    except ValueError:
+                        yield n, None
+        return ndjson()
+    if request.mimetype == "text/csv":
+        lector = csv.DictReader(io.TextIOWrapper(io.BufferedReader(request.stream), encoding="utf-8-sig",
+                                                 errors="replace", newline=""))
+        return ((lector.line_num, fila) for fila in lector)
+    if request.is_json:
+        datos = request.get_json(silent=True)
+        if not isinstance(datos, list):
+            abort(400, "Se esperaba una lista JSON de usuarios")
+        return enumerate(datos, start=1)
+    abort(415, f"Se esperaba Content-Type: application/json, {NDJSON} o text/csv")
+
+@app.route("/usuarios/lote", methods=["POST"])
+def usuarios_lote():
+    """Alta de muchos usuarios ({"nombre", "email"} por fila) en una sola transacción.
+
+    Se insertan en bloques de LOTE_USUARIOS con INSERT ... ON CONFLICT(email) DO NOTHING:
+    los emails que ya existen (o repetidos en el mismo envío) se cuentan como duplicados.
+    Devuelve el resumen con los errores por línea; 200 si se insertaron todos, 207 si no.
+    """
+    insertar = sqlite_insert(Usuario).on_conflict_do_nothing(index_elements=["email"])
+    recibidos = insertados = 0
+    errores = []
+    bloque = []
+    with engine.begin() as conn:
+        for linea, fila in filas_usuarios():
+            recibidos += 1
+            nombre = str(fila.get("nombre") or "").strip() if isinstance(fila, dict) else ""
+            email = str(fila.get("email") or "").strip() if isinstance(fila, dict) else ""
+            if not nombre or not email:
+                errores.append({"linea": linea, "error": "Nombre y email requeridos" if isinstance(fila, dict) else "Se esperaba un objeto JSON"})
+                continue
+            bloque.append({"nombre": nombre, "email": email})
+            if len(bloque) >= LOTE_USUARIOS:
+                insertados += conn.execute(insertar, bloque).rowcount
+                bloque.clear()
+        if bloque:
+            insertados += conn.execute(insertar, bloque).rowcount
+    duplicados = recibidos - len(errores) - insertados
+    return jsonify(recibidos=recibidos, insertados=insertados, duplicados=duplicados, con_error=len(errores),
+                   errores=errores[:MAX_ERRORES]), 200 if insertados == recibidos else 207
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class RecursoPerezoso:
+    """Crea un recurso costoso (el Inventario) la primera vez que se pide, no al importar.
+
+    Si la creación falla (la BD no responde, por ejemplo) obtener() devuelve None y se
+    reintenta más tarde, con una espera que se duplica en cada fallo hasta espera_max:
+    un fallo al arrancar ya no deja el worker sin inventario para siempre. Mientras un
+    hilo lo crea, el resto espera a que termine en lugar de crearlo otra vez.
+    """
+
+    def __init__(self, fabrica: Callable[[], object], nombre: str = "recurso",
+                 espera_min: float = 1.0, espera_max: float = 60.0):
+        self._fabrica = fabrica
+        self.nombre = nombre
+        self.espera_min = espera_min
+        self.espera_max = espera_max
+        self._lock = threading.Lock()
+        self._valor: Optional[object] = None
+        self._reintentar_en = 0.0
+        self._intentos = 0
+        self._fallos_seguidos = 0
+        self._ultimo_error: Optional[str] = None
+        self._duracion: Optional[float] = None
+
+    def obtener(self) -> Optional[object]:
+        valor = self._valor
+        if valor is not None:
+            return valor
+        if time.monotonic() < self._reintentar_en:
+            return None
+        with self._lock:
+            if self._valor is not None:
+                return self._valor
+            if time.monotonic() < self._reintentar_en:
+                return None
+            self._intentos += 1
+            inicio = time.perf_counter()
+            try:
+                self._valor = self._fabrica()
+            except Exception as e:
+                self._fallos_seguidos += 1
+                self._ultimo_error = str(e)
+                espera = min(self.espera_min * 2 ** (self._fallos_seguidos - 1), self.espera_max)
+                self._reintentar_en = time.monotonic() + espera
+                print(f"No se pudo inicializar {self.nombre} (intento {self._intentos}): {e}. "
+                      f"Se reintentará en {espera:g}s")
+                return None
+            self._duracion = time.perf_counter() - inicio
+            self._fallos_seguidos = 0
+            self._ultimo_error = None
+            return self._valor
+
+    @property
+    def listo(self) -> bool:
+        return self._valor is not None
+
+    def estado(self) -> Dict:
+        return {
+            "listo": self.listo,
+            "intentos": self._intentos,
+            "ultimo_error": self._ultimo_error,
+            "reintento_en_s": round(max(self._reintentar_en - time.monotonic(), 0.0), 1) if not self.listo else 0.0,
+            "duracion_s": round(self._duracion, 3) if self._duracion is not None else None,
+        }
@@ -0,0 +1,322 @@
+"""Modo ASGI: la misma app servida por un bucle de eventos (uvicorn asgi:app --workers 4).
+
+Lo que espera a la BD se hace con corrutinas (aiomysql, conexion.pool_async) antes de
+llegar a Flask: cargar el usuario de la sesión, sincronizar el inventario y, en el login,
+buscar al usuario y comprobar la contraseña. Después, las vistas que ya solo leen de
+memoria (listados, resumen, API de lectura, login) se ejecutan en el propio bucle; los
+ajustes de stock, altas y bajas de la API tienen versión asíncrona aquí mismo, y el resto
+(registro, formularios, importación y exportación, estáticos...) pasa por la app Flask
+en un pool de ASGI_HILOS hilos, como con gunicorn. app.py sigue sirviendo el modo WSGI.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from flask import abort, jsonify, url_for
+from itsdangerous import BadSignature
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_cookie
+
+from acceso import LOGIN_INTENTOS_SQLITE, HashSaturado
+from api import _cuerpo_json, _inventario, error_json, etag_producto, leer_ajustes, producto_json, respuesta_ajustes
+from app import LOGIN_PRECARGADO, app as flask_app, ejecutor_hash, inventario_perezoso, limitador_login
+from conexion.conexion import pool_async
+from forms import LoginForm
+from importacion import validar_fila
+from metricas import MEDIDA_EXTERNA, empezar_peticion, terminar_peticion
+from models import cargar_usuario_cacheado_async, cargar_usuario_por_email_async
+
+log = logging.getLogger("asgi")
+
+ASGI_HILOS = int(os.environ.get("ASGI_HILOS", "16"))
+# Los cuerpos más grandes (importaciones, imágenes) se guardan en un temporal en disco
+CUERPO_EN_MEMORIA = 1024 * 1024
+
+# Vistas que, con el usuario y el inventario ya cargados, no hacen E/S: se ejecutan en el bucle
+EN_BUCLE = {"index", "about", "login", "logout", "listar_productos", "inventario", "resumen_inventario",
+            "resumen_inventario_json", "api.listar", "api.obtener"}
+
+_hilos = ThreadPoolExecutor(ASGI_HILOS, thread_name_prefix="asgi")
+_serializador = []
+
+
+# --- Versiones asíncronas de las escrituras de la API (mismas respuestas que api.py) ---
+
+async def _api_crear(inv):
+    producto, errores = validar_fila(_cuerpo_json())
+    if errores:
+        return jsonify({"error": "Datos inválidos", "errores": errores}), 422
+    if not await inv.agregar_producto_async(producto):
+        abort(409, "No se pudo crear el producto (¿el id ya existe?)")
+    creado = inv.obtener(producto.id_producto) or producto
+    respuesta = jsonify(producto_json(creado))
+    respuesta.status_code = 201
+    respuesta.headers["Location"] = url_for("api.obtener", id_producto=creado.id_producto)
+    respuesta.set_etag(etag_producto(creado))
+    return respuesta
+
+
+async def _api_eliminar(inv, id_producto):
+    if not await inv.eliminar_producto_async(id_producto):
+        abort(404, "Producto no encontrado")
+    return "", 204
+
+
+async def _api_ajustar_stock(inv):
+    lineas, todo_o_nada = leer_ajustes(_cuerpo_json())
+    try:
+        resultado = await inv.ajustar_stock_lote_async(lineas, todo_o_nada=todo_o_nada)
+    except Exception:
+        abort(503, "No se pudo ajustar el stock")
+    cuerpo, estado = respuesta_ajustes(resultado)
+    return jsonify(cuerpo), estado
+
+
+NATIVAS = {"api.crear": _api_crear, "api.eliminar": _api_eliminar, "api.ajustar_stock": _api_ajustar_stock}
+
+
+# --- De ASGI a WSGI ---
+
+def _environ(scope, cuerpo) -> Dict:
+    servidor = scope.get("server") or ("localhost", 80)
+    cliente = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": servidor[0],
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": cliente[0],
+        "REMOTE_PORT": str(cliente[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": cuerpo,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        MEDIDA_EXTERNA: True,
+    }
+    for nombre, valor in scope["headers"]:
+        nombre = nombre.decode("latin-1").upper().replace("-", "_")
+        valor = valor.decode("latin-1")
+        if nombre in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[nombre] = valor
+            continue
+        clave = f"HTTP_{nombre}"
+        environ[clave] = f"{environ[clave]},{valor}" if clave in environ else valor
+    return environ
+
+
+async def _leer_cuerpo(receive):
+    cuerpo = tempfile.SpooledTemporaryFile(max_size=CUERPO_EN_MEMORIA)
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] == "http.disconnect":
+            break
+        cuerpo.write(mensaje.get("body", b""))
+        if not mensaje.get("more_body"):
+            break
+    cuerpo.seek(0)
+    return cuerpo
+
+
+def _llamar_wsgi(wsgi, environ):
+    inicio = {}
+
+    def start_response(estado, cabeceras, exc_info=None):
+        inicio["estado"] = int(estado.split(" ", 1)[0])
+        inicio["cabeceras"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in cabeceras]
+
+    partes = wsgi(environ, start_response)
+    return inicio, partes
+
+
+def _siguiente(partes):
+    return next(partes, None)
+
+
+async def _enviar(send, inicio, partes, ejecutar):
+    # ejecutar(funcion, *args): en el bucle o en un hilo; el cuerpo de Flask puede ser un generador
+    iterador = iter(partes)
+    try:
+        await send({"type": "http.response.start", "status": inicio["estado"], "headers": inicio["cabeceras"]})
+        while True:
+            parte = await ejecutar(_siguiente, iterador)
+            if parte is None:
+                break
+            if parte:
+                await send({"type": "http.response.body", "body": parte, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(partes, "close"):
+            await ejecutar(partes.close)
+
+
+# --- Fase asíncrona ---
+
+def _usuario_de_sesion(environ) -> Optional[str]:
+    # Se lee la cookie de sesión de Flask para cargar el usuario antes de que lo pida Flask-Login
+    valor = parse_cookie(environ.get("HTTP_COOKIE", "")).get(flask_app.config["SESSION_COOKIE_NAME"])
+    if not valor:
+        return None
+    if not _serializador:
+        _serializador.append(flask_app.session_interface.get_signing_serializer(flask_app))
+    try:
+        datos = _serializador[0].loads(valor, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return datos.get("_user_id")
+
+
+async def _precargar_login(environ, cuerpo):
+    # Lo que haría login() con E/S, hecho sin bloquear; si el formulario no vale, login() responde como siempre
+    try:
+        with flask_app.request_context(environ):
+            form = LoginForm()
+            if not form.validate_on_submit():
+                return None
+            ip, email = environ["REMOTE_ADDR"], form.email.data
+            if limitador_login.espera(ip=ip, email=email):
+                return None
+            limitador_login.intento(ip=ip)
+            usuario = await cargar_usuario_por_email_async(email)
+            try:
+                valida = usuario is not None and await ejecutor_hash.comprobar_async(usuario.password, form.password.data)
+            except HashSaturado:
+                valida = None
+        return {"email": email, "usuario": usuario, "valida": valida}
+    finally:
+        cuerpo.seek(0)
+
+
+async def _preparar():
+    inv = inventario_perezoso.obtener() if inventario_perezoso.listo else await asyncio.to_thread(inventario_perezoso.obtener)
+    if inv:
+        await inv.sincronizar_si_toca_async()
+    return inv
+
+
+def _en_bucle(endpoint, environ, id_usuario, usuario) -> bool:
+    if endpoint not in EN_BUCLE:
+        return False
+    if id_usuario is not None and usuario is None:
+        return False  # Flask-Login lo buscaría en la BD
+    if id_usuario is None and flask_app.config.get("REMEMBER_COOKIE_NAME", "remember_token") in environ.get("HTTP_COOKIE", ""):
+        return False
+    if endpoint == "api.listar" and ("ndjson" in environ["QUERY_STRING"] or "ndjson" in environ.get("HTTP_ACCEPT", "")):
+        return False  # En streaming, sin límite: mejor en un hilo
+    if endpoint == "login" and LOGIN_INTENTOS_SQLITE:
+        return False  # Los intentos están en un SQLite: se consultan desde un hilo
+    return True
+
+
+class AppASGI:
+    def __init__(self, wsgi):
+        self.wsgi = wsgi
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        empezar_peticion()
+        cuerpo = await _leer_cuerpo(receive)
+        environ = _environ(scope, cuerpo)
+        try:
+            endpoint, argumentos = flask_app.url_map.bind("localhost").match(environ["PATH_INFO"], scope["method"])
+        except HTTPException:
+            endpoint, argumentos = None, {}  # 404, 405 o redirección: los responde Flask
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self._atender(environ, cuerpo, endpoint, argumentos, enviar)
+        except Exception:
+            log.exception("Error atendiendo %s %s", scope["method"], scope["path"])
+            if estado[0] == 500:
+                await send({"type": "http.response.start", "status": 500,
+                            "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+                await send({"type": "http.response.body", "body": b"Internal Server Error"})
+        finally:
+            cuerpo.close()
+            url = environ["PATH_INFO"] + (f"?{environ['QUERY_STRING']}" if environ["QUERY_STRING"] else "")
+            terminar_peticion(endpoint or "sin_ruta", scope["method"], estado[0], url)
+
+    async def _atender(self, environ, cuerpo, endpoint, argumentos, send):
+        contexto = contextvars.copy_context()
+        inv = usuario = None
+        id_usuario = _usuario_de_sesion(environ)
+        if endpoint in EN_BUCLE or endpoint in NATIVAS:
+            inv = await _preparar()
+            if id_usuario is not None:
+                usuario = await cargar_usuario_cacheado_async(id_usuario)
+
+        if endpoint in NATIVAS:
+            inicio, partes = await self._nativa(NATIVAS[endpoint], environ, inv, usuario, argumentos)
+            return await _enviar(send, inicio, partes, self._en_el_bucle)
+
+        if _en_bucle(endpoint, environ, id_usuario, usuario):
+            if endpoint == "login" and environ["REQUEST_METHOD"] == "POST":
+                precarga = await _precargar_login(_environ_copia(environ), cuerpo)
+                if precarga is not None:
+                    environ[LOGIN_PRECARGADO] = precarga
+            inicio, partes = contexto.run(_llamar_wsgi, self.wsgi, environ)
+
+            async def en_contexto(funcion, *args):
+                return contexto.run(funcion, *args)
+            return await _enviar(send, inicio, partes, en_contexto)
+
+        bucle = asyncio.get_running_loop()
+
+        async def en_hilo(funcion, *args):
+            return await bucle.run_in_executor(_hilos, contexto.run, funcion, *args)
+        inicio, partes = await en_hilo(_llamar_wsgi, self.wsgi, environ)
+        await _enviar(send, inicio, partes, en_hilo)
+
+    @staticmethod
+    async def _en_el_bucle(funcion, *args):
+        return funcion(*args)
+
+    async def _nativa(self, vista, environ, inv, usuario, argumentos):
+        with flask_app.request_context(environ):
+            try:
+                if usuario is None and not flask_app.config.get("LOGIN_DISABLED"):
+                    abort(401, "Inicia sesión en /login")
+                rv = await vista(inv if inv is not None else _inventario(), **argumentos)
+            except HTTPException as e:
+                rv = error_json(e)
+            respuesta = flask_app.make_response(rv)
+            return _llamar_wsgi(respuesta, environ)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                # Como crear_app(precargar=True): el catálogo se carga antes de aceptar peticiones
+                await asyncio.to_thread(inventario_perezoso.obtener)
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                await pool_async.cerrar()
+                _hilos.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _environ_copia(environ) -> Dict:
+    # login() vuelve a leer el formulario: la fase asíncrona trabaja con su propio environ
+    return {k: v for k, v in environ.items() if not k.startswith("werkzeug.")}
+
+
+app = AppASGI(flask_app.wsgi_app)
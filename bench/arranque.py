@@ -0,0 +1,183 @@
+"""Arranque de la app: tiempo y memoria de un worker, antes y después de la carga perezosa.
+
+  proceso:  un proceso importa app y atiende su primera petición (cliente de pruebas de Flask).
+            "antes" reproduce el arranque anterior: esquema comprobado y catálogo cargado al
+            importar. "perezoso" es el actual: importar no toca la BD y la carga la hace la
+            primera petición.
+  gunicorn: arranca gunicorn con --workers, sin precarga (app:app) y con precarga en el
+            maestro (--preload 'app:crear_app(precargar=True)'), y mide el tiempo hasta
+            atender y la memoria de todos los procesos: RSS y PSS (las páginas compartidas
+            entre procesos cuentan repartidas, así se ve lo que ahorra el copy-on-write).
+
+Usa una base SQLite temporal con --productos productos (no necesita MySQL para el
+inventario; app sigue importando el conector de MySQL para los usuarios).
+
+Uso:
+  python bench/arranque.py proceso --productos 100000
+  python bench/arranque.py gunicorn --productos 100000 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+PALABRAS = ["café", "azúcar", "arroz", "aceite", "jabón", "leche", "té", "atún", "galletas", "harina"]
+
+# Se ejecuta en un proceso nuevo para que cada medida parta de cero
+MEDIR_PROCESO = """
+import json, os, resource, sys, time
+sys.path.insert(0, os.getcwd())
+inicio = time.perf_counter()
+import app as aplicacion
+if os.environ.get("ARRANQUE_ANTES") == "1":
+    aplicacion.obtener_inventario()
+importar = time.perf_counter() - inicio
+cargado_al_importar = aplicacion.inventario_perezoso.listo
+aplicacion.app.config["LOGIN_DISABLED"] = True
+cliente = aplicacion.app.test_client()
+t0 = time.perf_counter()
+respuesta = cliente.get("/inventario/resumen.json")
+primera = time.perf_counter() - t0
+print(json.dumps({
+    "importar_s": importar,
+    "cargado_al_importar": cargado_al_importar,
+    "primera_peticion_s": primera,
+    "listo_s": time.perf_counter() - inicio,
+    "estado": respuesta.status_code,
+    "productos": respuesta.get_json().get("productos"),
+    "rss_max_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def sembrar(ruta, productos):
+    from almacenamiento import RepositorioSQLite
+    from inventario import Producto
+
+    repo = RepositorioSQLite(ruta)
+    repo.preparar()
+    rnd = random.Random(1)
+    for inicio in range(0, productos, 5000):
+        repo.guardar_lote([
+            Producto(None, f"{rnd.choice(PALABRAS).capitalize()} {rnd.choice(PALABRAS)} {rnd.randint(1, 10 ** 6)}",
+                     round(rnd.uniform(0.5, 500), 2), rnd.randint(0, 50), None)
+            for _ in range(min(5000, productos - inicio))
+        ])
+
+
+def entorno(ruta, **extra):
+    return dict(os.environ, INVENTARIO_BACKEND="sqlite", INVENTARIO_SQLITE_PATH=ruta, **extra)
+
+
+def medir_proceso(ruta, repeticiones):
+    print(f"{'arranque':<10} {'importar ms':>12} {'BD al importar':>15} {'1ª petición ms':>15} {'listo ms':>10} {'RSS MB':>8}")
+    for nombre, extra in (("antes", {"ARRANQUE_ANTES": "1", "INVENTARIO_PREPARAR": "1"}), ("perezoso", {})):
+        medidas = []
+        for _ in range(repeticiones):
+            salida = subprocess.run([sys.executable, "-c", MEDIR_PROCESO], cwd=RAIZ, env=entorno(ruta, **extra),
+                                    capture_output=True, text=True, check=True)
+            medidas.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+        m = min(medidas, key=lambda r: r["listo_s"])
+        print(f"{nombre:<10} {m['importar_s'] * 1000:>12.1f} {'sí' if m['cargado_al_importar'] else 'no':>15} "
+              f"{m['primera_peticion_s'] * 1000:>15.1f} {m['listo_s'] * 1000:>10.1f} {m['rss_max_mb']:>8.1f}")
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def procesos(pid):
+    # El maestro y sus workers
+    hijos = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    return [pid] + [int(h) for h in hijos]
+
+
+def memoria(pid):
+    valores = {}
+    for linea in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        partes = linea.split()
+        if partes[0] in ("Rss:", "Pss:"):
+            valores[partes[0][:-1].lower()] = int(partes[1]) / 1024
+    return valores
+
+
+def medir_gunicorn(ruta, workers, peticiones):
+    print(f"{'modo':<10} {'atiende s':>10} {'RSS total MB':>13} {'PSS total MB':>13} {'PSS/worker MB':>14}")
+    for nombre, extra, objetivo in (("perezoso", [], "app:app"),
+                                    ("precarga", ["--preload"], "app:crear_app(precargar=True)")):
+        puerto = puerto_libre()
+        url = f"http://127.0.0.1:{puerto}/about/"
+        inicio = time.perf_counter()
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{puerto}", *extra, objetivo],
+            cwd=RAIZ, env=entorno(ruta), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            atiende = None
+            for _ in range(600):
+                try:
+                    urllib.request.urlopen(url, timeout=5).read()
+                    atiende = time.perf_counter() - inicio
+                    break
+                except Exception:
+                    time.sleep(0.1)
+            if atiende is None:
+                sys.exit("gunicorn no llegó a atender")
+
+            # Peticiones concurrentes para que todos los workers tengan el catálogo cargado
+            def pedir():
+                for _ in range(peticiones // 16):
+                    urllib.request.urlopen(url, timeout=60).read()
+
+            hilos = [threading.Thread(target=pedir) for _ in range(16)]
+            for h in hilos:
+                h.start()
+            for h in hilos:
+                h.join()
+            medidas = [memoria(pid) for pid in procesos(servidor.pid)]
+            rss = sum(m["rss"] for m in medidas)
+            pss = sum(m["pss"] for m in medidas)
+            print(f"{nombre:<10} {atiende:>10.2f} {rss:>13.1f} {pss:>13.1f} {pss / max(len(medidas) - 1, 1):>14.1f}")
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="modo", required=True)
+    p = sub.add_parser("proceso")
+    p.add_argument("--productos", type=int, default=100_000)
+    p.add_argument("--repeticiones", type=int, default=3)
+    p = sub.add_parser("gunicorn")
+    p.add_argument("--productos", type=int, default=100_000)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--peticiones", type=int, default=400)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "arranque.db")
+        inicio = time.perf_counter()
+        sembrar(ruta, args.productos)
+        print(f"{args.productos} productos sembrados en {time.perf_counter() - inicio:.1f}s")
+        if args.modo == "proceso":
+            medir_proceso(ruta, args.repeticiones)
+        else:
+            medir_gunicorn(ruta, args.workers, args.peticiones)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Lectura paginada de datos.txt con índice de offsets frente a readlines().
+
+Genera un archivo del tamaño pedido (por defecto 2 GB), construye el índice una vez y mide
+el tiempo de leer una página al principio, en medio y al final, y los últimos N registros.
+
+Uso: python bench/bench_archivos.py [--gb 2] [--dir /tmp] [--comparar]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from registros import ArchivoIndexado  # noqa: E402
+
+POR_PAGINA = 50
+
+
+def generar(path: Path, tamano: int):
+    bloque = "".join(f"Producto {i} | detalle de prueba número {i}\n" for i in range(10_000)).encode("utf-8")
+    with open(path, "wb") as f:
+        escrito = 0
+        while escrito < tamano:
+            f.write(bloque)
+            escrito += len(bloque)
+
+
+def cronometrar(funcion, repeticiones=20):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gb", type=float, default=2.0)
+    parser.add_argument("--dir", default=tempfile.gettempdir())
+    parser.add_argument("--comparar", action="store_true", help="Mide también readlines() (lento y usa mucha RAM)")
+    args = parser.parse_args()
+
+    path = Path(args.dir) / "bench_datos.txt"
+    archivo = ArchivoIndexado(path)
+    try:
+        inicio = time.perf_counter()
+        generar(path, int(args.gb * 1024 ** 3))
+        print(f"Archivo generado: {path.stat().st_size / 1024 ** 3:.2f} GB en {time.perf_counter() - inicio:.1f}s")
+
+        inicio = time.perf_counter()
+        total = archivo.total()
+        print(f"Índice inicial: {total} registros en {time.perf_counter() - inicio:.1f}s (solo la primera vez)")
+
+        ultima = (total + POR_PAGINA - 1) // POR_PAGINA
+        for nombre, pagina in [("primera", 1), ("media", ultima // 2), ("última", ultima)]:
+            ms = cronometrar(lambda: archivo.leer_pagina(pagina, POR_PAGINA))
+            print(f"Página {nombre:>8} ({pagina}): {ms:.3f} ms")
+        print(f"Últimos {POR_PAGINA}: {cronometrar(lambda: archivo.ultimas(POR_PAGINA)):.3f} ms")
+        nuevo = "nuevo | registro\n"
+        print(f"agregar(): {cronometrar(lambda: archivo.agregar(nuevo), 200):.3f} ms")
+
+        if args.comparar:
+            def readlines():
+                with open(path, "r", encoding="utf-8") as f:
+                    return [line.strip() for line in f.readlines()]
+            print(f"readlines() completo: {cronometrar(readlines, 1):.0f} ms")
+    finally:
+        for p in (path, archivo.idx_path, path.with_name(path.name + ".lock")):
+            if p.exists():
+                os.remove(p)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compara el índice de trigramas con un LIKE '%q%' (SQLite en memoria como sustituto de MySQL).
+
+Uso: python bench/bench_busqueda.py [--tamanos 10000 100000 1000000] [--consultas 200]
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from busqueda import IndiceBusqueda  # noqa: E402
+
+PALABRAS = [
+    "azúcar", "café", "leche", "arroz", "aceite", "jabón", "champú", "té", "atún",
+    "galletas", "harina", "limón", "plátano", "piña", "mantequilla", "yogur", "queso",
+    "pan", "maíz", "frijol", "lenteja", "camarón", "salsa", "jamón", "cebolla", "ñame",
+]
+MARCAS = ["La Económica", "Doña María", "El Campesino", "Súper", "Andina", "Del Valle"]
+CONSULTAS = ["cafe", "azu", "limon", "dona maria", "pin", "jabon", "queso", "ñam", "econ", "xyz"]
+
+
+def generar_nombres(n, rnd):
+    return [
+        f"{rnd.choice(PALABRAS).capitalize()} {rnd.choice(PALABRAS)} {rnd.choice(MARCAS)} {i}"
+        for i in range(n)
+    ]
+
+
+def medir(funcion, consultas):
+    inicio = time.perf_counter()
+    total = 0
+    for q in consultas:
+        total += len(funcion(q))
+    return (time.perf_counter() - inicio) / len(consultas), total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+    rnd = random.Random(42)
+    consultas = [rnd.choice(CONSULTAS) for _ in range(args.consultas)]
+
+    print(f"{'productos':>10} {'construir(s)':>13} {'indice(ms)':>11} {'LIKE(ms)':>10} {'x':>7}")
+    for n in args.tamanos:
+        nombres = generar_nombres(n, rnd)
+
+        inicio = time.perf_counter()
+        indice = IndiceBusqueda()
+        indice.construir(enumerate(nombres, start=1))
+        construir = time.perf_counter() - inicio
+
+        db = sqlite3.connect(":memory:")
+        db.execute("CREATE TABLE productos (id_producto INTEGER PRIMARY KEY, nombre TEXT NOT NULL)")
+        db.executemany("INSERT INTO productos VALUES (?, ?)", enumerate(nombres, start=1))
+        db.execute("CREATE INDEX idx_nombre ON productos (nombre)")
+
+        def like(q):
+            return db.execute("SELECT id_producto FROM productos WHERE nombre LIKE ?", (f"%{q}%",)).fetchall()
+
+        # El LIKE es más lento: se limita el número de consultas para tamaños grandes
+        t_indice, _ = medir(indice.buscar, consultas)
+        t_like, _ = medir(like, consultas[:max(10, args.consultas * 10_000 // n)])
+        print(f"{n:>10} {construir:>13.2f} {t_indice * 1000:>11.3f} {t_like * 1000:>10.3f} {t_like / t_indice:>7.1f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Muchos clientes a la vez contra los dos modos de servir la app: WSGI (gunicorn con hilos,
+app:app) y ASGI (uvicorn, asgi:app).
+
+Cada cliente mantiene su conexión abierta (keep-alive) y encadena peticiones sin pausa:
+GET /api/v1/productos/<id> y, con --escrituras, una fracción de ajustes de stock
+(POST /api/v1/productos/stock). Para cada número de clientes informa peticiones por
+segundo, latencia p50/p99, errores (5xx, conexiones rechazadas o cortadas y esperas de
+más de --timeout s) y la memoria de todos los procesos del servidor al terminar.
+
+Por defecto el inventario está en un SQLite temporal con --productos productos; con
+--backend mysql se usa la BD configurada (DB_HOST...), que es donde el modo ASGI espera
+a la red sin ocupar hilos. Los servidores arrancan con LOGIN_DISABLED=1. Necesita
+gunicorn y uvicorn instalados (--modos para probar solo uno).
+
+Uso:
+  python bench/concurrencia.py --clientes 100,500,1000,2000 --workers 2
+  python bench/concurrencia.py --backend mysql --escrituras 0.2 --modos asgi
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)] if ordenados else 0.0
+
+
+def sembrar(ruta, productos):
+    from almacenamiento import RepositorioSQLite
+    from inventario import Producto
+
+    repo = RepositorioSQLite(ruta)
+    repo.preparar()
+    for inicio in range(0, productos, 5000):
+        repo.guardar_lote([Producto(None, f"Producto {n}", 1.5, 10 ** 6, None)
+                           for n in range(inicio, min(productos, inicio + 5000))])
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_total(pid):
+    # El maestro y sus workers (Linux)
+    try:
+        hijos = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+        total = 0
+        for p in [pid] + [int(h) for h in hijos]:
+            for linea in Path(f"/proc/{p}/status").read_text().splitlines():
+                if linea.startswith("VmRSS:"):
+                    total += int(linea.split()[1])
+        return total / 1024
+    except OSError:
+        return float("nan")
+
+
+def arrancar(modo, puerto, args, env):
+    if modo == "wsgi":
+        orden = [sys.executable, "-m", "gunicorn", "-k", "gthread", "-w", str(args.workers), "--threads", str(args.hilos),
+                 "--backlog", "4096", "-b", f"127.0.0.1:{puerto}", "app:crear_app(precargar=True)"]
+    else:
+        orden = [sys.executable, "-m", "uvicorn", "asgi:app", "--workers", str(args.workers), "--backlog", "4096",
+                 "--host", "127.0.0.1", "--port", str(puerto), "--log-level", "warning", "--no-access-log"]
+    servidor = subprocess.Popen(orden, cwd=RAIZ, env=dict(env, ASGI_HILOS=str(args.hilos)),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(600):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{puerto}/api/v1/productos/1", timeout=5).read()
+            return servidor
+        except Exception:
+            if servidor.poll() is not None:
+                sys.exit(f"El servidor {modo} no arrancó: {' '.join(orden)}")
+            time.sleep(0.1)
+    servidor.terminate()
+    sys.exit(f"El servidor {modo} no llegó a atender")
+
+
+async def leer_respuesta(lector):
+    cabecera = await lector.readuntil(b"\r\n\r\n")
+    estado = int(cabecera.split(b" ", 2)[1])
+    largo, troceado = 0, False
+    for linea in cabecera.lower().split(b"\r\n"):
+        if linea.startswith(b"content-length:"):
+            largo = int(linea.split(b":", 1)[1])
+        elif linea.startswith(b"transfer-encoding:") and b"chunked" in linea:
+            troceado = True
+    if not troceado:
+        await lector.readexactly(largo)
+        return estado
+    while True:
+        trozo = int((await lector.readuntil(b"\r\n")).split(b";")[0], 16)
+        await lector.readexactly(trozo + 2)
+        if trozo == 0:
+            return estado
+
+
+async def cliente(n, puerto, args, fin, datos):
+    rnd = random.Random(n)
+    conexion = None
+    while time.perf_counter() < fin:
+        if rnd.random() < args.escrituras:
+            cuerpo = b'{"ajustes": [{"id_producto": %d, "delta": -1}]}' % rnd.randint(1, args.productos)
+            peticion = (b"POST /api/v1/productos/stock HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+                        b"Content-Length: %d\r\n\r\n%s" % (len(cuerpo), cuerpo))
+        else:
+            peticion = b"GET /api/v1/productos/%d HTTP/1.1\r\nHost: x\r\n\r\n" % rnd.randint(1, args.productos)
+        t0 = time.perf_counter()
+        try:
+            if conexion is None:
+                conexion = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", puerto), args.timeout)
+            lector, escritor = conexion
+            escritor.write(peticion)
+            estado = await asyncio.wait_for(leer_respuesta(lector), args.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            datos["errores"] += 1
+            if conexion is not None:
+                conexion[1].close()
+                conexion = None
+            await asyncio.sleep(0.05)
+            continue
+        datos["latencias"].append(time.perf_counter() - t0)
+        if estado >= 500:
+            datos["errores"] += 1
+    if conexion is not None:
+        conexion[1].close()
+
+
+def proceso_clientes(desde, cuantos, puerto, args, inicio, cola):
+    async def todos():
+        fin = inicio + args.segundos
+        await asyncio.sleep(max(0.0, inicio - time.perf_counter()))
+        datos = {"errores": 0, "latencias": []}
+        await asyncio.gather(*(cliente(desde + n, puerto, args, fin, datos) for n in range(cuantos)))
+        return datos
+
+    cola.put(asyncio.run(todos()))
+
+
+def medir(puerto, clientes, args):
+    # Varios procesos cliente: con miles de conexiones, uno solo sería el cuello de botella
+    procesos = min(args.procesos, clientes)
+    cola = multiprocessing.Queue()
+    inicio = time.perf_counter() + 1
+    hijos = []
+    for p in range(procesos):
+        cuantos = clientes // procesos + (p < clientes % procesos)
+        hijo = multiprocessing.Process(target=proceso_clientes,
+                                       args=(p * clientes, cuantos, puerto, args, inicio, cola))
+        hijo.start()
+        hijos.append(hijo)
+    resultados = [cola.get() for _ in hijos]
+    for hijo in hijos:
+        hijo.join()
+    latencias = [l for r in resultados for l in r["latencias"]]
+    return {"rps": len(latencias) / args.segundos, "p50": percentil(latencias, 50), "p99": percentil(latencias, 99),
+            "errores": sum(r["errores"] for r in resultados)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modos", default="wsgi,asgi")
+    parser.add_argument("--clientes", default="100,500,1000,2000")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--hilos", type=int, default=16, help="Hilos por worker (gthread / ASGI_HILOS)")
+    parser.add_argument("--escrituras", type=float, default=0.1, help="Fracción de ajustes de stock")
+    parser.add_argument("--productos", type=int, default=10_000)
+    parser.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument("--procesos", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Procesos cliente")
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (duro, duro))
+    with tempfile.TemporaryDirectory() as carpeta:
+        env = dict(os.environ, LOGIN_DISABLED="1")
+        if args.backend == "sqlite":
+            ruta = os.path.join(carpeta, "concurrencia.db")
+            sembrar(ruta, args.productos)
+            env.update(INVENTARIO_BACKEND="sqlite", INVENTARIO_SQLITE_PATH=ruta)
+
+        print(f"{'modo':<5} {'clientes':>9} {'pet/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errores':>8} {'RSS MB':>8}")
+        for modo in args.modos.split(","):
+            for clientes in (int(c) for c in args.clientes.split(",")):
+                # Un servidor nuevo para cada medida: sin conexiones ni colas de la anterior
+                puerto = puerto_libre()
+                servidor = arrancar(modo, puerto, args, env)
+                try:
+                    r = medir(puerto, clientes, args)
+                    rss = rss_total(servidor.pid)
+                finally:
+                    servidor.terminate()
+                    servidor.wait()
+                print(f"{modo:<5} {clientes:>9} {r['rps']:>9.0f} {r['p50'] * 1000:>9.1f} {r['p99'] * 1000:>9.1f} "
+                      f"{r['errores']:>8} {rss:>8.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compara modificaciones de productos con escritura directa y con escritura diferida.
+
+Hace N llamadas a actualizar_producto (y algunas bajas) con cada modo e informa la latencia
+de cada llamada, el total hasta que todo está en la BD y las métricas de la cola
+(volcados, productos fundidos, latencia de volcado).
+
+Uso:
+  python bench/escritura_diferida.py --backend sqlite --operaciones 5000
+  python bench/escritura_diferida.py --backend mysql      # BD de DB_HOST/DB_NAME/...
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenamiento import crear_repositorio  # noqa: E402
+from inventario import Inventario, Producto  # noqa: E402
+
+PREFIJO = "bench-diferida"
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)] if ordenados else 0.0
+
+
+def medir(diferida, productos, operaciones, max_lote, max_espera):
+    inv = Inventario(escritura_diferida=diferida, max_lote=max_lote, max_espera=max_espera)
+    ids = []
+    lote = [Producto(None, f"{PREFIJO} {n}", 1.0, 100, None) for n in range(productos)]
+    ids = inv.guardar_lote(lote)
+    rnd = random.Random(3)
+    latencias = []
+    inicio = time.perf_counter()
+    for n in range(operaciones):
+        id_producto = rnd.choice(ids)
+        t0 = time.perf_counter()
+        inv.actualizar_producto(id_producto, nombre=f"{PREFIJO} {id_producto} v{n}", precio=round(rnd.uniform(1, 50), 2))
+        latencias.append(time.perf_counter() - t0)
+    inv.vaciar_escrituras()
+    total = time.perf_counter() - inicio
+    estadisticas = inv.estadisticas_escritura()
+    for id_producto in ids:
+        inv.eliminar_producto(id_producto)
+    inv.cerrar()
+    return {
+        "modo": "diferida" if diferida else "directa",
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "ops_s": operaciones / total,
+        "total_s": total,
+        "cola": estadisticas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("sqlite", "mysql", "memoria"), default="sqlite")
+    parser.add_argument("--productos", type=int, default=1000)
+    parser.add_argument("--operaciones", type=int, default=5000)
+    parser.add_argument("--max-lote", type=int, default=500)
+    parser.add_argument("--max-espera", type=float, default=0.2)
+    args = parser.parse_args()
+
+    os.environ["INVENTARIO_BACKEND"] = args.backend
+    temporal = None
+    if args.backend == "sqlite" and "INVENTARIO_SQLITE_PATH" not in os.environ:
+        temporal = tempfile.TemporaryDirectory()
+        os.environ["INVENTARIO_SQLITE_PATH"] = os.path.join(temporal.name, "diferida.db")
+    crear_repositorio().preparar()
+
+    print(f"{'modo':<10} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'total s':>9}")
+    for diferida in (False, True):
+        r = medir(diferida, args.productos, args.operaciones, args.max_lote, args.max_espera)
+        print(f"{r['modo']:<10} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['ops_s']:>10.0f} {r['total_s']:>9.2f}")
+        if r["cola"]:
+            print(f"  cola: {r['cola']}")
+    if temporal:
+        temporal.cleanup()
+
+
+if __name__ == "__main__":
+    main()
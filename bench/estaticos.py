@@ -0,0 +1,123 @@
+"""Bytes de estáticos en la primera visita y en las siguientes, sin y con python -m cli.estaticos.
+
+Copia static/ a una carpeta temporal y sirve desde ahí una página con los mismos recursos que
+/productos (Bootstrap, sus iconos con las fuentes y styles.css). Un navegador simulado guarda
+cada respuesta con su ETag y Cache-Control: mientras max-age no caduca no vuelve a pedirla y,
+si caducó (o es no-cache), la revalida con If-None-Match. "antes" es la página con los enlaces
+al CDN y el static/ de Flask tal cual; "después" usa lo que genera la construcción. Las
+peticiones al CDN se cuentan aparte (no se descargan). Para vendorizar hace falta red la
+primera vez; con --sin-descargar se mide solo lo que ya haya en static/vendor.
+
+Uso:
+  python bench/estaticos.py [--visitas 3]
+"""
+import argparse
+import gzip
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urljoin
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask, render_template_string  # noqa: E402
+
+from estaticos import VENDOR, Estaticos, brotli, construir, vendorizar  # noqa: E402
+
+PAGINA = """
+<link href="{{ enlace('vendor/bootstrap/bootstrap.min.css') }}" rel="stylesheet">
+<link rel="stylesheet" href="{{ url_for('static', filename='styles.css') }}">
+<link rel="stylesheet" href="{{ enlace('vendor/bootstrap-icons/bootstrap-icons.css') }}">
+<script src="{{ enlace('vendor/bootstrap/bootstrap.bundle.min.js') }}"></script>
+"""
+
+
+def crear_app(carpeta, con_pipeline):
+    app = Flask(__name__, static_folder=str(carpeta), static_url_path="/static")
+    if con_pipeline:
+        estaticos = Estaticos(app)
+        enlace = estaticos.vendor_url
+    else:
+        enlace = VENDOR.__getitem__
+
+    @app.route("/")
+    def pagina():
+        return render_template_string(PAGINA, enlace=enlace)
+    return app
+
+
+def decodificar(respuesta):
+    datos = respuesta.data
+    codificacion = respuesta.headers.get("Content-Encoding")
+    if codificacion == "gzip":
+        return gzip.decompress(datos)
+    if codificacion == "br" and brotli is not None:
+        return brotli.decompress(datos)
+    return datos
+
+
+def visitar(cliente, cache):
+    # Como un navegador: la página siempre; cada recurso solo si no está fresco en su cache
+    medidas = {"peticiones": 1, "bytes": 0, "externas": 0}
+    html = cliente.get("/").data.decode("utf-8")
+    medidas["bytes"] += len(html)
+    pendientes = re.findall(r'(?:href|src)="([^"]+)"', html)
+    while pendientes:
+        url = pendientes.pop(0)
+        if not url.startswith("/"):
+            medidas["externas"] += 1
+            continue
+        guardado = cache.get(url)
+        if guardado and guardado["caduca"] > time.time():
+            continue
+        cabeceras = {"Accept-Encoding": "br, gzip"}
+        if guardado and guardado["etag"]:
+            cabeceras["If-None-Match"] = guardado["etag"]
+        r = cliente.get(url, headers=cabeceras)
+        medidas["peticiones"] += 1
+        medidas["bytes"] += len(r.data)
+        if r.status_code == 200:
+            guardado = {"etag": r.headers.get("ETag"), "cuerpo": decodificar(r)}
+        guardado["caduca"] = time.time() + (r.cache_control.max_age or 0)
+        cache[url] = guardado
+        if url.split("?")[0].endswith(".css"):
+            texto = guardado["cuerpo"].decode("utf-8", errors="replace")
+            pendientes += [urljoin(url, ref) for _, ref in re.findall(r'''url\(\s*(['"]?)([^'")]+?)\1\s*\)''', texto)
+                           if not ref.startswith("data:")]
+    return medidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visitas", type=int, default=3)
+    parser.add_argument("--sin-descargar", action="store_true")
+    args = parser.parse_args()
+
+    raiz = Path(__file__).resolve().parent.parent
+    with tempfile.TemporaryDirectory() as tmp:
+        carpeta = Path(tmp) / "static"
+        shutil.copytree(raiz / "static", carpeta, ignore=shutil.ignore_patterns("dist", "images"))
+        if not args.sin_descargar:
+            try:
+                vendorizar(carpeta)
+            except Exception as e:
+                print(f"Sin descargar el CDN ({e}): se mide solo lo que haya en static/vendor", file=sys.stderr)
+        inicio = time.perf_counter()
+        generados = construir(carpeta)
+        print(f"Construcción: {len(generados)} archivos en {time.perf_counter() - inicio:.2f} s"
+              f"{'' if brotli else ' (sin brotli: solo .gz)'}")
+
+        print(f"{'modo':<8} {'visita':>6} {'peticiones':>11} {'bytes':>10} {'al CDN':>7}")
+        for modo, con_pipeline in (("antes", False), ("después", True)):
+            cliente = crear_app(carpeta, con_pipeline).test_client()
+            cache = {}
+            for visita in range(1, args.visitas + 1):
+                m = visitar(cliente, cache)
+                print(f"{modo:<8} {visita:>6} {m['peticiones']:>11} {m['bytes']:>10} {m['externas']:>7}")
+
+
+if __name__ == "__main__":
+    main()
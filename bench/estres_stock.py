@@ -0,0 +1,144 @@
+"""Prueba de estrés de los ajustes de stock concurrentes.
+
+Varios procesos, cada uno con varios hilos, venden y reponen al azar los mismos pocos
+productos con ajustar_stock y ajustar_stock_lote, y de vez en cuando editan el nombre
+(actualizar_producto sin stock). Al final el stock de cada producto debe ser exactamente
+el inicial más la suma de los ajustes aceptados, y nunca negativo: ninguna venta se pierde.
+
+Uso:
+  python bench/estres_stock.py --backend sqlite --procesos 4 --hilos 8
+  python bench/estres_stock.py --backend mysql       # BD de DB_HOST/DB_NAME/...
+Con --backend memoria solo hay un proceso (el estado no se comparte entre procesos).
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenamiento import crear_repositorio  # noqa: E402
+from inventario import Inventario, Producto  # noqa: E402
+
+PREFIJO = "estres-stock"
+
+
+def trabajar(inv, ids, operaciones, semilla, lote_max):
+    rnd = random.Random(semilla)
+    aplicado = Counter()
+    resumen = Counter()
+    for n in range(operaciones):
+        if n % 50 == 49:
+            # Editar otros campos no debe deshacer ventas concurrentes
+            id_producto = rnd.choice(ids)
+            ok = inv.actualizar_producto(id_producto, nombre=f"{PREFIJO} {id_producto} {semilla}-{n}")
+            resumen["ediciones" if ok else "conflictos"] += 1
+            continue
+        lineas = [(rnd.choice(ids), rnd.choice([-5, -3, -2, -1, -1, 1, 2, 3])) for _ in range(rnd.randint(1, lote_max))]
+        resultado = inv.ajustar_stock_lote(lineas)
+        fallidas = {f["linea"] for f in resultado["fallidas"]}
+        for linea, (id_producto, delta) in enumerate(lineas):
+            if linea not in fallidas:
+                aplicado[id_producto] += delta
+        if any(stock < 0 for stock in resultado["stock"].values()):
+            resumen["negativos"] += 1
+        resumen["lotes"] += 1
+        resumen["lineas"] += len(lineas)
+        resumen["rechazadas"] += len(fallidas)
+    return aplicado, resumen
+
+
+def proceso(ids, hilos, operaciones, semilla, lote_max, salida, inv=None):
+    inv = inv or Inventario(intervalo_sync=0.5)
+    resultados = []
+
+    def hilo(n):
+        resultados.append(trabajar(inv, ids, operaciones, semilla * 1000 + n, lote_max))
+
+    trabajadores = [threading.Thread(target=hilo, args=(n,)) for n in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    aplicado, resumen = Counter(), Counter()
+    for a, r in resultados:
+        aplicado.update(a)
+        resumen.update(r)
+    salida.put((dict(aplicado), dict(resumen)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("sqlite", "mysql", "memoria"), default="sqlite")
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--productos", type=int, default=3, help="Productos (SKU) disputados")
+    parser.add_argument("--operaciones", type=int, default=300, help="Operaciones por hilo")
+    parser.add_argument("--lote", type=int, default=5, help="Líneas máximas por lote de ajustes")
+    parser.add_argument("--stock-inicial", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["INVENTARIO_BACKEND"] = args.backend
+    temporal = None
+    if args.backend == "sqlite" and "INVENTARIO_SQLITE_PATH" not in os.environ:
+        temporal = tempfile.TemporaryDirectory()
+        os.environ["INVENTARIO_SQLITE_PATH"] = os.path.join(temporal.name, "estres.db")
+    if args.backend == "memoria":
+        args.procesos = 1
+
+    inv = Inventario(intervalo_sync=0.5)
+    ids = []
+    for n in range(args.productos):
+        producto = Producto(None, f"{PREFIJO} {n}", 1.0, args.stock_inicial, None)
+        inv.agregar_producto(producto)
+        ids.append(producto.id_producto)
+
+    salida = mp.Queue()
+    inicio = time.perf_counter()
+    if args.backend == "memoria":
+        proceso(ids, args.hilos, args.operaciones, 1, args.lote, salida, inv)
+    else:
+        procesos = [mp.Process(target=proceso, args=(ids, args.hilos, args.operaciones, n + 1, args.lote, salida))
+                    for n in range(args.procesos)]
+        for p in procesos:
+            p.start()
+    aplicado, resumen = Counter(), Counter()
+    for _ in range(args.procesos):
+        a, r = salida.get()
+        aplicado.update(a)
+        resumen.update(r)
+    duracion = time.perf_counter() - inicio
+    if args.backend != "memoria":
+        for p in procesos:
+            p.join()
+
+    leidos = inv.repositorio.leer(ids) if args.backend == "memoria" else crear_repositorio().leer(ids)
+    inv.sincronizar()
+    ok = resumen["negativos"] == 0
+    for id_producto in ids:
+        esperado = args.stock_inicial + aplicado[id_producto]
+        real = leidos[id_producto]["stock"]
+        en_cache = inv.obtener(id_producto).stock
+        coincide = real == esperado == en_cache and real >= 0
+        ok &= coincide
+        print(f"producto {id_producto}: esperado={esperado} bd={real} cache={en_cache} {'✅' if coincide else '❌'}")
+    print(f"{args.procesos} proceso(s) x {args.hilos} hilos, {resumen['lotes']} lotes / {resumen['lineas']} líneas "
+          f"en {duracion:.2f}s ({resumen['lotes'] / duracion:.0f} lotes/s); rechazadas por stock: {resumen['rechazadas']}; "
+          f"ediciones: {resumen['ediciones']}, conflictos de edición: {resumen['conflictos']}")
+
+    for id_producto in ids:
+        inv.eliminar_producto(id_producto)
+    if temporal:
+        temporal.cleanup()
+    print("Sin ventas perdidas" if ok else "ERROR: el stock final no cuadra")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
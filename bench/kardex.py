@@ -0,0 +1,155 @@
+"""Kardex de stock con decenas de millones de movimientos: consultas históricas y coste de escribirlo.
+
+Sobre un SQLite temporal con el esquema de RepositorioSQLite, carga --movimientos movimientos
+sintéticos de --productos productos repartidos en --dias días (hasta ayer) y mide:
+  - tomar_instantaneas una vez por día (como el cron, con hasta= al final de cada día);
+  - stock_en en fechas al azar frente a sumar todo el historial del producto (lo que haría
+    un informe sin instantáneas, con el índice por producto) y comprobando que coinciden;
+    y unas pocas frente a recorrer la tabla entera (sin índice por producto);
+  - movimientos_stock de un día;
+  - ajustar_stock con y sin el disparador del kardex, de una en una y en lotes;
+  - el espacio en disco por movimiento y por instantánea.
+
+Uso:
+  python bench/kardex.py --movimientos 20000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenamiento import RepositorioSQLite  # noqa: E402
+from inventario import Producto  # noqa: E402
+
+BLOQUE = 1_000_000
+
+
+def cronometrar(funcion, argumentos):
+    tiempos = []
+    for args in argumentos:
+        inicio = time.perf_counter()
+        funcion(*args)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), max(tiempos)
+
+
+def paginas(repo):
+    with repo.transaccion() as cursor:
+        cuantas = repo._todas(cursor, "PRAGMA page_count")[0]["page_count"]
+        tamano = repo._todas(cursor, "PRAGMA page_size")[0]["page_size"]
+    return cuantas * tamano
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movimientos", type=int, default=20_000_000)
+    parser.add_argument("--productos", type=int, default=10_000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--ajustes", type=int, default=5000)
+    args = parser.parse_args()
+    random.seed(1)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        repo = RepositorioSQLite(os.path.join(carpeta, "kardex.db"))
+        repo.preparar()
+        n, productos = args.movimientos, args.productos
+        hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        inicio_datos = hoy - timedelta(days=args.dias)
+        paso = args.dias * 86400 / n
+
+        # Carga directa en la tabla (los disparadores solo actúan sobre productos): un saldo
+        # inicial por producto y después ajustes de -10 a +10 a productos al azar
+        vacia = paginas(repo)
+        inicio = time.perf_counter()
+        with repo.transaccion(escritura=True) as cursor:
+            cursor.executemany(repo._sql("INSERT INTO stock_movimientos (id_producto, delta, tipo, creado_en) VALUES (%s, %s, 'S', %s)"),
+                               [(i, 1000, repo._fecha(inicio_datos)) for i in range(1, productos + 1)])
+        for desde in range(0, n, BLOQUE):
+            with repo.transaccion(escritura=True) as cursor:
+                repo._ejecutar(cursor, f"""
+                    WITH RECURSIVE n(i) AS (SELECT %s UNION ALL SELECT i + 1 FROM n WHERE i < %s)
+                    INSERT INTO stock_movimientos (id_producto, delta, tipo, creado_en)
+                    SELECT abs(random()) % {productos} + 1, abs(random()) % 21 - 10, 'A',
+                        strftime('%Y-%m-%d %H:%M:%f', %s, printf('+%.3f seconds', i * %s))
+                    FROM n
+                """, (desde + 1, min(desde + BLOQUE, n), repo._fecha(inicio_datos), paso))
+        carga = time.perf_counter() - inicio
+        ocupado = paginas(repo)
+        print(f"Carga: {n:,} movimientos de {productos:,} productos en {args.dias} días, {carga:.1f} s "
+              f"({n / carga:,.0f}/s); {(ocupado - vacia) / (n + productos):.1f} bytes por movimiento (con su índice)")
+
+        inicio = time.perf_counter()
+        escritas = sum(repo.tomar_instantaneas(hasta=inicio_datos + timedelta(days=d + 1), retraso=0)
+                       for d in range(args.dias))
+        instantaneas = time.perf_counter() - inicio
+        print(f"Instantáneas diarias: {escritas:,} en {instantaneas:.1f} s ({instantaneas / args.dias * 1000:.0f} ms por día); "
+              f"{(paginas(repo) - ocupado) / escritas:.1f} bytes por instantánea")
+
+        def al_azar():
+            return random.randint(1, productos), inicio_datos + timedelta(seconds=random.uniform(0, args.dias * 86400))
+
+        def historial(id_producto, fecha):
+            with repo.transaccion() as cursor:
+                return repo._todas(cursor, """
+                    SELECT IFNULL(SUM(delta), 0) AS stock FROM stock_movimientos
+                    WHERE id_producto = %s AND creado_en <= %s
+                """, (id_producto, repo._fecha(fecha)))[0]["stock"]
+
+        def tabla_entera(id_producto, fecha):
+            with repo.transaccion() as cursor:
+                return repo._todas(cursor, """
+                    SELECT IFNULL(SUM(delta), 0) AS stock FROM stock_movimientos NOT INDEXED
+                    WHERE id_producto = %s AND creado_en <= %s
+                """, (id_producto, repo._fecha(fecha)))[0]["stock"]
+
+        consultas = [al_azar() for _ in range(args.consultas)]
+        distintos = [c for c in consultas if repo.stock_en(*c) != historial(*c)]
+        assert not distintos, f"stock_en no coincide con el historial en {len(distintos)} consultas: {distintos[:3]}"
+        print(f"stock_en y la suma del historial coinciden en {len(consultas)} consultas al azar")
+        for nombre, funcion, muestra in (("stock_en (instantánea + cola)", repo.stock_en, consultas),
+                                         ("suma del historial del producto", historial, consultas),
+                                         ("suma recorriendo la tabla", tabla_entera, consultas[:3])):
+            mediana, peor = cronometrar(funcion, muestra)
+            print(f"  {nombre:<32} mediana {mediana:9.3f} ms, peor {peor:9.3f} ms ({len(muestra)} consultas)")
+
+        dias = [(i, f, f + timedelta(days=1)) for i, f in consultas[:500]]
+        mediana, peor = cronometrar(repo.movimientos_stock, dias)
+        leidos = statistics.mean(len(repo.movimientos_stock(*d)[1]) for d in dias[:50])
+        print(f"  movimientos_stock de un día      mediana {mediana:9.3f} ms, peor {peor:9.3f} ms "
+              f"(~{leidos:.0f} movimientos por consulta)")
+
+        # Escritura: el disparador añade una fila y una entrada de índice por cada cambio de stock
+        reales = repo.guardar_lote([Producto(None, f"Producto {i}", 1.0, 10 ** 6, None) for i in range(1000)])
+        sueltos = [[(random.choice(reales), random.choice((-1, 1)))] for _ in range(args.ajustes)]
+        lotes = [[(random.choice(reales), random.choice((-1, 1))) for _ in range(500)] for _ in range(args.ajustes // 500)]
+        medidas = {}
+        for modo in ("con kardex", "sin kardex"):
+            if modo == "sin kardex":
+                with repo.transaccion(escritura=True) as cursor:
+                    cursor.execute("DROP TRIGGER stock_movimiento_cambio")
+            inicio = time.perf_counter()
+            for ajustes in sueltos:
+                repo.ajustar_stock(ajustes)
+            uno = (time.perf_counter() - inicio) / len(sueltos) * 1000
+            inicio = time.perf_counter()
+            for ajustes in lotes:
+                repo.ajustar_stock(ajustes)
+            lote = (time.perf_counter() - inicio) / max(1, len(lotes) * 500) * 1000
+            medidas[modo] = (uno, lote)
+        repo.preparar()
+        for modo, (uno, lote) in medidas.items():
+            print(f"ajustar_stock {modo}: {uno:.3f} ms por ajuste suelto, {lote * 1000:.1f} µs por línea en lotes de 500")
+        print(f"Sobrecoste del kardex: +{(medidas['con kardex'][0] / medidas['sin kardex'][0] - 1) * 100:.0f} % suelto, "
+              f"+{(medidas['con kardex'][1] / medidas['sin kardex'][1] - 1) * 100:.0f} % en lotes")
+
+
+if __name__ == "__main__":
+    main()
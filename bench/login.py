@@ -0,0 +1,141 @@
+"""Login bajo un ataque de fuerza bruta: antes (hash en el hilo de la petición, sin límite)
+y ahora (LimitadorIntentos + EjecutorHash de acceso.py).
+
+Simula un worker con --hilos hilos de petición (como gunicorn --threads): los clientes
+ocupan un hilo por petición. --atacantes clientes prueban contraseñas sin parar contra
+unos pocos emails desde --ips direcciones; a la vez, --usuarios clientes legítimos navegan
+(páginas de ~1 ms de CPU) e inician sesión cada --cada-login segundos desde su propia IP. Informa:
+intentos del ataque por segundo y cuántos llegaron a calcular un hash, y la latencia de
+las páginas y los logins legítimos. No necesita BD: los usuarios están en un diccionario.
+
+Uso:
+  python bench/login.py --segundos 10 --atacantes 32 --usuarios 8
+  python bench/login.py --metodo scrypt   # coste real de producción (por defecto, pbkdf2 más barato)
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+
+from acceso import EjecutorHash, HashSaturado, LimitadorIntentos  # noqa: E402
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)] if ordenados else 0.0
+
+
+def pagina():
+    # Lo que cuesta en CPU una página del catálogo ya cacheada
+    total = 0
+    for i in range(20_000):
+        total += i * i
+    return total
+
+
+def medir(modo, args, usuarios):
+    hilos_peticion = threading.BoundedSemaphore(args.hilos)
+    limitador = LimitadorIntentos(ventana=900, max_por_ip=args.max_ip, max_por_email=args.max_email)
+    ejecutor = EjecutorHash(hilos=args.hash_hilos, max_pendientes=args.hash_pendientes, metodo=args.metodo)
+    fin = time.perf_counter() + args.segundos
+    datos = {"ataque": 0, "hashes_ataque": 0, "rechazados": 0, "paginas": [], "logins": [], "logins_fallidos": 0}
+    lock = threading.Lock()
+
+    def login(ip, email, password):
+        with hilos_peticion:
+            if modo == "antes":
+                usuario = usuarios.get(email)
+                return "hash", usuario is not None and check_password_hash(usuario, password)
+            if limitador.espera(ip=ip, email=email):
+                return "limitado", False
+            limitador.intento(ip=ip)
+            usuario = usuarios.get(email)
+            try:
+                valida = usuario is not None and ejecutor.comprobar(usuario, password)
+            except HashSaturado:
+                return "saturado", False
+            if valida:
+                limitador.exito(email)
+            else:
+                limitador.intento(email=email)
+            return "hash", valida
+
+    def atacante(n):
+        rnd = random.Random(n)
+        while time.perf_counter() < fin:
+            resultado, _ = login(f"10.0.0.{n % args.ips}", f"usuario{rnd.randrange(args.victimas)}@x.com",
+                                 f"clave{rnd.randrange(10 ** 6)}")
+            with lock:
+                datos["ataque"] += 1
+                if resultado == "hash":
+                    datos["hashes_ataque"] += 1
+                else:
+                    datos["rechazados"] += 1
+            time.sleep(args.pausa)
+
+    def usuario_legitimo(n):
+        email = f"legitimo{n}@x.com"
+        proximo_login = time.perf_counter() + random.Random(-n).uniform(0, args.cada_login)
+        while time.perf_counter() < fin:
+            t0 = time.perf_counter()
+            if t0 >= proximo_login:
+                proximo_login = t0 + args.cada_login
+                _, valida = login(f"192.168.1.{n}", email, "correcta")
+                with lock:
+                    datos["logins"].append(time.perf_counter() - t0)
+                    datos["logins_fallidos"] += not valida
+            else:
+                with hilos_peticion:
+                    pagina()
+                with lock:
+                    datos["paginas"].append(time.perf_counter() - t0)
+
+    clientes = [threading.Thread(target=atacante, args=(n,)) for n in range(args.atacantes)]
+    clientes += [threading.Thread(target=usuario_legitimo, args=(n,)) for n in range(args.usuarios)]
+    inicio = time.perf_counter()
+    for c in clientes:
+        c.start()
+    for c in clientes:
+        c.join()
+    datos["segundos"] = time.perf_counter() - inicio
+    return datos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--hilos", type=int, default=8, help="Hilos de petición del worker")
+    parser.add_argument("--atacantes", type=int, default=32)
+    parser.add_argument("--ips", type=int, default=4, help="IPs distintas del ataque")
+    parser.add_argument("--pausa", type=float, default=0.002, help="Segundos entre peticiones de cada atacante (la red)")
+    parser.add_argument("--victimas", type=int, default=20, help="Emails atacados")
+    parser.add_argument("--usuarios", type=int, default=8)
+    parser.add_argument("--cada-login", type=float, default=2.0)
+    parser.add_argument("--metodo", default="pbkdf2:sha256:100000")
+    parser.add_argument("--hash-hilos", type=int, default=1)
+    parser.add_argument("--hash-pendientes", type=int, default=4)
+    parser.add_argument("--max-ip", type=int, default=20)
+    parser.add_argument("--max-email", type=int, default=5)
+    args = parser.parse_args()
+
+    usuarios = {f"usuario{n}@x.com": generate_password_hash("secreta", args.metodo) for n in range(args.victimas)}
+    usuarios.update({f"legitimo{n}@x.com": generate_password_hash("correcta", args.metodo) for n in range(args.usuarios)})
+
+    print(f"{'modo':<6} {'ataque/s':>9} {'hashes ataque':>14} {'rechazados':>11} "
+          f"{'página p50 ms':>14} {'página p99 ms':>14} {'login p50 ms':>13} {'login p99 ms':>13} {'logins mal':>11}")
+    for modo in ("antes", "ahora"):
+        d = medir(modo, args, usuarios)
+        print(f"{modo:<6} {d['ataque'] / d['segundos']:>9.0f} {d['hashes_ataque']:>14} {d['rechazados']:>11} "
+              f"{percentil(d['paginas'], 50) * 1000:>14.2f} {percentil(d['paginas'], 99) * 1000:>14.2f} "
+              f"{percentil(d['logins'], 50) * 1000:>13.1f} {percentil(d['logins'], 99) * 1000:>13.1f} "
+              f"{d['logins_fallidos']:>11}")
+
+
+if __name__ == "__main__":
+    main()
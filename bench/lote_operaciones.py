@@ -0,0 +1,116 @@
+"""Cambios de un trabajo nocturno: un proceso por cambio, una transacción por cambio y
+python -m cli.menu lote (una transacción cada --lote operaciones).
+
+Genera --operaciones líneas mezcladas (altas, modificaciones de precio, ajustes de stock
+y bajas) sobre un SQLite temporal con --productos productos y mide cuánto tarda cada forma
+de aplicarlas. "proceso" lanza python -m cli.menu por operación solo para las primeras
+--muestra y extrapola.
+
+Uso:
+  python bench/lote_operaciones.py --operaciones 10000 --productos 50000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+
+def sembrar(ruta, productos):
+    from almacenamiento import RepositorioSQLite
+    from inventario import Producto
+
+    repo = RepositorioSQLite(ruta)
+    repo.preparar()
+    for inicio in range(0, productos, 5000):
+        repo.guardar_lote([Producto(None, f"Producto {n}", 1.5, 1000, None)
+                           for n in range(inicio, min(productos, inicio + 5000))])
+
+
+def generar(operaciones, productos, semilla=1):
+    rnd = random.Random(semilla)
+    bajas = set()
+    filas = []
+    for n in range(operaciones):
+        tipo = rnd.choices(["agregar", "actualizar", "ajustar", "eliminar"], [1, 3, 5, 1])[0]
+        id_producto = rnd.randint(1, productos)
+        while tipo != "agregar" and id_producto in bajas:
+            id_producto = rnd.randint(1, productos)
+        if tipo == "agregar":
+            filas.append({"op": "agregar", "nombre": f"Nuevo {n}", "precio": 2.5, "stock": 10})
+        elif tipo == "actualizar":
+            filas.append({"op": "actualizar", "id_producto": id_producto, "precio": round(rnd.uniform(1, 100), 2)})
+        elif tipo == "ajustar":
+            filas.append({"op": "ajustar", "id_producto": id_producto, "delta": rnd.choice([-2, -1, 1, 5])})
+        else:
+            bajas.add(id_producto)
+            filas.append({"op": "eliminar", "id_producto": id_producto})
+    return filas
+
+
+def una_a_una(inv, filas):
+    from inventario import Producto
+
+    ok = 0
+    for fila in filas:
+        op = fila["op"]
+        if op == "agregar":
+            ok += inv.agregar_producto(Producto(None, fila["nombre"], fila["precio"], fila["stock"], None))
+        elif op == "actualizar":
+            ok += inv.actualizar_producto(fila["id_producto"], precio=fila["precio"])
+        elif op == "ajustar":
+            ok += inv.ajustar_stock(fila["id_producto"], fila["delta"]) is not None
+        else:
+            ok += inv.eliminar_producto(fila["id_producto"])
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operaciones", type=int, default=10_000)
+    parser.add_argument("--productos", type=int, default=50_000)
+    parser.add_argument("--lote", type=int, default=1000)
+    parser.add_argument("--muestra", type=int, default=10, help="Operaciones medidas en el modo proceso")
+    args = parser.parse_args()
+
+    from inventario import Inventario
+    from operaciones import aplicar
+
+    filas = generar(args.operaciones, args.productos)
+    print(f"{'modo':<12} {'operaciones':>12} {'aplicadas':>10} {'segundos':>10} {'op/s':>10}")
+    with tempfile.TemporaryDirectory() as carpeta:
+        for modo in ("proceso", "transaccion", "lote"):
+            ruta = os.path.join(carpeta, f"{modo}.db")
+            sembrar(ruta, args.productos)
+            os.environ.update(INVENTARIO_BACKEND="sqlite", INVENTARIO_SQLITE_PATH=ruta)
+            if modo == "proceso":
+                inicio = time.perf_counter()
+                ok = 0
+                for fila in filas[:args.muestra]:
+                    argumentos = [str(fila[k]) for k in ("id_producto", "delta") if k in fila]
+                    argumentos += [f"--{k}={fila[k]}" for k in ("nombre", "precio", "stock") if k in fila]
+                    salida = subprocess.run([sys.executable, "-m", "cli.menu", fila["op"], *argumentos], cwd=RAIZ,
+                                            capture_output=True, text=True)
+                    ok += json.loads(salida.stdout.splitlines()[0])["ok"]
+                segundos = (time.perf_counter() - inicio) * len(filas) / args.muestra
+                aplicadas = f"~{ok * len(filas) // args.muestra}"
+            else:
+                inv = Inventario()
+                inicio = time.perf_counter()
+                if modo == "transaccion":
+                    aplicadas = una_a_una(inv, filas)
+                else:
+                    aplicadas = sum(r["ok"] for r in aplicar(inv, enumerate(filas, start=1), args.lote))
+                segundos = time.perf_counter() - inicio
+            print(f"{modo:<12} {len(filas):>12} {aplicadas:>10} {segundos:>10.2f} {len(filas) / segundos:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
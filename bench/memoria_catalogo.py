@@ -0,0 +1,96 @@
+"""Memoria por producto del cache de Inventario según su representación.
+
+  dataclass: el Producto anterior (dataclass con __dict__ por instancia) en un dict por id
+  slots:     Producto actual (dataclass con __slots__) en un dict por id (catalogo="objetos")
+  columnar:  CatalogoColumnar, arrays por campo y nombres internados (catalogo="columnar")
+
+Mide con tracemalloc los bytes reservados por la estructura, sin contar las cadenas de los
+nombres (iguales en las tres), y aparte cuánto ocupan esos nombres. Con --inventario mide
+además el Inventario completo (cache + índice de búsqueda + órdenes) con cada catálogo.
+
+Uso: python bench/memoria_catalogo.py [--productos 1000000] [--inventario 200000]
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import make_dataclass
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenamiento import RepositorioMemoria  # noqa: E402
+from catalogo import CatalogoColumnar  # noqa: E402
+from inventario import Inventario, Producto  # noqa: E402
+
+PALABRAS = ["café", "azúcar", "arroz", "aceite", "jabón", "leche", "té", "atún", "galletas", "harina"]
+
+# Igual que Producto antes de usar slots
+ProductoConDict = make_dataclass("ProductoConDict", [
+    ("id_producto", Optional[int]), ("nombre", str), ("precio", float), ("stock", int),
+    ("imagen", Optional[str]), ("revision", int, 0),
+])
+
+
+def generar(n):
+    rnd = random.Random(1)
+    return [
+        (i + 1, f"{rnd.choice(PALABRAS).capitalize()} {rnd.choice(PALABRAS)} {rnd.randint(1, 10 ** 6)}",
+         round(rnd.uniform(0.5, 500), 2), rnd.randint(0, 50), "")
+        for i in range(n)
+    ]
+
+
+def medir(construir):
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    inicio = time.perf_counter()
+    estructura = construir()
+    duracion = time.perf_counter() - inicio
+    gc.collect()
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return estructura, despues - antes, duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, default=1_000_000)
+    parser.add_argument("--inventario", type=int, default=0, help="Productos para medir el Inventario completo (0 = no)")
+    args = parser.parse_args()
+
+    filas = generar(args.productos)
+    n = len(filas)
+    _, bytes_nombres, _ = medir(lambda: [nombre.encode().decode() for _, nombre, _, _, _ in filas])
+    print(f"{n} productos; los nombres ocupan {bytes_nombres / n:.1f} bytes/producto (no incluidos abajo)")
+
+    casos = [
+        ("dataclass", lambda: {f[0]: ProductoConDict(*f) for f in filas}),
+        ("slots", lambda: {f[0]: Producto(*f) for f in filas}),
+        ("columnar", lambda: CatalogoColumnar(Producto, (Producto(*f) for f in filas))),
+    ]
+    base = None
+    print(f"{'representación':<15} {'bytes/producto':>15} {'MB':>9} {'vs dataclass':>13} {'carga s':>8}")
+    for nombre, construir in casos:
+        estructura, total, duracion = medir(construir)
+        base = base or total
+        print(f"{nombre:<15} {total / n:>15.1f} {total / 2 ** 20:>9.1f} {total / base:>12.0%} {duracion:>8.2f}")
+        del estructura
+
+    if args.inventario:
+        repo = RepositorioMemoria()
+        for inicio in range(0, args.inventario, 10_000):
+            repo.guardar_lote([Producto(None, *f[1:]) for f in filas[inicio:min(inicio + 10_000, args.inventario)]])
+        print(f"\nInventario completo con {args.inventario} productos (incluye nombres, índice y órdenes):")
+        for catalogo in ("objetos", "columnar"):
+            inv, total, duracion = medir(lambda: Inventario(repositorio=repo, catalogo=catalogo))
+            print(f"{catalogo:<15} {total / args.inventario:>15.1f} bytes/producto  {total / 2 ** 20:>9.1f} MB  carga {duracion:.2f}s")
+            del inv
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Benchmark y prueba de carga de las rutas de app.py.
+
+Siembra la base de datos local con N productos y usuarios y mide:
+  - inproceso: la app con el cliente de pruebas de Flask (sin red ni servidor).
+  - http: carga concurrente contra gunicorn (lo arranca el script o se pasa --url).
+
+Informa p50/p95/p99, peticiones por segundo y consultas a la BD por petición.
+Todo corre en local y sin red; --json guarda el resultado para comparar entre versiones.
+
+Uso:
+  python bench/rutas.py sembrar --productos 10000 --usuarios 100
+  python bench/rutas.py inproceso --iteraciones 200
+  python bench/rutas.py http --workers 4 --clientes 32 --duracion 20
+La BD se elige con DB_HOST/DB_NAME/... (conviene una base dedicada, p. ej. DB_NAME=desarrollo_web_bench).
+Con INVENTARIO_BACKEND=sqlite o memoria no hace falta MySQL en modo inproceso: se desactiva el
+login (los usuarios siguen en MySQL) y con memoria el catálogo se siembra dentro del propio proceso.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+EMAIL = "bench0@example.com"
+PASSWORD = "bench-password"
+PALABRAS = ["café", "azúcar", "arroz", "aceite", "jabón", "leche", "té", "atún", "galletas", "harina"]
+
+
+def backend():
+    return os.environ.get("INVENTARIO_BACKEND", "mysql").lower()
+
+
+def sembrar_productos(inv, productos: int):
+    from inventario import Producto
+
+    rnd = random.Random(1)
+    faltan = productos - len(inv.mostrar_todos())
+    while faltan > 0:
+        lote = [
+            Producto(None, f"{rnd.choice(PALABRAS).capitalize()} {rnd.choice(PALABRAS)} {rnd.randint(1, 10 ** 6)}",
+                     round(rnd.uniform(0.5, 500), 2), rnd.randint(0, 50), None)
+            for _ in range(min(faltan, 1000))
+        ]
+        inv.guardar_lote(lote)
+        faltan -= len(lote)
+
+
+def sembrar(productos: int, usuarios: int):
+    from inventario import Inventario
+
+    inicio = time.perf_counter()
+    if backend() == "mysql":
+        sembrar_usuarios(usuarios)
+    else:
+        usuarios = 0
+    sembrar_productos(Inventario(), productos)
+    print(f"Sembrados hasta {productos} productos y {usuarios} usuarios en {time.perf_counter() - inicio:.1f}s")
+
+
+def sembrar_usuarios(usuarios: int):
+    from werkzeug.security import generate_password_hash
+    from conexion.conexion import obtener_conexion
+
+    conn = obtener_conexion()
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id_usuario INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            email VARCHAR(120) NOT NULL UNIQUE,
+            password VARCHAR(255) NOT NULL
+        )
+    """)
+    hash_password = generate_password_hash(PASSWORD)
+    cursor.executemany(
+        "INSERT IGNORE INTO usuarios (nombre, email, password) VALUES (%s, %s, %s)",
+        [(f"Bench {i}", f"bench{i}@example.com", hash_password) for i in range(usuarios)]
+    )
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)]
+
+
+def resumen(nombre, latencias, consultas, duracion):
+    return {
+        "escenario": nombre,
+        "peticiones": len(latencias),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 3),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 3),
+        "rps": round(len(latencias) / duracion, 1) if duracion else 0.0,
+        "consultas_por_peticion": round(statistics.mean(consultas), 2) if consultas else None,
+    }
+
+
+def imprimir(resultados):
+    print(f"{'escenario':<28} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'consultas':>10}")
+    for r in resultados:
+        consultas = "-" if r["consultas_por_peticion"] is None else f"{r['consultas_por_peticion']:.2f}"
+        print(f"{r['escenario']:<28} {r['peticiones']:>7} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+              f"{r['p99_ms']:>9.3f} {r['rps']:>9.1f} {consultas:>10}")
+
+
+def escenarios_lectura(ids, q):
+    rnd = random.Random(7)
+    return [
+        ("GET /productos", lambda: "/productos"),
+        ("GET /inventario", lambda: "/inventario"),
+        ("GET /inventario?q", lambda: f"/inventario?q={urllib.parse.quote(rnd.choice(q))}"),
+        ("GET /productos (página)", lambda: "/productos?orden=nombre&limit=50"),
+        ("GET /inventario/resumen.json", lambda: "/inventario/resumen.json"),
+        ("GET /productos/editar/<id>", lambda: f"/productos/editar/{rnd.choice(ids)}"),
+    ]
+
+
+def correr_inproceso(iteraciones: int, productos: int):
+    os.chdir(RAIZ)
+    import app as aplicacion
+    from metricas import contador_consultas
+
+    app = aplicacion.app
+    app.config["WTF_CSRF_ENABLED"] = False
+    cliente = app.test_client()
+    inv = aplicacion.obtener_inventario()
+    if inv is None:
+        sys.exit("No se pudo inicializar el inventario (¿falta python -m cli.migrar?).")
+    if backend() == "memoria":
+        sembrar_productos(inv, productos)
+    if backend() != "mysql":
+        app.config["LOGIN_DISABLED"] = True
+    else:
+        r = cliente.post("/login", data={"email": EMAIL, "password": PASSWORD})
+        if r.status_code != 302:
+            sys.exit("No se pudo iniciar sesión: ejecuta antes 'sembrar'.")
+
+    ids = [p.id_producto for p in inv.mostrar_todos()] or [0]
+    resultados = []
+
+    def medir(nombre, peticion):
+        latencias, consultas = [], []
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            t0 = time.perf_counter()
+            respuesta = peticion()
+            latencias.append(time.perf_counter() - t0)
+            # El contador se reinicia al empezar cada petición: al terminar tiene las de esta
+            consultas.append(contador_consultas.consultas)
+            if respuesta.status_code >= 500:
+                raise RuntimeError(f"{nombre}: HTTP {respuesta.status_code}")
+        resultados.append(resumen(nombre, latencias, consultas, time.perf_counter() - inicio))
+
+    for nombre, url in escenarios_lectura(ids, PALABRAS):
+        medir(nombre, lambda: cliente.get(url()))
+
+    creados = []
+
+    def crear():
+        r = cliente.post("/productos/crear", data={"nombre": "Bench crear", "precio": "9.99", "stock": "3"})
+        creados.append(inv.listar_pagina(None, 1, "-id")[0][0].id_producto)
+        return r
+
+    medir("POST /productos/crear", crear)
+    pendientes = iter(list(creados))
+    medir("POST /productos/editar/<id>", lambda: cliente.post(
+        f"/productos/editar/{next(pendientes)}", data={"nombre": "Bench editado", "precio": "1.00", "stock": "5"}))
+    pendientes = iter(list(creados))
+    medir("POST /productos/eliminar/<id>", lambda: cliente.post(f"/productos/eliminar/{next(pendientes)}"))
+    print(f"Cache de tablas renderizadas: {aplicacion.cache_fragmentos.estadisticas()}")
+    return resultados
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ClienteHTTP:
+    def __init__(self, base):
+        self.base = base
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def pedir(self, ruta, datos=None):
+        cuerpo = urllib.parse.urlencode(datos).encode() if datos is not None else None
+        with self.opener.open(self.base + ruta, data=cuerpo, timeout=30) as r:
+            r.read()
+            return r.status, r.headers.get("X-Consultas-DB")
+
+    def iniciar_sesion(self):
+        with self.opener.open(self.base + "/login", timeout=30) as r:
+            html = r.read().decode("utf-8")
+        token = re.search(r'name="csrf_token"[^>]*value="([^"]+)"', html)
+        datos = {"email": EMAIL, "password": PASSWORD, "csrf_token": token.group(1) if token else ""}
+        self.pedir("/login", datos)
+
+
+def correr_http(url, workers, clientes, duracion):
+    servidor = None
+    if not url:
+        puerto = puerto_libre()
+        entorno = dict(os.environ, EXPONER_CONSULTAS="1")
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{puerto}", "app:app"],
+            cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        url = f"http://127.0.0.1:{puerto}"
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(url + "/about/", timeout=1).read()
+                break
+            except Exception:
+                time.sleep(0.2)
+    try:
+        resultados = []
+        # En modo HTTP solo se cargan las rutas de lectura (las de escritura se miden en inproceso)
+        for nombre, generar in escenarios_lectura([1], PALABRAS):
+            if "<id>" in nombre:
+                continue
+            latencias, consultas, errores = [], [], [0]
+            lock = threading.Lock()
+            fin = time.perf_counter() + duracion
+
+            def trabajador():
+                cliente = ClienteHTTP(url)
+                cliente.iniciar_sesion()
+                while time.perf_counter() < fin:
+                    t0 = time.perf_counter()
+                    try:
+                        _, n = cliente.pedir(generar())
+                    except Exception:
+                        with lock:
+                            errores[0] += 1
+                        continue
+                    with lock:
+                        latencias.append(time.perf_counter() - t0)
+                        if n is not None:
+                            consultas.append(int(n))
+
+            hilos = [threading.Thread(target=trabajador) for _ in range(clientes)]
+            inicio = time.perf_counter()
+            for h in hilos:
+                h.start()
+            for h in hilos:
+                h.join()
+            r = resumen(nombre, latencias, consultas, time.perf_counter() - inicio)
+            r["errores"] = errores[0]
+            resultados.append(r)
+        return resultados
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="modo", required=True)
+    p = sub.add_parser("sembrar")
+    p.add_argument("--productos", type=int, default=10_000)
+    p.add_argument("--usuarios", type=int, default=100)
+    p = sub.add_parser("inproceso")
+    p.add_argument("--iteraciones", type=int, default=200)
+    p.add_argument("--productos", type=int, default=10_000, help="Productos a sembrar con INVENTARIO_BACKEND=memoria")
+    p.add_argument("--json", help="Guarda los resultados en este archivo")
+    p = sub.add_parser("http")
+    p.add_argument("--url", help="Servidor ya arrancado; si no se indica se lanza gunicorn")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--clientes", type=int, default=32)
+    p.add_argument("--duracion", type=float, default=20.0, help="Segundos por escenario")
+    p.add_argument("--json", help="Guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    if args.modo == "sembrar":
+        sembrar(args.productos, args.usuarios)
+        return
+    if args.modo == "inproceso":
+        resultados = correr_inproceso(args.iteraciones, args.productos)
+    else:
+        resultados = correr_http(args.url, args.workers, args.clientes, args.duracion)
+    imprimir(resultados)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"modo": args.modo, "backend": backend(), "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
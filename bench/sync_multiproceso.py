@@ -0,0 +1,90 @@
+"""Verifica la coherencia entre procesos del cache de Inventario.
+
+Un proceso escritor crea, modifica y borra productos; varios lectores (como workers de
+gunicorn) sincronizan por sondeo y se mide cuánto tardan en ver cada cambio.
+
+Uso: python bench/sync_multiproceso.py [--lectores 4] [--cambios 200] [--intervalo 0.2] [--backend sqlite]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inventario import Inventario, Producto  # noqa: E402
+
+PREFIJO = "sync-bench"
+
+
+def lector(intervalo, marca_fin, salida):
+    inv = Inventario(intervalo_sync=intervalo)
+    retrasos = []
+    vistos = {}
+    while True:
+        inv.sincronizar_si_toca()
+        ahora = time.time()
+        for p in inv.buscar_por_nombre(PREFIJO):
+            # El nombre lleva la hora de escritura: sync-bench <n> <timestamp>
+            clave = (p.id_producto, p.nombre)
+            if clave not in vistos:
+                vistos[clave] = True
+                retrasos.append(ahora - float(p.nombre.rsplit(" ", 1)[1]))
+        if marca_fin.is_set() and inv.buscar_por_nombre(f"{PREFIJO} fin"):
+            break
+        time.sleep(intervalo / 4)
+    restantes = sorted(p.id_producto for p in inv.buscar_por_nombre(PREFIJO))
+    salida.put((retrasos, restantes))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lectores", type=int, default=4)
+    parser.add_argument("--cambios", type=int, default=200)
+    parser.add_argument("--intervalo", type=float, default=0.2)
+    # El backend en memoria no se comparte entre procesos: aquí no tiene sentido
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), default=os.environ.get("INVENTARIO_BACKEND", "mysql"))
+    args = parser.parse_args()
+    os.environ["INVENTARIO_BACKEND"] = args.backend
+
+    marca_fin = mp.Event()
+    salida = mp.Queue()
+    procesos = [mp.Process(target=lector, args=(args.intervalo, marca_fin, salida)) for _ in range(args.lectores)]
+    for p in procesos:
+        p.start()
+    time.sleep(1)
+
+    inv = Inventario()
+    creados = []
+    for n in range(args.cambios):
+        producto = Producto(None, f"{PREFIJO} {n} {time.time()}", 1.0, n, None)
+        inv.agregar_producto(producto)
+        creados.append(producto.id_producto)
+        if n % 3 == 0:
+            inv.actualizar_producto(producto.id_producto, nombre=f"{PREFIJO} {n}u {time.time()}")
+        if n % 5 == 0:
+            inv.eliminar_producto(producto.id_producto)
+    inv.agregar_producto(Producto(None, f"{PREFIJO} fin {time.time()}", 1.0, 0, None))
+    marca_fin.set()
+
+    esperado = sorted(p.id_producto for p in inv.buscar_por_nombre(PREFIJO))
+    ok = True
+    for _ in procesos:
+        retrasos, restantes = salida.get()
+        retrasos.sort()
+        p95 = retrasos[int(len(retrasos) * 0.95) - 1] if retrasos else 0
+        coincide = restantes == esperado
+        ok &= coincide
+        print(f"lector: {len(retrasos)} cambios vistos, retraso p50={retrasos[len(retrasos) // 2]:.3f}s p95={p95:.3f}s coherente={coincide}")
+    for p in procesos:
+        p.join()
+
+    for id_producto in esperado:
+        inv.eliminar_producto(id_producto)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Usuarios de app_alchemy con un millón de filas: alta masiva, altas sueltas, listado y exportación.
+
+Sobre un SQLite temporal (USUARIOS_SQLITE_PATH) y con el cliente de pruebas de Flask, mide:
+  - POST /usuarios/lote con --usuarios filas CSV (una transacción, INSERT por bloques)
+    frente a dar de alta uno a uno con la ruta de antes (medido con --muestra usuarios y
+    extrapolado);
+  - /usuarios/agregar con emails nuevos y repetidos, frente a la ruta de antes (consulta
+    previa del email);
+  - /usuarios al principio, en medio y al final (paginación por clave) frente a
+    query(Usuario).all() de antes;
+  - /usuarios/exportar completo, con la memoria máxima del proceso antes y después.
+
+Uso:
+  python bench/usuarios.py --usuarios 1000000
+"""
+import argparse
+import io
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+from flask import redirect, request, url_for
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def rss_max_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cronometrar(funcion, repeticiones=20):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=1_000_000)
+    parser.add_argument("--muestra", type=int, default=2000, help="Altas sueltas medidas en cada modo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        os.environ["USUARIOS_SQLITE_PATH"] = os.path.join(carpeta, "usuarios.db")
+        import app_alchemy
+        from app_alchemy import SessionLocal, Usuario, app
+
+        # resultado.html hereda de base.html, que enlaza rutas y variables de app.py
+        app.url_build_error_handlers.append(lambda error, endpoint, valores: "#")
+        app.context_processor(lambda: {"current_user": SimpleNamespace(is_authenticated=False), "now": datetime.now()})
+
+        @app.route("/usuarios/agregar_antes", methods=["POST"])
+        def agregar_antes():
+            # La ruta de antes: consulta del email y después INSERT
+            session = SessionLocal()
+            try:
+                if session.query(Usuario).filter_by(email=request.form["email_usuario"]).first():
+                    return "Email ya existe", 400
+                session.add(Usuario(nombre=request.form["nombre_usuario"], email=request.form["email_usuario"]))
+                session.commit()
+            finally:
+                session.close()
+            return redirect(url_for("usuarios"))
+
+        cliente = app.test_client()
+        n = args.usuarios
+
+        cuerpo = ("nombre,email\n" + "".join(f"Usuario {i},usuario{i}@ejemplo.com\n" for i in range(n))).encode("utf-8")
+        inicio = time.perf_counter()
+        r = cliente.post("/usuarios/lote", data=io.BytesIO(cuerpo), content_type="text/csv")
+        lote = time.perf_counter() - inicio
+        del cuerpo
+        print(f"Alta masiva (/usuarios/lote, bloques de {app_alchemy.LOTE_USUARIOS}): {n} usuarios en {lote:.2f} s "
+              f"({n / lote:,.0f}/s) -> {r.get_json()['insertados']} insertados")
+
+        def altas(ruta, prefijo):
+            inicio = time.perf_counter()
+            for i in range(args.muestra):
+                cliente.post(ruta, data={"nombre_usuario": prefijo, "email_usuario": f"{prefijo}{i}@ejemplo.com"})
+            return (time.perf_counter() - inicio) / args.muestra * 1000
+
+        m = args.muestra
+        antes, antes_repetido = altas("/usuarios/agregar_antes", "antes"), altas("/usuarios/agregar_antes", "usuario")
+        nuevo, repetido = altas("/usuarios/agregar", "nuevo"), altas("/usuarios/agregar", "usuario")
+        print(f"Alta suelta con consulta previa (antes): {antes:.3f} ms, email repetido {antes_repetido:.3f} ms "
+              f"-> {n} usuarios así ~{antes * n / 1000:.0f} s")
+        print(f"/usuarios/agregar (sin consulta previa): {nuevo:.3f} ms, email repetido {repetido:.3f} ms")
+
+        total = n + 2 * m
+        for nombre, desde in (("primera", 0), ("en medio", total // 2), ("última", total - 10)):
+            ms = cronometrar(lambda: cliente.get(f"/usuarios?desde={desde}"))
+            print(f"/usuarios página {nombre:<9} {ms:8.2f} ms")
+
+        memoria = rss_max_mb()
+        inicio = time.perf_counter()
+        r = cliente.get("/usuarios/exportar")
+        tamano = sum(len(trozo) for trozo in r.response)
+        exportar = time.perf_counter() - inicio
+        print(f"/usuarios/exportar: {tamano / 2 ** 20:.1f} MB en {exportar:.2f} s; "
+              f"memoria máxima {memoria:.0f} -> {rss_max_mb():.0f} MB")
+
+        memoria = rss_max_mb()
+        inicio = time.perf_counter()
+        session = SessionLocal()
+        try:
+            items = [f"{u.id} | {u.nombre} | {u.email}" for u in session.query(Usuario).all()]
+        finally:
+            session.close()
+        todo = time.perf_counter() - inicio
+        print(f"query(Usuario).all() (antes, sin plantilla): {len(items)} filas en {todo:.2f} s; "
+              f"memoria máxima {memoria:.0f} -> {rss_max_mb():.0f} MB")
+        app_alchemy.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+"""Pruebas de conformidad comunes a todos los repositorios de Inventario.
+
+Cada backend (memoria, sqlite, mysql) debe comportarse igual ante las mismas operaciones:
+altas con y sin id, modificaciones (con bloqueo optimista), bajas, lotes con upsert,
+ajustes relativos de stock, lotes de operaciones mezcladas, escritura diferida, resumen del inventario, registro de cambios, kardex de stock, recorrido por bloques y sincronización
+entre dos instancias de Inventario.
+
+Uso:
+  python bench/verificar_repositorios.py                      # memoria y sqlite
+  python bench/verificar_repositorios.py --backend mysql      # usa la BD de DB_HOST/DB_NAME/...
+  python bench/verificar_repositorios.py --catalogo columnar  # Inventario con el catálogo por columnas
+MySQL trabaja sobre la base configurada: solo borra los productos que crea y no purga el registro;
+comprueba además que las fechas del kardex son UTC aunque otro cliente escriba con la sesión en +05:00.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenamiento import BACKENDS, RepositorioMemoria, RepositorioMySQL, RepositorioSQLite  # noqa: E402
+from catalogo import CATALOGOS  # noqa: E402
+from inventario import Inventario, Producto  # noqa: E402
+
+PREFIJO = "conformidad"
+ID_FIJO = 987_654_321
+CATALOGO = "objetos"
+
+
+def crear_inventario(repo, **opciones):
+    return Inventario(intervalo_sync=0, repositorio=repo, catalogo=CATALOGO, **opciones)
+
+
+def nuevo(nombre, precio=1.5, stock=3, imagen=None, id_producto=None):
+    return Producto(id_producto, f"{PREFIJO} {nombre}", precio, stock, imagen)
+
+
+def prueba_alta_y_carga(repo, creados):
+    version_antes, _ = repo.cargar()
+    id_producto = repo.insertar(nuevo("alta", 2.25, 7))
+    creados.append(id_producto)
+    version, filas = repo.cargar()
+    fila = next(f for f in filas if f["id_producto"] == id_producto)
+    assert fila["nombre"] == f"{PREFIJO} alta" and fila["stock"] == 7, fila
+    assert float(fila["precio"]) == 2.25, fila
+    assert fila["imagen"] == "", "imagen NULL debe leerse como ''"
+    assert version > version_antes, (version_antes, version)
+
+
+def prueba_alta_con_id(repo, creados):
+    assert repo.insertar(nuevo("con id", id_producto=ID_FIJO)) == ID_FIJO
+    creados.append(ID_FIJO)
+    try:
+        repo.insertar(nuevo("duplicado", id_producto=ID_FIJO))
+    except Exception:
+        pass
+    else:
+        raise AssertionError("un id repetido debe fallar")
+    assert repo.leer([ID_FIJO])[ID_FIJO]["nombre"] == f"{PREFIJO} con id"
+
+
+def prueba_modificacion_y_baja(repo, creados):
+    id_producto = repo.insertar(nuevo("modificar"))
+    creados.append(id_producto)
+    assert repo.actualizar(nuevo("modificado", 9.0, 1, "foto.png", id_producto=id_producto))
+    fila = repo.leer([id_producto])[id_producto]
+    assert (fila["nombre"], float(fila["precio"]), fila["stock"], fila["imagen"]) == \
+        (f"{PREFIJO} modificado", 9.0, 1, "foto.png"), fila
+    assert repo.eliminar(id_producto) is True
+    assert repo.leer([id_producto]) == {id_producto: None}
+    assert repo.eliminar(id_producto) is False
+
+
+def prueba_lote(repo, creados):
+    existente = repo.insertar(nuevo("lote existente"))
+    creados.append(existente)
+    version, _ = repo.cargar()
+    productos = [nuevo("lote nuevo 1"), nuevo("lote existente v2", 4.0, 40, id_producto=existente), nuevo("lote nuevo 2"),
+                 nuevo("lote con id nuevo", id_producto=ID_FIJO - 1)]
+    ids = repo.guardar_lote(productos)
+    creados.extend(ids)
+    assert len(ids) == 4 and ids[1] == existente and ids[3] == ID_FIJO - 1, ids
+    assert all(p.id_producto is not None for p in productos), "el lote debe asignar ids"
+    leidos = repo.leer(ids)
+    assert leidos[existente]["stock"] == 40 and leidos[existente]["nombre"] == f"{PREFIJO} lote existente v2"
+    assert [leidos[p.id_producto]["nombre"] for p in productos] == [p.nombre for p in productos], leidos
+    # Las filas nuevas (con o sin id) quedan como altas; la existente, como modificación
+    _, cambios = repo.cambios_desde(version)
+    assert [(c["id_producto"], c["operacion"]) for c in cambios if c["id_producto"] in ids] == [
+        (ids[0], "I"), (existente, "U"), (ids[2], "I"), (ID_FIJO - 1, "I")
+    ], cambios
+
+
+def prueba_registro_de_cambios(repo, creados):
+    version, _ = repo.cargar()
+    id_producto = repo.insertar(nuevo("cambios"))
+    creados.append(id_producto)
+    repo.actualizar(nuevo("cambios 2", id_producto=id_producto))
+    repo.eliminar(id_producto)
+    minima, cambios = repo.cambios_desde(version)
+    assert minima is not None and minima <= version + 1
+    propios = [(c["id_producto"], c["operacion"]) for c in cambios if c["id_producto"] == id_producto]
+    assert propios == [(id_producto, "I"), (id_producto, "U"), (id_producto, "D")], propios
+    versiones = [c["version"] for c in cambios]
+    assert versiones == sorted(versiones) and versiones[0] > version
+
+
+def prueba_leer_muchos(repo, creados):
+    ids = repo.guardar_lote([nuevo(f"muchos {i}") for i in range(1200)])
+    creados.extend(ids)
+    leidos = repo.leer(ids + [ID_FIJO + 1])
+    assert leidos[ID_FIJO + 1] is None
+    assert all(leidos[i] is not None for i in ids)
+
+
+def prueba_iterar(repo, creados):
+    ids = repo.guardar_lote([nuevo(f"iterar {i}") for i in range(25)])
+    creados.extend(ids)
+    recorridos = [f["id_producto"] for f in repo.iterar(lote=7)]
+    assert recorridos == sorted(recorridos), "iterar debe ir en orden de id"
+    assert len(recorridos) == len(set(recorridos))
+    assert set(ids) <= set(recorridos)
+
+
+def prueba_sincronizacion(repo, creados, otro_repo):
+    a = crear_inventario(repo)
+    b = crear_inventario(otro_repo)
+    producto = nuevo("sync")
+    assert a.agregar_producto(producto)
+    creados.append(producto.id_producto)
+    b.sincronizar()
+    assert b.obtener(producto.id_producto).nombre == producto.nombre
+    a.actualizar_producto(producto.id_producto, stock=99)
+    b.sincronizar()
+    assert b.obtener(producto.id_producto).stock == 99
+    assert b.buscar_por_nombre(f"{PREFIJO} sync")
+    a.eliminar_producto(producto.id_producto)
+    b.sincronizar()
+    assert b.obtener(producto.id_producto) is None
+    assert [p.id_producto for p in a.iterar_desde_db(lote=3)] == sorted(p.id_producto for p in a.mostrar_todos())
+
+
+def prueba_marca_compartida(repo, creados, otro_repo):
+    # Dos workers al día de la misma versión dan el mismo ETag y Last-Modified
+    a = crear_inventario(repo)
+    b = crear_inventario(otro_repo)
+    producto = nuevo("marca")
+    assert a.agregar_producto(producto)
+    creados.append(producto.id_producto)
+    assert a.marca()[1] is None, "con un cambio propio sin sincronizar la marca es de la instancia"
+    a.sincronizar()
+    b.sincronizar()
+    assert a.marca() == b.marca() and a.marca()[1] is not None, (a.marca(), b.marca())
+    anterior = a.marca()
+    b.ajustar_stock(producto.id_producto, 1)
+    assert b.marca() != anterior
+    a.sincronizar()
+    b.sincronizar()
+    assert a.marca() == b.marca() != anterior, (a.marca(), b.marca())
+
+
+def prueba_purga(repo, creados, otro_repo):
+    a = crear_inventario(repo)
+    b = crear_inventario(otro_repo)
+    producto = nuevo("purga")
+    a.agregar_producto(producto)
+    creados.append(producto.id_producto)
+    a.agregar_producto(nuevo("purga 2"))
+    creados.append(a.buscar_por_nombre(f"{PREFIJO} purga 2")[0].id_producto)
+    repo.purgar_cambios(conservar_horas=-1)
+    assert repo.cambios_desde(0) == (None, [])
+    a.agregar_producto(nuevo("tras purga"))
+    creados.append(a.buscar_por_nombre(f"{PREFIJO} tras purga")[0].id_producto)
+    # b quedó por detrás de lo purgado: debe recargar el catálogo entero
+    b.sincronizar()
+    assert {p.id_producto for p in b.mostrar_todos()} == {p.id_producto for p in a.mostrar_todos()}
+
+
+def prueba_actualizar_optimista(repo, creados):
+    id_producto = repo.insertar(nuevo("optimista", stock=5))
+    creados.append(id_producto)
+    revision = repo.leer([id_producto])[id_producto]["revision"]
+    fila = repo.actualizar(nuevo("optimista 2", stock=None, id_producto=id_producto), revision=revision)
+    assert fila and fila["revision"] == revision + 1 and fila["stock"] == 5, fila
+    assert repo.actualizar(nuevo("pisado", id_producto=id_producto), revision=revision) is None
+    assert repo.actualizar(nuevo("pisado", stock=9, id_producto=id_producto), stock_anterior=4) is None
+    assert repo.leer([id_producto])[id_producto]["nombre"] == f"{PREFIJO} optimista 2"
+    assert repo.actualizar(nuevo("no existe", id_producto=ID_FIJO - 1)) is None
+
+
+def prueba_ajustar_stock(repo, creados):
+    id_producto = repo.insertar(nuevo("ajustes", stock=5))
+    otro = repo.insertar(nuevo("ajustes otro", stock=1))
+    creados.extend([id_producto, otro])
+    revision = repo.leer([id_producto])[id_producto]["revision"]
+    version, _ = repo.cargar()
+    stock, fallidas, version_ajuste = repo.ajustar_stock(
+        [(otro, -1), (id_producto, -3), (id_producto, -3), (ID_FIJO + 3, 1), (id_producto, 10)])
+    assert stock == {id_producto: 12, otro: 0}, stock
+    assert fallidas == [(2, "stock insuficiente"), (3, "no existe")], fallidas
+    assert version_ajuste is not None and version_ajuste > version
+    fila = repo.leer([id_producto])[id_producto]
+    assert fila["stock"] == 12 and fila["revision"] == revision, "los ajustes no cambian la revisión"
+    _, cambios = repo.cambios_desde(version)
+    assert {c["id_producto"] for c in cambios} == {id_producto, otro}
+    # Con todo_o_nada una línea fallida revierte las demás
+    stock, fallidas, _ = repo.ajustar_stock([(id_producto, -1), (otro, -1)], todo_o_nada=True)
+    assert stock == {} and fallidas == [(1, "stock insuficiente")]
+    assert repo.leer([id_producto])[id_producto]["stock"] == 12
+
+
+def prueba_operaciones_mezcladas(repo, creados, otro_repo):
+    inv = crear_inventario(repo)
+    base = nuevo("operaciones", stock=4)
+    assert inv.agregar_producto(base)
+    creados.append(base.id_producto)
+    resultado = inv.aplicar_operaciones([
+        ("agregar", nuevo("operaciones alta", stock=2)),
+        ("ajustar", base.id_producto, -1),
+        ("actualizar", base.id_producto, {"precio": 9.0}),
+        ("ajustar", base.id_producto, -10),
+        ("eliminar", ID_FIJO + 4),
+        ("actualizar", base.id_producto, {"nombre": f"{PREFIJO} operaciones bis"}),
+    ])
+    alta = resultado["ids"][0]
+    creados.append(alta)
+    assert resultado["aplicadas"] == 4, resultado
+    assert [f["motivo"] for f in resultado["fallidas"]] == ["stock insuficiente", "no existe"], resultado
+    producto = inv.obtener(base.id_producto)
+    assert (producto.stock, float(producto.precio), producto.nombre) == (3, 9.0, f"{PREFIJO} operaciones bis"), producto
+    otro = crear_inventario(otro_repo)
+    assert otro.obtener(alta).stock == 2 and otro.obtener(base.id_producto).stock == 3
+    # Con todo_o_nada no queda nada aplicado, tampoco en la BD
+    resultado = inv.aplicar_operaciones([("eliminar", alta), ("ajustar", base.id_producto, -5)], todo_o_nada=True)
+    assert resultado["aplicadas"] == 0 and resultado["ids"] == [None, None], resultado
+    assert inv.obtener(alta) is not None and repo.leer([alta])[alta] is not None
+    inv.cerrar()
+
+
+def prueba_operaciones_ajuste_fallido(repo, creados):
+    # Se comprueba por el resultado, el stock y el registro, no por el rowcount de cada backend
+    id_producto = repo.insertar(nuevo("ajuste fallido", stock=2))
+    creados.append(id_producto)
+    antes = repo.cambios_desde(0)[1]
+    ids, fallidas = repo.aplicar_operaciones([("ajustar", id_producto, -5), ("ajustar", ID_FIJO + 5, 1)])
+    assert ids == [None, None], ids
+    assert fallidas == [(0, "stock insuficiente"), (1, "no existe")], fallidas
+    assert repo.leer([id_producto])[id_producto]["stock"] == 2
+    assert repo.cambios_desde(0)[1] == antes, "un ajuste fallido no debe registrar cambios"
+
+
+def prueba_inventario_ajustes(repo, creados, otro_repo):
+    a = crear_inventario(repo)
+    b = crear_inventario(otro_repo)
+    producto = nuevo("inventario ajustes", stock=3)
+    a.agregar_producto(producto)
+    creados.append(producto.id_producto)
+    b.sincronizar()
+    assert b.ajustar_stock(producto.id_producto, -2) == 1
+    assert a.ajustar_stock(producto.id_producto, -2) is None, "a tiene el cache viejo pero la BD decide"
+    assert a.obtener(producto.id_producto).stock == 3
+    resultado = a.ajustar_stock_lote([(producto.id_producto, 4), (producto.id_producto, 0)])
+    assert resultado["aplicadas"] == 1 and resultado["stock"] == {producto.id_producto: 5}, resultado
+    assert resultado["fallidas"][0]["motivo"] == "delta inválido"
+    assert a.obtener(producto.id_producto).stock == 5
+    # b vio stock 1: su edición del stock debe rechazarse y refrescar el cache
+    assert not b.actualizar_producto(producto.id_producto, stock=7)
+    assert b.obtener(producto.id_producto).stock == 5
+    assert b.actualizar_producto(producto.id_producto, nombre=f"{PREFIJO} inventario ajustes 2")
+    assert a.actualizar_producto(producto.id_producto, precio=3.0) is False, "revisión vieja en a"
+
+
+def prueba_escritura_diferida(repo, creados, otro_repo):
+    a = crear_inventario(repo, escritura_diferida=True, max_espera=60)
+    b = crear_inventario(otro_repo)
+    try:
+        ids = []
+        for n in range(3):
+            producto = nuevo(f"diferida {n}", stock=10)
+            a.agregar_producto(producto)
+            ids.append(producto.id_producto)
+        creados.extend(ids)
+        b.sincronizar()
+        assert a.actualizar_producto(ids[0], nombre=f"{PREFIJO} diferida 0 v2")
+        assert a.actualizar_producto(ids[0], stock=4)
+        assert a.actualizar_producto(ids[1], precio=7.0)
+        assert a.eliminar_producto(ids[2])
+        assert a.obtener(ids[0]).nombre == f"{PREFIJO} diferida 0 v2" and a.obtener(ids[0]).stock == 4
+        assert repo.leer([ids[0]])[ids[0]]["stock"] == 10, "aún no debe haberse escrito"
+        # Mientras tanto otro proceso modifica ids[1]: la escritura encolada debe rechazarse
+        assert b.actualizar_producto(ids[1], nombre=f"{PREFIJO} diferida 1 de b")
+        a.sincronizar()
+        assert a.obtener(ids[1]).precio == 7.0, "la sincronización no pisa lo pendiente"
+        assert a.vaciar_escrituras() == 3
+        leidos = repo.leer(ids)
+        assert (leidos[ids[0]]["nombre"], leidos[ids[0]]["stock"]) == (f"{PREFIJO} diferida 0 v2", 4), leidos[ids[0]]
+        assert leidos[ids[2]] is None
+        assert leidos[ids[1]]["nombre"] == f"{PREFIJO} diferida 1 de b" and float(leidos[ids[1]]["precio"]) == 1.5
+        assert a.obtener(ids[1]).nombre == f"{PREFIJO} diferida 1 de b", "el rechazo refresca el cache"
+        estadisticas = a.estadisticas_escritura()
+        assert estadisticas["vaciados"] == 1 and estadisticas["fundidos"] == 1 and estadisticas["rechazados"] == 1, estadisticas
+        # Umbral de tiempo y volcado al cerrar
+        a._cola.max_espera = 0.05
+        a.actualizar_producto(ids[0], stock=5)
+        time.sleep(0.5)
+        assert repo.leer([ids[0]])[ids[0]]["stock"] == 5, "debe volcarse solo pasado max_espera"
+        a._cola.max_espera = 60
+        a.actualizar_producto(ids[0], stock=6)
+    finally:
+        a.cerrar()
+    assert repo.leer([ids[0]])[ids[0]]["stock"] == 6, "cerrar debe volcar lo pendiente"
+
+
+def resumen_recalculado(inv):
+    productos = inv.mostrar_todos()
+    return {
+        "productos": len(productos),
+        "unidades": sum(p.stock for p in productos),
+        "valor": round(sum(round(float(p.precio) * 100) * p.stock for p in productos) / 100, 2),
+        "bandas": {
+            "suficiente": sum(p.stock > 5 for p in productos),
+            "bajo": sum(0 < p.stock <= 5 for p in productos),
+            "agotado": sum(p.stock <= 0 for p in productos),
+        },
+        "bajo_stock": sum(p.stock <= 5 for p in productos),
+    }
+
+
+def comprobar_resumen(inv):
+    resumen = inv.resumen()
+    bajos = resumen.pop("productos_bajo_stock")
+    resumen["valor"] = round(resumen["valor"], 2)
+    assert resumen == resumen_recalculado(inv), (resumen, resumen_recalculado(inv))
+    assert [p.stock for p in bajos] == sorted(p.stock for p in bajos)
+
+
+def prueba_resumen(repo, creados, otro_repo):
+    a = crear_inventario(repo)
+    b = crear_inventario(otro_repo)
+    comprobar_resumen(a)
+    ids = []
+    for n, (precio, stock) in enumerate([(0.1, 3), (2.35, 0), (19.99, 40)]):
+        producto = nuevo(f"resumen {n}", precio=precio, stock=stock)
+        a.agregar_producto(producto)
+        ids.append(producto.id_producto)
+    creados.extend(ids)
+    comprobar_resumen(a)
+    assert a.obtener(ids[1]) in a.resumen(limite_bajo_stock=10 ** 6)["productos_bajo_stock"]
+    a.actualizar_producto(ids[0], precio=0.7, stock=8)
+    a.ajustar_stock_lote([(ids[1], 5), (ids[2], -38)])
+    a.eliminar_producto(ids[0])
+    comprobar_resumen(a)
+    # Los cambios de otro proceso llegan por sincronizar
+    b.sincronizar()
+    b.ajustar_stock(ids[2], -2)
+    b.actualizar_producto(ids[1], precio=1.0)
+    a.sincronizar()
+    comprobar_resumen(a)
+    assert a.resumen()["bandas"] == resumen_recalculado(b)["bandas"]
+
+
+def prueba_kardex(repo, creados):
+    # Cada paso deja (o no) un movimiento; después se pide el stock en la fecha de cada uno
+    id_producto = repo.insertar(nuevo("kardex", stock=5))
+    creados.append(id_producto)
+    pasos = [
+        lambda: repo.ajustar_stock([(id_producto, 3)]),
+        lambda: repo.ajustar_stock([(id_producto, -2)]),
+        lambda: repo.actualizar(nuevo("kardex", stock=20, id_producto=id_producto)),
+        lambda: repo.actualizar(nuevo("kardex sin stock", stock=None, id_producto=id_producto)),
+        lambda: repo.tomar_instantaneas(retraso=0),
+        lambda: repo.ajustar_stock([(id_producto, -4)]),
+        lambda: repo.guardar_lote([nuevo("kardex", stock=7, id_producto=id_producto)]),
+        lambda: repo.tomar_instantaneas(retraso=0),
+        lambda: repo.eliminar(id_producto),
+    ]
+    for paso in pasos:
+        time.sleep(0.005)
+        paso()
+    desde, hasta = datetime(2000, 1, 1), datetime(2100, 1, 1)
+    inicial, movimientos = repo.movimientos_stock(id_producto, desde, hasta)
+    assert inicial == 0, inicial
+    assert [(m["tipo"], m["delta"], m["stock"]) for m in movimientos] == [
+        ("I", 5, 5), ("A", 3, 8), ("A", -2, 6), ("U", 14, 20), ("A", -4, 16), ("U", -9, 7), ("D", -7, 0)
+    ], movimientos
+    for m in movimientos:
+        assert repo.stock_en(id_producto, m["creado_en"]) == m["stock"], m
+    assert repo.stock_en(id_producto, movimientos[0]["creado_en"] - timedelta(seconds=1)) == 0
+    # Un tramo intermedio parte del stock de justo antes, con o sin instantánea de por medio
+    inicial, tramo = repo.movimientos_stock(id_producto, movimientos[3]["creado_en"], movimientos[5]["creado_en"])
+    assert inicial == 6 and [m["stock"] for m in tramo] == [20, 16, 7], (inicial, tramo)
+    assert repo.movimientos_stock(id_producto, desde, hasta, limite=2)[1] == movimientos[:2]
+    assert repo.tomar_instantaneas(retraso=3600) == 0
+
+
+def prueba_preparar_idempotente(repo, creados):
+    repo.preparar()
+    repo.preparar()
+
+
+PRUEBAS = [
+    prueba_preparar_idempotente,
+    prueba_alta_y_carga,
+    prueba_alta_con_id,
+    prueba_modificacion_y_baja,
+    prueba_lote,
+    prueba_registro_de_cambios,
+    prueba_leer_muchos,
+    prueba_iterar,
+    prueba_sincronizacion,
+    prueba_marca_compartida,
+    prueba_purga,
+    prueba_actualizar_optimista,
+    prueba_ajustar_stock,
+    prueba_inventario_ajustes,
+    prueba_operaciones_mezcladas,
+    prueba_operaciones_ajuste_fallido,
+    prueba_escritura_diferida,
+    prueba_resumen,
+    prueba_kardex,
+]
+
+
+def verificar_migracion_sqlite(carpeta):
+    # La base SQLite antigua (id, nombre, cantidad, precio) debe pasar al esquema común sin perder filas
+    path = os.path.join(carpeta, "antigua.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE productos (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL, "
+                 "cantidad INTEGER NOT NULL, precio REAL NOT NULL)")
+    conn.execute("INSERT INTO productos (nombre, cantidad, precio) VALUES ('Arroz', 4, 1.25)")
+    conn.commit()
+    conn.close()
+    repo = RepositorioSQLite(path)
+    repo.preparar()
+    repo.preparar()
+    _, filas = repo.cargar()
+    assert [(f["id_producto"], f["nombre"], f["stock"], f["precio"]) for f in filas] == [(1, "Arroz", 4, 1.25)], filas
+    # El kardex empieza con el stock migrado como saldo inicial (una sola vez)
+    _, movimientos = repo.movimientos_stock(1, datetime(2000, 1, 1), datetime(2100, 1, 1))
+    assert [(m["tipo"], m["delta"]) for m in movimientos] == [("S", 4)], movimientos
+    assert repo.stock_en(1, datetime.now(timezone.utc)) == 4
+
+
+def verificar_zona_mysql():
+    # Un cliente con la sesión en otra zona (o un servidor en hora local) no debe mover las fechas
+    # del kardex: las columnas son TIMESTAMP y el repositorio fija su sesión en UTC
+    import mysql.connector
+    from conexion.conexion import DB_CONFIG, pool_async
+    repo = RepositorioMySQL()
+    with repo.transaccion() as cursor:
+        cursor.execute("SELECT @@session.time_zone AS zona")
+        assert cursor.fetchone()["zona"] == "+00:00"
+
+    async def zona_asincrona():
+        try:
+            async with pool_async.transaccion() as cursor:
+                await cursor.execute("SELECT @@session.time_zone AS zona")
+                return (await cursor.fetchone())["zona"]
+        finally:
+            await pool_async.cerrar()
+    try:
+        import aiomysql  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        assert asyncio.run(zona_asincrona()) == "+00:00"
+
+    id_producto = repo.insertar(nuevo("zona", stock=5))
+    try:
+        conn = mysql.connector.connect(**{**DB_CONFIG, "time_zone": "+05:00"})
+        try:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE productos SET stock = stock + 2 WHERE id_producto = %s", (id_producto,))
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+        _, movimientos = repo.movimientos_stock(id_producto, ahora - timedelta(minutes=5), ahora + timedelta(minutes=5))
+        assert [(m["tipo"], m["delta"]) for m in movimientos] == [("I", 5), ("A", 2)], movimientos
+        assert all(abs(m["creado_en"] - ahora) < timedelta(minutes=1) for m in movimientos), movimientos
+        assert repo.stock_en(id_producto, ahora + timedelta(minutes=1)) == 7
+        assert repo.stock_en(id_producto, datetime.now(timezone(timedelta(hours=5))) + timedelta(minutes=1)) == 7
+        assert repo.stock_en(id_producto, ahora - timedelta(hours=1)) == 0
+    finally:
+        repo.eliminar(id_producto)
+
+
+def fabrica(backend, carpeta):
+    if backend == "memoria":
+        compartido = RepositorioMemoria()
+        return lambda: compartido
+    if backend == "sqlite":
+        path = os.path.join(carpeta, "conformidad.db")
+        return lambda: RepositorioSQLite(path)
+    return RepositorioMySQL
+
+
+def verificar(backend, carpeta):
+    crear = fabrica(backend, carpeta)
+    repo = crear()
+    repo.preparar()
+    fallos = 0
+    for prueba in PRUEBAS:
+        if backend == "mysql" and prueba is prueba_purga:
+            print(f"  - {prueba.__name__}: omitida (borraría el registro de cambios real)")
+            continue
+        creados = []
+        inicio = time.perf_counter()
+        try:
+            if prueba in (prueba_sincronizacion, prueba_marca_compartida, prueba_purga, prueba_inventario_ajustes, prueba_operaciones_mezcladas,
+                          prueba_escritura_diferida,
+                          prueba_resumen):
+                prueba(repo, creados, crear())
+            else:
+                prueba(repo, creados)
+            print(f"  ✅ {prueba.__name__} ({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        except Exception:
+            fallos += 1
+            print(f"  ❌ {prueba.__name__}")
+            traceback.print_exc()
+        finally:
+            for id_producto in dict.fromkeys(creados):
+                try:
+                    repo.eliminar(id_producto)
+                except Exception:
+                    pass
+    if backend == "sqlite":
+        try:
+            verificar_migracion_sqlite(carpeta)
+            print("  ✅ migracion_esquema_antiguo")
+        except Exception:
+            fallos += 1
+            print("  ❌ migracion_esquema_antiguo")
+            traceback.print_exc()
+    if backend == "mysql":
+        try:
+            verificar_zona_mysql()
+            print("  ✅ zona_horaria_sesion")
+        except Exception:
+            fallos += 1
+            print("  ❌ zona_horaria_sesion")
+            traceback.print_exc()
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", choices=BACKENDS,
+                        help="Backend a verificar (se puede repetir); por defecto memoria y sqlite")
+    parser.add_argument("--catalogo", choices=CATALOGOS, default="objetos", help="Representación del cache de Inventario")
+    args = parser.parse_args()
+    global CATALOGO
+    CATALOGO = args.catalogo
+
+    fallos = 0
+    for backend in args.backend or ["memoria", "sqlite"]:
+        print(f"{backend}:")
+        with tempfile.TemporaryDirectory() as carpeta:
+            fallos += verificar(backend, carpeta)
+    print("Todo correcto" if not fallos else f"{fallos} prueba(s) fallida(s)")
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import unicodedata
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def normalizar(texto: str) -> str:
+    # Quita tildes/diéresis y pasa a minúsculas: "Azúcar Ñandú" -> "azucar nandu"
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_marcas = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_marcas.casefold()
+
+
+def trigramas(texto: str) -> Set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceBusqueda:
+    """Índice invertido de trigramas sobre el nombre de los productos.
+
+    Responde búsquedas por subcadena y por prefijo sin consultar la base de datos.
+    Las consultas de menos de 3 caracteres (sin trigramas) recorren los nombres
+    normalizados en memoria.
+    """
+
+    def __init__(self):
+        self._nombres: Dict[int, str] = {}
+        self._trigramas: Dict[str, Set[int]] = {}
+
+    def __len__(self):
+        return len(self._nombres)
+
+    def construir(self, pares: Iterable[Tuple[int, str]]):
+        self._nombres = {}
+        self._trigramas = {}
+        for id_producto, nombre in pares:
+            self.agregar(id_producto, nombre)
+
+    def agregar(self, id_producto: int, nombre: str):
+        if id_producto in self._nombres:
+            self.quitar(id_producto)
+        norm = normalizar(nombre)
+        self._nombres[id_producto] = norm
+        for tri in trigramas(norm):
+            self._trigramas.setdefault(tri, set()).add(id_producto)
+
+    def quitar(self, id_producto: int):
+        norm = self._nombres.pop(id_producto, None)
+        if norm is None:
+            return
+        for tri in trigramas(norm):
+            ids = self._trigramas.get(tri)
+            if ids is not None:
+                ids.discard(id_producto)
+                if not ids:
+                    del self._trigramas[tri]
+
+    def actualizar(self, id_producto: int, nombre: str):
+        self.agregar(id_producto, nombre)
+
+    def _candidatos(self, norm: str):
+        tris = trigramas(norm)
+        if not tris:
+            return self._nombres.keys()
+        conjuntos = []
+        for tri in tris:
+            ids = self._trigramas.get(tri)
+            if not ids:
+                return set()
+            conjuntos.append(ids)
+        conjuntos.sort(key=len)
+        candidatos = set(conjuntos[0])
+        for ids in conjuntos[1:]:
+            candidatos &= ids
+            if not candidatos:
+                break
+        return candidatos
+
+    def buscar(self, texto: str) -> List[int]:
+        norm = normalizar(texto).strip()
+        if not norm:
+            return sorted(self._nombres)
+        return sorted(i for i in self._candidatos(norm) if norm in self._nombres[i])
+
+    def buscar_prefijo(self, texto: str) -> List[int]:
+        norm = normalizar(texto).strip()
+        if not norm:
+            return sorted(self._nombres)
+        return sorted(i for i in self._candidatos(norm) if self._nombres[i].startswith(norm))
@@ -0,0 +1,116 @@
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableMapping
+from typing import Callable, Iterator, List
+
+CATALOGOS = ("objetos", "columnar")
+
+
+class CatalogoColumnar(MutableMapping):
+    """Productos guardados por columnas en lugar de un objeto por producto.
+
+    id, precio, stock y revisión van en arrays de C (8 bytes por valor) ordenados por id; los
+    nombres e imágenes en listas de cadenas internadas (las repetidas se guardan una vez).
+    Se usa como el dict id -> Producto de Inventario, pero cada acceso devuelve un Producto
+    nuevo (una vista del momento): modificarlo no cambia el catálogo, hay que volver a asignarlo.
+    Las altas con id mayor que el último (lo normal con AUTO_INCREMENT) son un append.
+    """
+
+    def __init__(self, fabrica: Callable, productos=()):
+        # fabrica(id_producto, nombre, precio, stock, imagen, revision) crea la vista (Producto)
+        self._fabrica = fabrica
+        self._lock = threading.Lock()
+        self._ids = array("q")
+        self._precios = array("d")
+        self._stock = array("q")
+        self._revisiones = array("q")
+        self._nombres: List[str] = []
+        self._imagenes: List[str] = []
+        ultimo = None
+        for producto in productos:
+            # La carga viene ordenada por id: append directo, sin bisect ni lock
+            if ultimo is not None and producto.id_producto <= ultimo:
+                self[producto.id_producto] = producto
+                continue
+            ultimo = producto.id_producto
+            self._ids.append(ultimo)
+            self._precios.append(float(producto.precio))
+            self._stock.append(producto.stock)
+            self._revisiones.append(producto.revision)
+            self._nombres.append(sys.intern(producto.nombre))
+            self._imagenes.append(sys.intern(producto.imagen or ""))
+
+    def _fila(self, id_producto: int) -> int:
+        i = bisect_left(self._ids, id_producto)
+        return i if i < len(self._ids) and self._ids[i] == id_producto else -1
+
+    def _vista(self, i: int):
+        return self._fabrica(self._ids[i], self._nombres[i], self._precios[i], self._stock[i],
+                             self._imagenes[i], self._revisiones[i])
+
+    def __getitem__(self, id_producto):
+        with self._lock:
+            i = self._fila(id_producto)
+            if i < 0:
+                raise KeyError(id_producto)
+            return self._vista(i)
+
+    def __contains__(self, id_producto):
+        with self._lock:
+            return self._fila(id_producto) >= 0
+
+    def __setitem__(self, id_producto, producto):
+        nombre = sys.intern(producto.nombre)
+        imagen = sys.intern(producto.imagen or "")
+        with self._lock:
+            i = self._fila(id_producto)
+            if i >= 0:
+                self._precios[i] = float(producto.precio)
+                self._stock[i] = producto.stock
+                self._revisiones[i] = producto.revision
+                self._nombres[i] = nombre
+                self._imagenes[i] = imagen
+                return
+            valores = (id_producto, float(producto.precio), producto.stock, producto.revision, nombre, imagen)
+            columnas = (self._ids, self._precios, self._stock, self._revisiones, self._nombres, self._imagenes)
+            if not self._ids or id_producto > self._ids[-1]:
+                for columna, valor in zip(columnas, valores):
+                    columna.append(valor)
+            else:
+                i = bisect_left(self._ids, id_producto)
+                for columna, valor in zip(columnas, valores):
+                    columna.insert(i, valor)
+
+    def __delitem__(self, id_producto):
+        with self._lock:
+            i = self._fila(id_producto)
+            if i < 0:
+                raise KeyError(id_producto)
+            for columna in (self._ids, self._precios, self._stock, self._revisiones, self._nombres, self._imagenes):
+                del columna[i]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        for producto in self.values():
+            yield producto.id_producto
+
+    def values(self, bloque: int = 1000):
+        # Por bloques y por id (no por posición): las altas y bajas concurrentes no descolocan el recorrido
+        ultimo = None
+        while True:
+            with self._lock:
+                inicio = 0 if ultimo is None else bisect_right(self._ids, ultimo)
+                vistas = [self._vista(i) for i in range(inicio, min(inicio + bloque, len(self._ids)))]
+            if not vistas:
+                return
+            yield from vistas
+            ultimo = vistas[-1].id_producto
+
+    def bytes_columnas(self) -> int:
+        # Tamaño de las columnas (sin las cadenas, que se comparten con el resto del proceso)
+        return sum(sys.getsizeof(c) for c in (self._ids, self._precios, self._stock, self._revisiones,
+                                               self._nombres, self._imagenes))
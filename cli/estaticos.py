@@ -0,0 +1,42 @@
+import argparse
+import sys
+from pathlib import Path
+
+from estaticos import DIST, MANIFIESTO, brotli, construir, vendorizar
+
+STATIC = Path(__file__).resolve().parent.parent / "static"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Prepara static/ para producción: descarga a static/vendor lo que antes venía del CDN "
+                    "(Bootstrap y sus iconos con las fuentes), copia cada archivo a static/dist con el hash de su "
+                    "contenido en el nombre, genera las versiones .gz y .br y escribe el manifiesto. Se ejecuta "
+                    "al desplegar, antes de arrancar los workers."
+    )
+    parser.add_argument("--carpeta", default=str(STATIC))
+    parser.add_argument("--sin-descargar", action="store_true", help="No descarga nada (usa lo que ya haya en vendor/)")
+    parser.add_argument("--forzar-descarga", action="store_true", help="Vuelve a bajar lo ya descargado")
+    args = parser.parse_args(argv)
+
+    carpeta = Path(args.carpeta)
+    if not args.sin_descargar:
+        try:
+            for ruta, tamano in vendorizar(carpeta, forzar=args.forzar_descarga).items():
+                print(f"Descargado {ruta} ({tamano} bytes)")
+        except Exception as e:
+            print(f"Error al descargar los recursos externos: {e} (use --sin-descargar para construir sin ellos)",
+                  file=sys.stderr)
+            return 1
+    generados = construir(carpeta)
+    for ruta, datos in generados.items():
+        comprimidos = " ".join(f"{c} {datos[c]}" for c in ("gz", "br") if c in datos)
+        print(f"{ruta} -> {datos['ruta']} ({datos['bytes']} bytes{'; ' + comprimidos if comprimidos else ''})")
+    if brotli is None:
+        print("Aviso: sin el paquete brotli solo se generan las versiones .gz", file=sys.stderr)
+    print(f"{len(generados)} archivos en {carpeta / DIST} (manifiesto {MANIFIESTO}); reinicie los workers para usarlos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
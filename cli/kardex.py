@@ -0,0 +1,77 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from almacenamiento import BACKENDS, crear_repositorio
+
+
+def fecha(valor):
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha ISO 8601 no válida: {valor!r}")
+
+
+def cmd_instantaneas(repositorio, args):
+    inicio = time.perf_counter()
+    try:
+        escritas = repositorio.tomar_instantaneas(args.hasta, args.retraso)
+    except Exception as e:
+        print(f"Error al tomar instantáneas de stock ({repositorio.nombre}): {e}", file=sys.stderr)
+        return 1
+    print(f"{escritas} instantáneas de stock en {time.perf_counter() - inicio:.2f}s")
+    return 0
+
+
+def cmd_stock(repositorio, args):
+    print(repositorio.stock_en(args.id_producto, args.fecha))
+    return 0
+
+
+def cmd_movimientos(repositorio, args):
+    inicial, movimientos = repositorio.movimientos_stock(args.id_producto, args.desde, args.hasta or datetime.now(timezone.utc),
+                                                         args.limite)
+    print(f"{'fecha':<26} {'tipo':<4} {'delta':>8} {'stock':>8}")
+    print(f"{'(inicial)':<26} {'':<4} {'':>8} {inicial:>8}")
+    for m in movimientos:
+        print(f"{m['creado_en'].isoformat(sep=' '):<26} {m['tipo']:<4} {m['delta']:>+8} {m['stock']:>8}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Kardex de stock: movimientos e instantáneas. 'instantaneas' se programa periódicamente "
+                    "(por ejemplo cada hora con cron) para que las consultas históricas solo sumen los "
+                    "movimientos desde la última."
+    )
+    parser.add_argument("--backend", choices=BACKENDS, help="Por defecto el de INVENTARIO_BACKEND")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("instantaneas", help="Guarda el stock de los productos con movimientos desde la anterior")
+    p.add_argument("--hasta", type=fecha, help="Solo movimientos hasta esta fecha (por defecto, hasta ahora)")
+    p.add_argument("--retraso", type=float, default=60,
+                   help="Segundos de margen para las transacciones aún abiertas (por defecto 60)")
+    p.set_defaults(func=cmd_instantaneas)
+
+    p = sub.add_parser("stock", help="Stock de un producto en una fecha (UTC si no lleva zona)")
+    p.add_argument("id_producto", type=int)
+    p.add_argument("fecha", type=fecha)
+    p.set_defaults(func=cmd_stock)
+
+    p = sub.add_parser("movimientos", help="Movimientos de un producto entre dos fechas")
+    p.add_argument("id_producto", type=int)
+    p.add_argument("desde", type=fecha)
+    p.add_argument("hasta", type=fecha, nargs="?")
+    p.add_argument("--limite", type=int)
+    p.set_defaults(func=cmd_movimientos)
+
+    args = parser.parse_args(argv)
+    if args.backend:
+        os.environ["INVENTARIO_BACKEND"] = args.backend
+    return args.func(crear_repositorio(), args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import argparse
+import json
+import sys
+
+from importacion import FORMATOS, TAMANO_LOTE, detectar_formato, exportar, importar
+from almacenamiento import crear_repositorio
+from inventario import Inventario, Producto
+
+
+def cmd_importar(args):
+    formato = args.formato or (detectar_formato(args.archivo) if args.archivo != "-" else "jsonl")
+    inventario = Inventario()
+    if args.archivo == "-":
+        resumen = importar(inventario, sys.stdin, formato, args.lote)
+    else:
+        with open(args.archivo, "r", encoding="utf-8", newline="") as f:
+            resumen = importar(inventario, f, formato, args.lote)
+    for error in resumen["errores"]:
+        print(json.dumps(error, ensure_ascii=False), file=sys.stderr)
+    print(f"Leídas: {resumen['leidas']} | Guardadas: {resumen['guardadas']} | "
+          f"Con error: {resumen['con_error']} | Lotes: {resumen['lotes']}")
+    return 1 if resumen["con_error"] else 0
+
+
+def cmd_exportar(args):
+    formato = args.formato or (detectar_formato(args.archivo) if args.archivo != "-" else "jsonl")
+    # No hace falta cargar el catálogo: se lee de la BD por bloques
+    productos = (Producto.from_row(row) for row in crear_repositorio().iterar(args.lote))
+    if args.archivo == "-":
+        for linea in exportar(productos, formato):
+            sys.stdout.write(linea)
+    else:
+        with open(args.archivo, "w", encoding="utf-8", newline="") as f:
+            for linea in exportar(productos, formato):
+                f.write(linea)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importación y exportación masiva de productos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("importar", help="Importa productos desde CSV o JSON Lines ('-' lee de stdin)")
+    p.add_argument("archivo")
+    p.add_argument("--formato", choices=FORMATOS)
+    p.add_argument("--lote", type=int, default=TAMANO_LOTE, help="Filas por transacción")
+    p.set_defaults(func=cmd_importar)
+
+    p = sub.add_parser("exportar", help="Exporta productos a CSV o JSON Lines ('-' escribe en stdout)")
+    p.add_argument("archivo")
+    p.add_argument("--formato", choices=FORMATOS)
+    p.add_argument("--lote", type=int, default=TAMANO_LOTE, help="Filas leídas por consulta")
+    p.set_defaults(func=cmd_exportar)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
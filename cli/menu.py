@@ -1,5 +1,10 @@
-from pathlib import Path
+import argparse
+import sys
+
+from importacion import TAMANO_LOTE, leer_filas
 from inventario import Inventario, Producto
+from operaciones import aplicar, escribir
+
 
 def menu():
     inventario = Inventario()
@@ -16,16 +21,16 @@ def menu():
 
             if opcion == "1":
                 try:
-                    id = int(input("ID: "))
+                    id = input("ID (enter para asignarlo automáticamente): ").strip()
                     nombre = input("Nombre: ").strip()
-                    cantidad = int(input("Cantidad: "))
                     precio = float(input("Precio: "))
+                    stock = int(input("Stock: "))
                 except Exception:
                     print("Datos inválidos.")
                     continue
-                producto = Producto(id, nombre, cantidad, precio)
+                producto = Producto(int(id) if id else None, nombre, precio, stock, None)
                 ok = inventario.agregar_producto(producto)
-                print("Producto agregado." if ok else "ID ya existe. No se agregó.")
+                print(f"Producto agregado con ID {producto.id_producto}." if ok else "ID ya existe. No se agregó.")
             elif opcion == "2":
                 try:
                     id = int(input("ID del producto a eliminar: "))
@@ -37,15 +42,15 @@ def menu():
             elif opcion == "3":
                 try:
                     id = int(input("ID del producto a actualizar: "))
+                    stock = input("Nuevo stock (enter para mantener): ").strip()
+                    precio = input("Nuevo precio (enter para mantener): ").strip()
+                    stock_val = int(stock) if stock != "" else None
+                    precio_val = float(precio) if precio != "" else None
                 except Exception:
-                    print("ID inválido.")
+                    print("Datos inválidos.")
                     continue
-                cantidad = input("Nueva cantidad (enter para mantener): ").strip()
-                precio = input("Nuevo precio (enter para mantener): ").strip()
-                cantidad_val = int(cantidad) if cantidad != "" else None
-                precio_val = float(precio) if precio != "" else None
-                ok = inventario.actualizar_producto(id, cantidad_val, precio_val)
-                print("Producto actualizado." if ok else "No existe el ID.")
+                ok = inventario.actualizar_producto(id, precio=precio_val, stock=stock_val)
+                print("Producto actualizado." if ok else "No existe el ID o cambió mientras tanto.")
             elif opcion == "4":
                 nombre = input("Nombre a buscar: ").strip()
                 productos = inventario.buscar_por_nombre(nombre)
@@ -69,5 +74,87 @@ def menu():
     finally:
         inventario.cerrar()
 
+
+def ejecutar(filas, tamano_lote=TAMANO_LOTE, todo_o_nada=False):
+    # Un resultado JSON por línea en stdout; el resumen en stderr
+    inventario = Inventario()
+    total = con_error = 0
+    try:
+        for resultado in aplicar(inventario, filas, tamano_lote, todo_o_nada):
+            total += 1
+            con_error += not resultado["ok"]
+            sys.stdout.write(escribir(resultado))
+    finally:
+        inventario.cerrar()
+    print(f"Operaciones: {total} | Aplicadas: {total - con_error} | Con error: {con_error}", file=sys.stderr)
+    return 1 if con_error else 0
+
+
+def cmd_lote(args):
+    if args.archivo == "-":
+        return ejecutar(leer_filas(sys.stdin, "jsonl"), args.lote, args.todo_o_nada)
+    with open(args.archivo, "r", encoding="utf-8") as f:
+        return ejecutar(leer_filas(f, "jsonl"), args.lote, args.todo_o_nada)
+
+
+def cmd_operacion(args):
+    # Una sola operación: la misma validación y salida que una línea de un lote
+    fila = {k: v for k, v in vars(args).items() if k not in ("comando", "func") and v is not None}
+    fila["op"] = args.comando
+    return ejecutar([(1, fila)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Inventario desde la terminal. Sin comando abre el menú interactivo; "
+                    "'lote' aplica operaciones JSON Lines (agregar, actualizar, eliminar, ajustar, buscar) "
+                    "en transacciones de --lote líneas y escribe un resultado JSON por línea."
+    )
+    sub = parser.add_subparsers(dest="comando")
+
+    p = sub.add_parser("lote", help="Aplica las operaciones de un archivo JSON Lines ('-' lee de stdin)")
+    p.add_argument("archivo")
+    p.add_argument("--lote", type=int, default=TAMANO_LOTE, help="Operaciones por transacción")
+    p.add_argument("--todo-o-nada", action="store_true", help="Una línea inválida o fallida anula su lote")
+    p.set_defaults(func=cmd_lote)
+
+    p = sub.add_parser("agregar", help="Da de alta un producto")
+    p.add_argument("--id", dest="id_producto", type=int)
+    p.add_argument("--nombre", required=True)
+    p.add_argument("--precio", required=True)
+    p.add_argument("--stock", required=True)
+    p.add_argument("--imagen")
+    p.set_defaults(func=cmd_operacion)
+
+    p = sub.add_parser("actualizar", help="Modifica los campos indicados de un producto")
+    p.add_argument("id_producto", type=int)
+    p.add_argument("--nombre")
+    p.add_argument("--precio")
+    p.add_argument("--stock")
+    p.add_argument("--imagen")
+    p.add_argument("--revision", type=int, help="Solo si el producto sigue en esta revisión")
+    p.set_defaults(func=cmd_operacion)
+
+    p = sub.add_parser("eliminar", help="Da de baja un producto")
+    p.add_argument("id_producto", type=int)
+    p.set_defaults(func=cmd_operacion)
+
+    p = sub.add_parser("ajustar", help="Suma delta al stock (negativo para ventas)")
+    p.add_argument("id_producto", type=int)
+    p.add_argument("delta", type=int)
+    p.set_defaults(func=cmd_operacion)
+
+    p = sub.add_parser("buscar", help="Busca productos por nombre")
+    p.add_argument("q")
+    p.add_argument("--limite", type=int, default=20)
+    p.set_defaults(func=cmd_operacion)
+
+    args = parser.parse_args(argv)
+    if args.comando is None:
+        menu()
+        return 0
+    return args.func(args)
+
+
 if __name__ == "__main__":
-    menu()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import argparse
+import os
+import sys
+import time
+
+from almacenamiento import BACKENDS, crear_repositorio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Crea o actualiza el esquema del inventario (tablas productos, productos_cambios y el kardex de stock). "
+                    "Se ejecuta una vez al desplegar; la app ya no lo comprueba en cada arranque."
+    )
+    parser.add_argument("--backend", choices=BACKENDS, help="Por defecto el de INVENTARIO_BACKEND")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        os.environ["INVENTARIO_BACKEND"] = args.backend
+    repositorio = crear_repositorio()
+    inicio = time.perf_counter()
+    try:
+        repositorio.preparar()
+    except Exception as e:
+        print(f"Error al migrar el esquema del inventario ({repositorio.nombre}): {e}", file=sys.stderr)
+        return 1
+    print(f"Esquema del inventario al día ({repositorio.nombre}) en {time.perf_counter() - inicio:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import atexit
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+
+@dataclass
+class Pendiente:
+    operacion: str  # 'U' modificación, 'D' baja
+    producto: object  # Producto con el estado final (None en las bajas)
+    revision: Optional[int]  # Revisión que tenía en la BD al encolar la primera modificación
+    stock_anterior: Optional[int]
+    encolado_en: float
+
+
+class ColaEscrituras:
+    """Escritura diferida (write-behind) de modificaciones y bajas de productos.
+
+    Inventario actualiza su cache al momento y deja aquí la escritura; un hilo la vuelca en
+    una sola transacción cuando hay max_lote productos pendientes o el más antiguo lleva
+    max_espera segundos. Varias modificaciones del mismo producto se funden en una. Si al
+    volcar otro proceso se adelantó (bloqueo optimista), se llama a al_rechazar con los ids
+    para que el cache se refresque desde la BD. Si la BD falla, lo pendiente se reintenta.
+    """
+
+    def __init__(self, repositorio, max_lote: int = 500, max_espera: float = 0.5,
+                 al_rechazar: Optional[Callable[[List[int]], None]] = None):
+        self.repositorio = repositorio
+        self.max_lote = max_lote
+        self.max_espera = max_espera
+        self.al_rechazar = al_rechazar
+        self._cond = threading.Condition()
+        self._lock_vaciado = threading.Lock()
+        self._iniciar_estado()
+        atexit.register(self.cerrar)
+
+    def _iniciar_estado(self):
+        self._pid = os.getpid()
+        self._pendientes: Dict[int, Pendiente] = {}
+        self._en_vuelo: Set[int] = set()
+        self._cerrada = False
+        self._reintentar_en = 0.0
+        self._vaciados = 0
+        self._escritos = 0
+        self._fundidos = 0
+        self._rechazados = 0
+        self._errores = 0
+        self._pendientes_max = 0
+        self._latencia_total = 0.0
+        self._latencia_ultima = 0.0
+        self._latencia_max = 0.0
+        self._hilo = threading.Thread(target=self._bucle, name="escritura-diferida", daemon=True)
+        self._hilo.start()
+
+    def _verificar_proceso(self):
+        # El hilo no sobrevive a un fork: el hijo empieza con su propia cola vacía
+        if self._pid != os.getpid():
+            self._iniciar_estado()
+
+    def encolar_actualizacion(self, producto, revision: Optional[int], stock_anterior: Optional[int]) -> bool:
+        # Devuelve True si se fundió con una modificación pendiente (en la BD será una sola revisión)
+        return self._encolar(producto.id_producto, Pendiente("U", producto, revision, stock_anterior, time.monotonic()))
+
+    def encolar_baja(self, id_producto: int):
+        return self._encolar(id_producto, Pendiente("D", None, None, None, time.monotonic()))
+
+    def _encolar(self, id_producto: int, nuevo: Pendiente) -> bool:
+        with self._cond:
+            self._verificar_proceso()
+            if self._cerrada:
+                raise RuntimeError("La cola de escrituras está cerrada")
+            previo = self._pendientes.get(id_producto)
+            if previo is not None:
+                nuevo = self._fundir(previo, nuevo)
+                self._fundidos += 1
+            self._pendientes[id_producto] = nuevo
+            self._pendientes_max = max(self._pendientes_max, len(self._pendientes))
+            if len(self._pendientes) >= self.max_lote or previo is None and len(self._pendientes) == 1:
+                self._cond.notify()
+            return previo is not None
+
+    @staticmethod
+    def _fundir(previo: Pendiente, nuevo: Pendiente) -> Pendiente:
+        # La condición de escritura es la del primer cambio (lo que había en la BD) y la
+        # antigüedad la del primero; el estado final es el del último
+        if nuevo.operacion == "D":
+            return Pendiente("D", None, None, None, previo.encolado_en)
+        producto = nuevo.producto
+        if producto.stock is None and previo.operacion == "U" and previo.producto.stock is not None:
+            producto.stock = previo.producto.stock
+        stock_anterior = previo.stock_anterior if previo.stock_anterior is not None else nuevo.stock_anterior
+        return Pendiente("U", producto, previo.revision, stock_anterior, previo.encolado_en)
+
+    def pendiente(self, id_producto: int) -> bool:
+        # Incluye lo que se está escribiendo ahora mismo
+        with self._cond:
+            return id_producto in self._pendientes or id_producto in self._en_vuelo
+
+    def hay_pendientes(self) -> bool:
+        with self._cond:
+            return bool(self._pendientes or self._en_vuelo)
+
+    def vaciar(self) -> int:
+        """Escribe ya todo lo pendiente en una transacción. Devuelve cuántos productos escribió."""
+        with self._lock_vaciado:
+            with self._cond:
+                self._verificar_proceso()
+                lote, self._pendientes = self._pendientes, {}
+                self._en_vuelo = set(lote)
+            if not lote:
+                return 0
+            inicio = time.perf_counter()
+            try:
+                rechazados = self.repositorio.escribir_pendientes(
+                    [(p.producto, p.revision, p.stock_anterior) for p in lote.values() if p.operacion == "U"],
+                    [id_producto for id_producto, p in lote.items() if p.operacion == "D"],
+                )
+            except Exception as e:
+                print(f"Error al volcar escrituras pendientes: {e}")
+                with self._cond:
+                    # Se reintentan en el próximo volcado; lo encolado mientras tanto va después
+                    for id_producto, nuevo in self._pendientes.items():
+                        lote[id_producto] = self._fundir(lote[id_producto], nuevo) if id_producto in lote else nuevo
+                    self._pendientes = lote
+                    self._en_vuelo = set()
+                    self._errores += 1
+                    self._reintentar_en = time.monotonic() + max(self.max_espera, 1.0)
+                return 0
+            latencia = time.perf_counter() - inicio
+            with self._cond:
+                self._en_vuelo = set()
+                self._vaciados += 1
+                self._escritos += len(lote)
+                self._rechazados += len(rechazados)
+                self._latencia_total += latencia
+                self._latencia_ultima = latencia
+                self._latencia_max = max(self._latencia_max, latencia)
+            if rechazados and self.al_rechazar:
+                self.al_rechazar(rechazados)
+            return len(lote)
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while not self._cerrada:
+                    ahora = time.monotonic()
+                    espera = None
+                    if ahora < self._reintentar_en:
+                        espera = self._reintentar_en - ahora
+                    elif len(self._pendientes) >= self.max_lote:
+                        break
+                    elif self._pendientes:
+                        edad = ahora - next(iter(self._pendientes.values())).encolado_en
+                        if edad >= self.max_espera:
+                            break
+                        espera = self.max_espera - edad
+                    self._cond.wait(espera)
+                if self._cerrada:
+                    return
+            self.vaciar()
+
+    def cerrar(self):
+        # Al apagar el proceso: se para el hilo y se vuelca lo que quede
+        with self._cond:
+            if self._pid != os.getpid() or self._cerrada:
+                return
+            self._cerrada = True
+            self._cond.notify()
+        self._hilo.join(timeout=5)
+        self.vaciar()
+        if self._pendientes:
+            print(f"⚠️ {len(self._pendientes)} escrituras de productos no se pudieron volcar al cerrar")
+
+    def estadisticas(self) -> Dict:
+        with self._cond:
+            self._verificar_proceso()
+            antiguo = next(iter(self._pendientes.values()), None)
+            return {
+                "pendientes": len(self._pendientes),
+                "en_vuelo": len(self._en_vuelo),
+                "pendientes_max": self._pendientes_max,
+                "edad_max": round(time.monotonic() - antiguo.encolado_en, 6) if antiguo else 0.0,
+                "vaciados": self._vaciados,
+                "escritos": self._escritos,
+                "fundidos": self._fundidos,
+                "rechazados": self._rechazados,
+                "errores": self._errores,
+                "latencia_ultima": round(self._latencia_ultima, 6),
+                "latencia_media": round(self._latencia_total / self._vaciados, 6) if self._vaciados else 0.0,
+                "latencia_max": round(self._latencia_max, 6),
+            }
@@ -0,0 +1,203 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Dict, Tuple
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # Sin brotli solo se generan las variantes .gz
+    brotli = None
+
+# Recursos que antes venían de un CDN: ruta en static/ -> URL de origen. Solo se descargan al
+# construir (python -m cli.estaticos); en ejecución se sirven desde static/.
+VENDOR = {
+    'vendor/bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-icons/bootstrap-icons.css': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+}
+DIST = 'dist'
+MANIFIESTO = 'manifest.json'
+UN_ANO = 365 * 24 * 3600
+# Orden de preferencia si el navegador acepta varias
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+COMPRIMIBLES = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.ttf', '.otf', '.eot', '.ico', '.html'}
+# Las imágenes subidas ya se llaman por el sha256 de su contenido (imagenes.py): tampoco cambian nunca
+PATRON_SUBIDA = re.compile(r'^images/(variantes/)?[0-9a-f]{64}(_\w+)?\.\w+$')
+PATRON_URL_CSS = re.compile(r'''url\(\s*(['"]?)([^'")]+?)\1\s*\)''')
+
+
+def _es_relativa(ref: str) -> bool:
+    return not re.match(r'^([a-z][a-z0-9+.-]*:|/|#)', ref, re.IGNORECASE)
+
+
+def vendorizar(carpeta, forzar: bool = False) -> Dict[str, int]:
+    """Descarga los recursos de VENDOR (y las fuentes que enlaza su CSS) a carpeta.
+
+    Los que ya están no se vuelven a bajar salvo con forzar. Devuelve ruta -> bytes descargados.
+    """
+    carpeta = Path(carpeta)
+    descargados = {}
+    pendientes = list(VENDOR.items())
+    while pendientes:
+        ruta, url = pendientes.pop(0)
+        destino = carpeta / ruta
+        if destino.exists() and not forzar:
+            contenido = destino.read_bytes()
+        else:
+            with urllib.request.urlopen(url, timeout=30) as respuesta:
+                contenido = respuesta.read()
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            tmp = destino.with_name(destino.name + '.tmp')
+            tmp.write_bytes(contenido)
+            os.replace(tmp, destino)
+            descargados[ruta] = len(contenido)
+        if ruta.endswith('.css'):
+            for _, ref in PATRON_URL_CSS.findall(contenido.decode('utf-8', errors='replace')):
+                if _es_relativa(ref):
+                    relativa = ref.split('?', 1)[0].split('#', 1)[0]
+                    pendientes.append((posixpath.normpath(posixpath.join(posixpath.dirname(ruta), relativa)),
+                                       urllib.parse.urljoin(url, relativa)))
+    return descargados
+
+
+def _reescribir_css(texto: str, ruta: str, manifiesto: Dict[str, str]) -> str:
+    # url(fuente.woff2?v=1) -> url(fuente.<hash>.woff2), relativa a donde queda el CSS con hash
+    def cambiar(m):
+        ref = m.group(2)
+        if not _es_relativa(ref):
+            return m.group(0)
+        relativa, _, fragmento = ref.split('?', 1)[0].partition('#')
+        destino = manifiesto.get(posixpath.normpath(posixpath.join(posixpath.dirname(ruta), relativa)))
+        if destino is None:
+            return m.group(0)
+        nueva = posixpath.relpath(destino, posixpath.dirname(posixpath.join(DIST, ruta)))
+        return f'url("{nueva}{"#" + fragmento if fragmento else ""}")'
+    return PATRON_URL_CSS.sub(cambiar, texto)
+
+
+def construir(carpeta) -> Dict[str, Dict]:
+    """Copia cada archivo de carpeta (static/) a dist/ con el hash de su contenido en el nombre.
+
+    Los CSS se procesan al final para apuntar a las fuentes e imágenes ya renombradas. Para
+    los de texto se dejan al lado las versiones .gz y .br (si salen más pequeñas). Escribe
+    dist/manifest.json (ruta original -> ruta con hash) y devuelve lo generado por archivo.
+    Las imágenes subidas (que ya se llaman por su hash) y dist/ no se tocan; las versiones
+    anteriores se conservan para las páginas que aún las enlacen.
+    """
+    carpeta = Path(carpeta)
+    originales = sorted(
+        p.relative_to(carpeta).as_posix() for p in carpeta.rglob('*')
+        if p.is_file() and not p.name.startswith('.') and not p.name.endswith('.tmp')
+    )
+    originales = [r for r in originales if not r.startswith(DIST + '/') and not PATRON_SUBIDA.match(r)
+                  and not r.startswith('images/variantes/')]
+    manifiesto: Dict[str, str] = {}
+    generados: Dict[str, Dict] = {}
+    for ruta in sorted(originales, key=lambda r: r.endswith('.css')):
+        contenido = (carpeta / ruta).read_bytes()
+        if ruta.endswith('.css'):
+            contenido = _reescribir_css(contenido.decode('utf-8'), ruta, manifiesto).encode('utf-8')
+        base, ext = posixpath.splitext(ruta)
+        con_hash = f'{DIST}/{base}.{hashlib.sha256(contenido).hexdigest()[:12]}{ext}'
+        manifiesto[ruta] = con_hash
+        generados[ruta] = {'ruta': con_hash, 'bytes': len(contenido)}
+        destino = carpeta / con_hash
+        if destino.exists():
+            continue
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        variantes = {'': contenido}
+        if ext.lower() in COMPRIMIBLES:
+            variantes['.gz'] = gzip.compress(contenido, compresslevel=9, mtime=0)
+            if brotli is not None:
+                variantes['.br'] = brotli.compress(contenido, quality=11)
+        for sufijo, datos in variantes.items():
+            if sufijo and len(datos) >= len(contenido) * 0.95:
+                continue
+            tmp = destino.with_name(destino.name + sufijo + '.tmp')
+            tmp.write_bytes(datos)
+            os.replace(tmp, destino.with_name(destino.name + sufijo))
+            if sufijo:
+                generados[ruta][sufijo.lstrip('.')] = len(datos)
+    tmp = carpeta / DIST / (MANIFIESTO + '.tmp')
+    tmp.parent.mkdir(parents=True, exist_ok=True)
+    tmp.write_text(json.dumps(manifiesto, indent=1, sort_keys=True), encoding='utf-8')
+    os.replace(tmp, carpeta / DIST / MANIFIESTO)
+    return generados
+
+
+class Estaticos:
+    """Sirve static/ con lo que deja construir(): nombres con hash, caché larga y .br/.gz.
+
+    url_for('static', filename='styles.css') devuelve la ruta con hash del manifiesto si
+    existe (si no, la original, como antes). Las rutas con hash y las imágenes subidas se
+    sirven con Cache-Control immutable de un año; si hay versión comprimida que el navegador
+    acepte (Accept-Encoding) se envía esa, con Vary: Accept-Encoding. El manifiesto se lee
+    al arrancar: tras construir hay que reiniciar los workers.
+    """
+
+    def __init__(self, app=None):
+        self.manifiesto: Dict[str, str] = {}
+        self._comprimidos: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.carpeta = Path(app.static_folder)
+        self.cargar()
+        app.url_defaults(self._url_defaults)
+        app.view_functions['static'] = self.servir
+        app.add_template_global(self.vendor_url)
+        app.extensions['estaticos'] = self
+
+    def cargar(self):
+        try:
+            self.manifiesto = json.loads((self.carpeta / DIST / MANIFIESTO).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            self.manifiesto = {}
+        except Exception as e:
+            print(f"Error al leer el manifiesto de estáticos: {e}")
+            self.manifiesto = {}
+        self._comprimidos = {
+            con_hash: tuple((nombre, sufijo) for nombre, sufijo in CODIFICACIONES
+                            if (self.carpeta / (con_hash + sufijo)).exists())
+            for con_hash in self.manifiesto.values()
+        }
+
+    def _url_defaults(self, endpoint, valores):
+        if endpoint == 'static' and valores.get('filename') in self.manifiesto:
+            valores['filename'] = self.manifiesto[valores['filename']]
+
+    def vendor_url(self, ruta: str) -> str:
+        # Sin vendorizar todavía (entorno de desarrollo) se sigue usando el CDN
+        if ruta in self.manifiesto or (self.carpeta / ruta).exists():
+            return url_for('static', filename=ruta)
+        return VENDOR[ruta]
+
+    def servir(self, filename):
+        inmutable = filename.startswith(DIST + '/') or PATRON_SUBIDA.match(filename) is not None
+        max_age = UN_ANO if inmutable else None
+        codificaciones = self._comprimidos.get(filename, ())
+        respuesta = None
+        for nombre, sufijo in codificaciones:
+            if request.accept_encodings[nombre]:
+                tipo = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                respuesta = send_from_directory(self.carpeta, filename + sufijo, mimetype=tipo, max_age=max_age)
+                respuesta.headers['Content-Encoding'] = nombre
+                break
+        if respuesta is None:
+            respuesta = send_from_directory(self.carpeta, filename, max_age=max_age)
+        if codificaciones:
+            respuesta.vary.add('Accept-Encoding')
+        if inmutable:
+            respuesta.cache_control.public = True
+            respuesta.cache_control.immutable = True
+        return respuesta
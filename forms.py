@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, DecimalField, IntegerField, SubmitField, PasswordField, FileField
-from wtforms.validators import DataRequired, NumberRange, Length, Email, ValidationError
+from wtforms.validators import DataRequired, InputRequired, NumberRange, Length, Email, ValidationError
 
 class ProductoForm(FlaskForm):
     nombre = StringField(
@@ -15,14 +15,14 @@ class ProductoForm(FlaskForm):
         places=2,
         rounding=None,
         validators=[
-            DataRequired(message="El precio es obligatorio."),
+            InputRequired(message="El precio es obligatorio."),
             NumberRange(min=0, message="El precio debe ser 0.00 o mayor.")
         ]
     )
     stock = IntegerField(
         "Stock",
         validators=[
-            DataRequired(message="El stock es obligatorio."),
+            InputRequired(message="El stock es obligatorio."),
             NumberRange(min=0, message="El stock debe ser 0 o mayor.")
         ]
     )
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class CacheFragmentos:
+    """Cache LRU de fragmentos HTML ya renderizados (la tabla de productos), acotada en bytes.
+
+    Cada entrada se guarda con la marca del catálogo (Inventario.marca()) con la que se
+    renderizó. La marca cambia con cada alta, baja o modificación, así que cuando llega una
+    marca nueva todo lo guardado queda invalidado y se descarta de una vez.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 2 ** 20, max_items: int = 10_000):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self._datos: "OrderedDict[Hashable, Tuple[object, int]]" = OrderedDict()  # clave -> (valor, bytes)
+        self._marca: Optional[str] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expulsados = 0
+        self.invalidaciones = 0
+
+    def _comprobar_marca(self, marca: str):
+        if marca != self._marca:
+            if self._datos:
+                self.invalidaciones += 1
+            self._datos.clear()
+            self._bytes = 0
+            self._marca = marca
+
+    def obtener(self, marca: str, clave: Hashable):
+        with self._lock:
+            self._comprobar_marca(marca)
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return entrada[0]
+
+    def guardar(self, marca: str, clave: Hashable, valor, tamano: int):
+        # tamano: bytes aproximados del valor (la longitud del HTML)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            if marca != self._marca:
+                return  # Se renderizó con un catálogo que ya cambió
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            self._datos[clave] = (valor, tamano)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes or len(self._datos) > self.max_items:
+                _, (_, liberado) = self._datos.popitem(last=False)
+                self._bytes -= liberado
+                self.expulsados += 1
+
+    def invalidar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+            self._marca = None
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "items": len(self._datos),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "expulsados": self.expulsados,
+                "invalidaciones": self.invalidaciones,
+            }
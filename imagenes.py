@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Sin Pillow se guardan solo los originales
+    Image = None
+
+EXTENSIONES = {'png', 'jpg', 'jpeg', 'gif'}
+# nombre -> (ancho, alto, recortar). La miniatura es el doble de los 50x50 de las tablas (pantallas HiDPI)
+VARIANTES = {
+    'miniatura': (100, 100, True),
+    'web': (1200, 1200, False),
+}
+SUBCARPETA_VARIANTES = 'variantes'
+
+
+class AlmacenImagenes:
+    """Guarda las imágenes subidas por contenido (sha256) y genera variantes en segundo plano.
+
+    El nombre del archivo es el hash de su contenido, así que subir dos veces la misma
+    imagen no duplica nada y dos archivos distintos nunca chocan. Las miniaturas y la
+    versión web se generan en un pool de hilos: la petición no las espera y, mientras
+    no existan, las plantillas usan el original.
+    """
+
+    def __init__(self, carpeta: str, hilos: int = 2):
+        self.carpeta = Path(carpeta)
+        self.carpeta_variantes = self.carpeta / SUBCARPETA_VARIANTES
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='imagenes')
+        self._lock = threading.Lock()
+        self._pendientes: Set[str] = set()
+        self._listas: Set[str] = set()
+        # Sube cada vez que una imagen tiene sus variantes listas (el HTML cacheado deja de valer)
+        self.generacion = 0
+
+    @staticmethod
+    def extension(nombre_archivo: str) -> Optional[str]:
+        if '.' not in nombre_archivo:
+            return None
+        ext = nombre_archivo.rsplit('.', 1)[1].lower()
+        return 'jpg' if ext == 'jpeg' else ext if ext in EXTENSIONES else None
+
+    def guardar(self, archivo) -> Optional[str]:
+        """Guarda un FileStorage subido y devuelve el nombre final (<sha256>.<ext>), o None si no es válido."""
+        ext = self.extension(archivo.filename or '')
+        if ext is None:
+            return None
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        sha = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.carpeta, suffix='.subida')
+        try:
+            with os.fdopen(fd, 'wb') as destino:
+                for bloque in iter(lambda: archivo.stream.read(64 * 1024), b''):
+                    sha.update(bloque)
+                    destino.write(bloque)
+            nombre = f'{sha.hexdigest()}.{ext}'
+            final = self.carpeta / nombre
+            if final.exists():
+                os.remove(tmp)  # Ya estaba subida: se reutiliza
+            else:
+                os.replace(tmp, final)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.encolar(nombre)
+        return nombre
+
+    def ruta_variante(self, nombre: str, variante: str) -> Path:
+        return self.carpeta_variantes / f'{nombre.rsplit(".", 1)[0]}_{variante}.webp'
+
+    def encolar(self, nombre: str):
+        if Image is None:
+            return
+        with self._lock:
+            if nombre in self._pendientes or nombre in self._listas:
+                return
+            self._pendientes.add(nombre)
+        self._pool.submit(self._procesar, nombre)
+
+    def _procesar(self, nombre: str):
+        try:
+            self.carpeta_variantes.mkdir(parents=True, exist_ok=True)
+            with Image.open(self.carpeta / nombre) as original:
+                original = ImageOps.exif_transpose(original)
+                if original.mode not in ('RGB', 'RGBA'):
+                    original = original.convert('RGBA')
+                for variante, (ancho, alto, recortar) in VARIANTES.items():
+                    destino = self.ruta_variante(nombre, variante)
+                    if destino.exists():
+                        continue
+                    if recortar:
+                        imagen = ImageOps.fit(original, (ancho, alto), Image.LANCZOS)
+                    else:
+                        imagen = original.copy()
+                        imagen.thumbnail((ancho, alto), Image.LANCZOS)
+                    tmp = destino.with_suffix('.tmp')
+                    imagen.save(tmp, 'WEBP', quality=80, method=4)
+                    os.replace(tmp, destino)
+            with self._lock:
+                self._listas.add(nombre)
+                self.generacion += 1
+        except Exception as e:
+            print(f"Error al procesar imagen {nombre}: {e}")
+        finally:
+            with self._lock:
+                self._pendientes.discard(nombre)
+
+    def variante(self, nombre: str, variante: str) -> str:
+        """Ruta relativa a static/ de la mejor versión disponible de la imagen."""
+        relativa_original = f'{self.carpeta.name}/{nombre}'
+        if variante not in VARIANTES or Image is None:
+            return relativa_original
+        destino = self.ruta_variante(nombre, variante)
+        if nombre in self._listas or destino.exists():
+            return f'{self.carpeta.name}/{SUBCARPETA_VARIANTES}/{destino.name}'
+        # Imagen subida antes de existir las variantes (o aún en proceso): se generan ahora
+        if (self.carpeta / nombre).exists():
+            self.encolar(nombre)
+        return relativa_original
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {'pendientes': len(self._pendientes), 'listas': len(self._listas)}
+
+    def cerrar(self, esperar: bool = True):
+        self._pool.shutdown(wait=esperar)
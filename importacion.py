@@ -0,0 +1,143 @@
+import csv
+import io
+import json
+from contextlib import nullcontext
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask import Flask, has_app_context
+from werkzeug.datastructures import MultiDict
+
+from forms import ProductoForm
+from inventario import Inventario, Producto
+
+CAMPOS = ["id_producto", "nombre", "precio", "stock", "imagen"]
+FORMATOS = ("csv", "jsonl")
+TAMANO_LOTE = 1000
+# Errores por línea que se guardan en el resumen; el resto solo se cuenta
+MAX_ERRORES = 1000
+
+_app_validacion = Flask(__name__)
+
+
+def detectar_formato(nombre_archivo: str) -> str:
+    extension = nombre_archivo.rsplit(".", 1)[-1].lower() if "." in nombre_archivo else ""
+    if extension == "csv":
+        return "csv"
+    if extension in ("jsonl", "ndjson", "json"):
+        return "jsonl"
+    raise ValueError(f"Formato no soportado: {nombre_archivo!r} (use .csv o .jsonl)")
+
+
+def leer_filas(archivo: Iterable[str], formato: str) -> Iterator[Tuple[int, Dict]]:
+    # Genera (número de línea, fila) sin cargar el archivo completo
+    if formato == "csv":
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila
+    elif formato == "jsonl":
+        for linea_num, linea in enumerate(archivo, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                fila = json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield linea_num, {"__error__": f"JSON inválido: {e.msg}"}
+                continue
+            yield linea_num, fila if isinstance(fila, dict) else {"__error__": "Se esperaba un objeto JSON"}
+    else:
+        raise ValueError(f"Formato no soportado: {formato!r}")
+
+
+def validar_fila(fila: Dict) -> Tuple[Optional[Producto], Dict[str, List[str]]]:
+    # Mismas reglas que el formulario web (ProductoForm), sin CSRF
+    if "__error__" in fila:
+        return None, {"fila": [fila["__error__"]]}
+    datos = MultiDict({k: "" if fila.get(k) is None else str(fila.get(k)).strip() for k in ("nombre", "precio", "stock")})
+    errores: Dict[str, List[str]] = {}
+    id_producto = None
+    if str(fila.get("id_producto") or "").strip():
+        try:
+            id_producto = int(str(fila["id_producto"]).strip())
+            if id_producto <= 0:
+                raise ValueError
+        except ValueError:
+            errores["id_producto"] = ["El id debe ser un entero positivo."]
+    with nullcontext() if has_app_context() else _app_validacion.app_context():
+        form = ProductoForm(formdata=datos, meta={"csrf": False})
+        if not form.validate():
+            errores.update({campo: list(msgs) for campo, msgs in form.errors.items() if campo != "imagen"})
+    if errores:
+        return None, errores
+    imagen = str(fila.get("imagen") or "").strip() or None
+    return Producto(id_producto, form.nombre.data.strip(), float(form.precio.data), form.stock.data, imagen), {}
+
+
+def importar(inv: Inventario, archivo: Iterable[str], formato: str, tamano_lote: int = TAMANO_LOTE) -> Dict:
+    """Valida y guarda las filas por lotes (una transacción por lote).
+
+    Devuelve un resumen con los totales y los errores por línea.
+    """
+    return importar_filas(inv, leer_filas(archivo, formato), tamano_lote)
+
+
+def importar_filas(inv: Inventario, filas: Iterable[Tuple[int, Dict]], tamano_lote: int = TAMANO_LOTE) -> Dict:
+    # Como importar, con las filas ya leídas: (número de línea, dict)
+    resumen = {"leidas": 0, "guardadas": 0, "lotes": 0, "con_error": 0, "errores": []}
+    lote: List[Tuple[int, Producto]] = []
+
+    def anotar_error(linea, errores):
+        resumen["con_error"] += 1
+        if len(resumen["errores"]) < MAX_ERRORES:
+            resumen["errores"].append({"linea": linea, "errores": errores})
+
+    def guardar():
+        try:
+            inv.guardar_lote([p for _, p in lote])
+            resumen["guardadas"] += len(lote)
+        except Exception as e:
+            # Cada fila del lote cuenta como error: guardadas + con_error sigue sumando leidas
+            desde, hasta = lote[0][0], lote[-1][0]
+            for linea, _ in lote:
+                anotar_error(linea, {"lote": [f"Lote de las líneas {desde}-{hasta} revertido: {e}"]})
+        resumen["lotes"] += 1
+        lote.clear()
+
+    for linea, fila in filas:
+        resumen["leidas"] += 1
+        producto, errores = validar_fila(fila)
+        if errores:
+            anotar_error(linea, errores)
+            continue
+        lote.append((linea, producto))
+        if len(lote) >= tamano_lote:
+            guardar()
+    if lote:
+        guardar()
+    return resumen
+
+
+def _valor(v):
+    return str(v) if isinstance(v, Decimal) else v
+
+
+def exportar(productos: Iterable[Producto], formato: str) -> Iterator[str]:
+    # Genera el archivo línea a línea para poder enviarlo en streaming
+    if formato == "csv":
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(CAMPOS)
+        for producto in productos:
+            escritor.writerow(producto.to_tuple(include_id=True))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    elif formato == "jsonl":
+        for producto in productos:
+            fila = dict(zip(CAMPOS, map(_valor, producto.to_tuple(include_id=True))))
+            yield json.dumps(fila, ensure_ascii=False) + "\n"
+    else:
+        raise ValueError(f"Formato no soportado: {formato!r}")
@@ -1,14 +1,27 @@
+import asyncio
+import os
+import threading
+import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional
-from conexion.conexion import obtener_conexion
+from datetime import datetime
+from typing import Dict, List, MutableMapping, Optional, Tuple
+from almacenamiento import RepositorioProductos, crear_repositorio
+from catalogo import CATALOGOS, CatalogoColumnar
+from escritura_diferida import ColaEscrituras
+from busqueda import IndiceBusqueda, normalizar
+from paginacion import ClavesOrdenadas, pagina_de, validar_orden
+from resumen import ResumenInventario
 
-@dataclass
+# slots: sin __dict__ por instancia, cada Producto ocupa menos de la mitad
+@dataclass(slots=True)
 class Producto:
     id_producto: Optional[int]
     nombre: str
     precio: float
     stock: int
     imagen: Optional[str]
+    # Se incrementa en cada modificación de nombre, precio o imagen (bloqueo optimista)
+    revision: int = 0
 
     @classmethod
     def from_row(cls, row):
@@ -17,7 +30,8 @@ class Producto:
             nombre=row["nombre"],
             precio=row["precio"],
             stock=row["stock"],
-            imagen=row.get("imagen", "")
+            imagen=row.get("imagen", ""),
+            revision=row.get("revision", 0)
         )
 
     def to_tuple(self, include_id=False):
@@ -29,100 +43,147 @@ class Producto:
         return f"Producto(id_producto={self.id_producto}, nombre='{self.nombre}', precio={self.precio}, stock={self.stock}, imagen='{self.imagen}')"
 
 class Inventario:
-    def __init__(self):
-        self._productos: Dict[int, Producto] = {}
+    def __init__(self, intervalo_sync: float = 2.0, repositorio: Optional[RepositorioProductos] = None,
+                 escritura_diferida: bool = False, max_lote: int = 500, max_espera: float = 0.5,
+                 catalogo: str = "objetos", preparar: bool = True):
+        # El backend (MySQL, SQLite o memoria) se elige con INVENTARIO_BACKEND si no se pasa uno
+        self.repositorio = repositorio if repositorio is not None else crear_repositorio()
+        if catalogo not in CATALOGOS:
+            raise ValueError(f"Catálogo desconocido: {catalogo!r} (use {', '.join(CATALOGOS)})")
+        # "objetos": dict id -> Producto. "columnar": arrays por campo, mucho menos memoria con
+        # catálogos grandes a cambio de crear el Producto en cada acceso
+        self.catalogo = catalogo
+        self._productos: MutableMapping[int, Producto] = self._nuevo_catalogo(())
+        self._indice = IndiceBusqueda()
+        self._orden: Dict[str, ClavesOrdenadas] = {"id": ClavesOrdenadas(), "nombre": ClavesOrdenadas()}
+        # Totales, franjas de stock y productos con poco stock, al día con cada cambio del cache
+        self._resumen = ResumenInventario()
+        # Cache, índices y resumen cambian juntos (quitar lo anterior y agregar lo nuevo)
+        self._lock_cache = threading.RLock()
+        # Cuenta los cambios del cache. Si desde la última sincronización no cambió nada más
+        # (_generacion == _generacion_compartida), el cache es la BD en _version, igual en todos los
+        # workers, y el ETag sale de esa versión; si no, lleva el prefijo de esta instancia
+        self._generacion = 0
+        self._generacion_compartida = -1
+        self._instancia = os.urandom(4).hex()
+        # Última versión de productos_cambios aplicada en este proceso y su fecha (epoch)
+        self._version = 0
+        self._version_en: Optional[float] = None
+        self.intervalo_sync = intervalo_sync
+        self._ultima_sync = time.monotonic()
+        self._lock_sync = threading.Lock()
+        self.espera_huecos = 10.0
+        self._hueco_desde: Optional[float] = None
+        # Versión del registro de cambios del último ajuste de stock aplicado a cada producto
+        self._version_stock: Dict[int, int] = {}
+        self._lock_stock = threading.Lock()
+        self._repo_async = None
         try:
-            self._verificar_estructura_tabla()
+            # La app no prepara el esquema al arrancar: lo hace una vez python -m cli.migrar
+            if preparar:
+                self._verificar_estructura_tabla()
             self._cargar_desde_db()
         except Exception as e:
             print(f"Error al inicializar Inventario: {e}")
             raise
+        # Con escritura diferida, modificaciones y bajas se agrupan en transacciones (ver ColaEscrituras)
+        self._cola: Optional[ColaEscrituras] = None
+        if escritura_diferida:
+            self._cola = ColaEscrituras(self.repositorio, max_lote, max_espera, al_rechazar=self._refrescar_rechazados)
+
+    @property
+    def version(self) -> int:
+        return self._version
 
     def _verificar_estructura_tabla(self):
         try:
-            conn = obtener_conexion()
-            cursor = conn.cursor()
-
-            # Verifica si la tabla existe
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM INFORMATION_SCHEMA.TABLES
-                WHERE TABLE_SCHEMA = 'desarrollo_web'
-                AND TABLE_NAME = 'productos'
-            """)
-            if cursor.fetchone()[0] == 0:
-                # Si no existe, créala
-                cursor.execute("""
-                    CREATE TABLE productos (
-                        id_producto INT AUTO_INCREMENT PRIMARY KEY,
-                        nombre VARCHAR(100) NOT NULL,
-                        precio DECIMAL(10, 2) NOT NULL,
-                        stock INT NOT NULL,
-                        imagen VARCHAR(100)
-                    )
-                """)
-                print("✅ Tabla 'productos' creada")
-
-            # Verifica si la columna 'imagen' existe
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_SCHEMA = 'desarrollo_web'
-                AND TABLE_NAME = 'productos'
-                AND COLUMN_NAME = 'imagen'
-            """)
-            if cursor.fetchone()[0] == 0:
-                # Si no existe, añade la columna
-                cursor.execute("ALTER TABLE productos ADD COLUMN imagen VARCHAR(100)")
-                print("✅ Columna 'imagen' añadida a la tabla 'productos'")
-
-            conn.commit()
-            cursor.close()
-            conn.close()
+            self.repositorio.preparar()
         except Exception as e:
             print(f"Error al verificar/crear tabla: {e}")
             raise
 
+    def _nuevo_catalogo(self, productos) -> MutableMapping[int, Producto]:
+        if self.catalogo == "columnar":
+            return CatalogoColumnar(Producto, productos)
+        return {p.id_producto: p for p in productos}
+
     def _cargar_desde_db(self):
         try:
-            conn = obtener_conexion()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT id_producto, nombre, precio, stock,
-                       IFNULL(imagen, '') as imagen
-                FROM productos
-            """)
-            rows = cursor.fetchall()
-            self._productos = {row["id_producto"]: Producto.from_row(row) for row in rows}
-            cursor.close()
-            conn.close()
+            version, rows = self.repositorio.cargar()
+            # Fecha de esa versión (Last-Modified); sin ella si ya se purgó del registro
+            _, cambios = self.repositorio.cambios_desde(version - 1) if version else (None, [])
+            version_en = next((float(c["creado_en"]) for c in cambios if c["version"] == version), None)
+            productos = self._nuevo_catalogo(Producto.from_row(row) for row in rows)
+            indice = IndiceBusqueda()
+            indice.construir((p.id_producto, p.nombre) for p in productos.values())
+            orden = {
+                campo: ClavesOrdenadas(self._clave(p, campo) for p in productos.values())
+                for campo in ("id", "nombre")
+            }
+            resumen = ResumenInventario()
+            resumen.construir(productos.values())
+            with self._lock_cache:
+                self._productos, self._indice, self._orden, self._resumen = productos, indice, orden, resumen
+                self._version, self._version_en = version, version_en
+                self._tocar()
         except Exception as e:
             print(f"Error al cargar productos: {e}")
             raise
 
+    def _guardar_en_cache(self, producto: Producto):
+        # Se reemplaza en su sitio (sin quitar y volver a poner): en el catálogo columnar es más barato
+        with self._lock_cache:
+            anterior = self._productos.get(producto.id_producto)
+            if anterior is not None:
+                self._quitar_de_indices(anterior)
+            self._productos[producto.id_producto] = producto
+            self._indice.agregar(producto.id_producto, producto.nombre)
+            for campo, claves in self._orden.items():
+                claves.agregar(self._clave(producto, campo))
+            self._resumen.agregar(producto)
+            self._tocar()
+
+    def _tocar(self):
+        self._generacion += 1
+
+    def _quitar_de_indices(self, producto: Producto):
+        self._indice.quitar(producto.id_producto)
+        for campo, claves in self._orden.items():
+            claves.quitar(self._clave(producto, campo))
+        self._resumen.quitar(producto)
+
+    def _quitar_de_cache(self, id_producto: int) -> Optional[Producto]:
+        with self._lock_cache:
+            producto = self._productos.pop(id_producto, None)
+            if producto is not None:
+                self._quitar_de_indices(producto)
+                self._tocar()
+            return producto
+
+    def _refrescar_rechazados(self, ids: List[int]):
+        print(f"Conflicto al volcar productos {ids}: se modificaron en otro proceso")
+        self._aplicar_leidos(self._leer_productos(ids))
+
+    def vaciar_escrituras(self) -> int:
+        # Vuelca ya lo pendiente de la escritura diferida (sin ella no hay nada pendiente)
+        return self._cola.vaciar() if self._cola else 0
+
+    def cerrar(self):
+        if self._cola:
+            self._cola.cerrar()
+
+    def estadisticas_escritura(self) -> Optional[Dict]:
+        return self._cola.estadisticas() if self._cola else None
+
     def agregar_producto(self, producto: Producto) -> bool:
+        # Las altas se escriben al momento: sin id, hace falta el que asigna la BD
+        if producto.id_producto is not None and producto.id_producto in self._productos:
+            return False
+        if producto.id_producto is not None and self._cola and self._cola.pendiente(producto.id_producto):
+            self._cola.vaciar()
         try:
-            conn = obtener_conexion()
-            cursor = conn.cursor()
-            if producto.id_producto is not None:
-                if producto.id_producto in self._productos:
-                    cursor.close()
-                    conn.close()
-                    return False
-                cursor.execute(
-                    "INSERT INTO productos (id_producto, nombre, precio, stock, imagen) VALUES (%s, %s, %s, %s, %s)",
-                    producto.to_tuple(include_id=True)
-                )
-            else:
-                cursor.execute(
-                    "INSERT INTO productos (nombre, precio, stock, imagen) VALUES (%s, %s, %s, %s)",
-                    producto.to_tuple(include_id=False)
-                )
-                producto.id_producto = cursor.lastrowid
-            conn.commit()
-            self._productos[producto.id_producto] = producto
-            cursor.close()
-            conn.close()
+            producto.id_producto = self.repositorio.insertar(producto)
+            self._guardar_en_cache(producto)
             return True
         except Exception as e:
             print(f"Error al agregar producto: {e}")
@@ -132,64 +193,568 @@ class Inventario:
         if id_producto not in self._productos:
             return False
         try:
-            conn = obtener_conexion()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM productos WHERE id_producto = %s", (id_producto,))
-            conn.commit()
-            del self._productos[id_producto]
-            cursor.close()
-            conn.close()
+            if self._cola:
+                self._cola.encolar_baja(id_producto)
+            else:
+                self.repositorio.eliminar(id_producto)
+            self._quitar_de_cache(id_producto)
             return True
         except Exception as e:
             print(f"Error al eliminar producto: {e}")
             return False
 
-    def actualizar_producto(self, id_producto: int, nombre: Optional[str] = None, precio: Optional[float] = None, stock: Optional[int] = None, imagen: Optional[str] = None) -> bool:
-        if id_producto not in self._productos:
+    def actualizar_producto(self, id_producto: int, nombre: Optional[str] = None, precio: Optional[float] = None, stock: Optional[int] = None, imagen: Optional[str] = None,
+                            revision: Optional[int] = None, stock_anterior: Optional[int] = None) -> bool:
+        """Modifica los campos indicados con bloqueo optimista.
+
+        Solo se aplica si el producto no ha cambiado en la BD desde revision (y, si se da stock,
+        si el stock sigue siendo stock_anterior); por defecto se comparan con los del cache,
+        un formulario puede pasar los que mostró. Si otro se adelantó, refresca el cache y
+        devuelve False. Para vender o reponer usa ajustar_stock.
+        """
+        preparada = self._preparar_actualizacion(id_producto, nombre, precio, stock, imagen, revision, stock_anterior)
+        if preparada is None:
             return False
+        producto, nuevo, revision, stock_anterior = preparada
         try:
-            producto = self._productos[id_producto]
-            new_nombre = nombre if nombre is not None else producto.nombre
-            new_precio = precio if precio is not None else producto.precio
-            new_stock = stock if stock is not None else producto.stock
-            new_imagen = imagen if imagen is not None else producto.imagen
-            conn = obtener_conexion()
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE productos
-                SET nombre = %s, precio = %s, stock = %s, imagen = %s
-                WHERE id_producto = %s
-            """, (new_nombre, new_precio, new_stock, new_imagen, id_producto))
-            conn.commit()
-            producto.nombre = new_nombre
-            producto.precio = new_precio
-            producto.stock = new_stock
-            producto.imagen = new_imagen
-            cursor.close()
-            conn.close()
+            if self._cola:
+                return self._encolar_actualizacion(producto, nuevo, revision, stock_anterior)
+            fila = self.repositorio.actualizar(nuevo, revision=revision, stock_anterior=stock_anterior)
+            if fila is None:
+                print(f"Conflicto al actualizar producto {id_producto}: se modificó en otro proceso")
+                self._aplicar_leidos(self._leer_productos([id_producto]))
+                return False
+            self._guardar_en_cache(Producto.from_row(fila))
             return True
         except Exception as e:
             print(f"Error al actualizar producto: {e}")
             return False
 
-    def buscar_por_nombre(self, nombre: str) -> List[Producto]:
+    def _preparar_actualizacion(self, id_producto, nombre, precio, stock, imagen, revision, stock_anterior):
+        # (producto del cache, producto nuevo, revision, stock_anterior) o None si no existe
+        producto = self._productos.get(id_producto)
+        if producto is None:
+            return None
+        nuevo = Producto(
+            id_producto=id_producto,
+            nombre=nombre if nombre is not None else producto.nombre,
+            precio=precio if precio is not None else producto.precio,
+            stock=stock,
+            imagen=imagen if imagen is not None else producto.imagen,
+        )
+        if stock is not None and stock_anterior is None:
+            stock_anterior = producto.stock
+        if revision is None:
+            revision = producto.revision
+        if stock is None:
+            stock_anterior = None
+        return producto, nuevo, revision, stock_anterior
+
+    def _encolar_actualizacion(self, producto: Producto, nuevo: Producto, revision: int, stock_anterior: Optional[int]) -> bool:
+        # El conflicto se detecta contra el cache; el que no se vea aquí se detecta al volcar
+        if revision != producto.revision or stock_anterior is not None and stock_anterior != producto.stock:
+            return False
+        fundida = self._cola.encolar_actualizacion(nuevo, revision, stock_anterior)
+        self._guardar_en_cache(Producto(
+            id_producto=producto.id_producto,
+            nombre=nuevo.nombre,
+            precio=nuevo.precio,
+            stock=nuevo.stock if nuevo.stock is not None else producto.stock,
+            imagen=nuevo.imagen,
+            revision=revision if fundida else revision + 1,
+        ))
+        return True
+
+    def ajustar_stock(self, id_producto: int, delta: int) -> Optional[int]:
+        # Devuelve el stock resultante, o None si el producto no existe o no hay stock suficiente
+        resultado = self.ajustar_stock_lote([(id_producto, delta)])
+        return resultado["stock"].get(id_producto)
+
+    def ajustar_stock_lote(self, ajustes: List[Tuple[int, int]], todo_o_nada: bool = False) -> Dict:
+        """Suma delta al stock de cada (id_producto, delta) en una sola transacción.
+
+        Usa UPDATE relativos (stock = stock + delta) que nunca dejan el stock negativo, así dos
+        ventas concurrentes no se pisan. Las líneas que fallan se informan y el resto se aplica,
+        salvo con todo_o_nada. Devuelve {"aplicadas", "fallidas": [{"linea", "id_producto",
+        "delta", "motivo"}], "stock": {id_producto: stock final leído de la BD}}.
+        """
+        validos, fallidas = self._validar_ajustes(ajustes)
+        if not validos or todo_o_nada and fallidas:
+            return {"aplicadas": 0, "fallidas": fallidas, "stock": {}}
+        if self._cola and any(self._cola.pendiente(id_producto) for _, id_producto, _ in validos):
+            self._cola.vaciar()  # Un stock absoluto encolado debe llegar antes que el ajuste
         try:
-            pattern = f"%{nombre}%"
-            conn = obtener_conexion()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT id_producto, nombre, precio, stock,
-                       IFNULL(imagen, '') as imagen
-                FROM productos
-                WHERE nombre LIKE %s
-            """, (pattern,))
-            rows = cursor.fetchall()
-            cursor.close()
-            conn.close()
-            return [Producto.from_row(row) for row in rows]
-        except Exception as e:
-            print(f"Error al buscar productos: {e}")
+            stock, fallidas_bd, version = self.repositorio.ajustar_stock(
+                [(id_producto, delta) for _, id_producto, delta in validos], todo_o_nada
+            )
+        except Exception as e:
+            print(f"Error al ajustar stock: {e}")
+            raise
+        faltan = self._aplicar_stock(stock, version) if stock else []
+        if faltan:
+            self._aplicar_leidos(self._leer_productos(faltan))
+        return self._resultado_ajustes(validos, fallidas, stock, fallidas_bd)
+
+    @staticmethod
+    def _validar_ajustes(ajustes: List[Tuple[int, int]]):
+        # ([(linea, id_producto, delta)], fallidas por delta inválido)
+        validos, fallidas = [], []
+        for linea, (id_producto, delta) in enumerate(ajustes):
+            if not isinstance(delta, int) or isinstance(delta, bool) or delta == 0:
+                fallidas.append({"linea": linea, "id_producto": id_producto, "delta": delta, "motivo": "delta inválido"})
+            else:
+                validos.append((linea, id_producto, delta))
+        return validos, fallidas
+
+    @staticmethod
+    def _resultado_ajustes(validos, fallidas, stock, fallidas_bd) -> Dict:
+        for indice, motivo in fallidas_bd:
+            linea, id_producto, delta = validos[indice]
+            fallidas.append({"linea": linea, "id_producto": id_producto, "delta": delta, "motivo": motivo})
+        return {
+            "aplicadas": len(validos) - len(fallidas_bd) if stock else 0,
+            "fallidas": sorted(fallidas, key=lambda f: f["linea"]),
+            "stock": stock,
+        }
+
+    def _aplicar_stock(self, stock: Dict[int, int], version: int) -> List[int]:
+        # Dos hilos pueden terminar en distinto orden del que confirmaron: gana la versión mayor.
+        # Devuelve los ids que no están en el cache (hay que leerlos de la BD)
+        faltan = []
+        with self._lock_stock:
+            for id_producto, nuevo in stock.items():
+                if self._version_stock.get(id_producto, 0) > version:
+                    continue
+                self._version_stock[id_producto] = version
+                with self._lock_cache:
+                    producto = self._productos.get(id_producto)
+                    if producto is None:
+                        faltan.append(id_producto)
+                        continue
+                    self._resumen.quitar(producto)
+                    producto.stock = nuevo
+                    self._productos[id_producto] = producto  # El columnar devuelve copias
+                    self._resumen.agregar(producto)
+                    self._tocar()
+        return faltan
+
+    def guardar_lote(self, productos: List[Producto]) -> List[int]:
+        """Inserta o actualiza (por id_producto) un lote de productos en una sola transacción.
+
+        Los que traen id se envían con un único executemany (upsert); los que no, se insertan
+        uno a uno para conocer su id. El cache se refresca una vez al final desde la BD.
+        Devuelve los ids guardados; ante un error revierte todo el lote y lo relanza.
+        """
+        if not productos:
             return []
+        self.vaciar_escrituras()
+        try:
+            ids = self.repositorio.guardar_lote(productos)
+            self._aplicar_leidos(self._leer_productos(ids))
+            return ids
+        except Exception as e:
+            print(f"Error al guardar lote de productos: {e}")
+            raise
+
+    def aplicar_operaciones(self, operaciones: List[Tuple], todo_o_nada: bool = False) -> Dict:
+        """Altas, modificaciones, bajas y ajustes de stock mezclados, en una sola transacción.
+
+        operaciones: ("agregar", producto), ("actualizar", id_producto, {campo: valor}) con los
+        argumentos de actualizar_producto, ("eliminar", id_producto) o ("ajustar", id_producto,
+        delta). Se aplican en orden; las que fallan (no existe, el id ya existe, conflicto de
+        revisión, stock insuficiente) se informan y el resto se aplica, salvo con todo_o_nada.
+        El cache se refresca una vez al final. Devuelve {"aplicadas", "ids": [id o None por
+        operación], "fallidas": [{"linea", "motivo"}]}; un error de la BD revierte el lote y se relanza.
+        """
+        fallidas: List[Dict] = []
+        validas: List[Tuple[int, Tuple]] = []
+        nuevos, tocados = set(), set()
+        modificados: Dict[int, Producto] = {}
+        for linea, (tipo, *datos) in enumerate(operaciones):
+            motivo = None
+            if tipo == "agregar":
+                id_producto = datos[0].id_producto
+                if id_producto is not None and (id_producto in self._productos or id_producto in nuevos):
+                    motivo = "el id ya existe"
+                elif id_producto is not None:
+                    nuevos.add(id_producto)
+                operacion = ("agregar", datos[0])
+            elif tipo == "actualizar":
+                id_producto, campos = datos
+                if id_producto in modificados:
+                    # Se reescribe la fila entera: parte de lo que dejó la modificación anterior del lote
+                    anterior = modificados[id_producto]
+                    campos = {"nombre": anterior.nombre, "precio": anterior.precio, "imagen": anterior.imagen, **campos}
+                preparada = self._preparar_actualizacion(
+                    id_producto, campos.get("nombre"), campos.get("precio"), campos.get("stock"), campos.get("imagen"),
+                    campos.get("revision"), campos.get("stock_anterior"),
+                )
+                if preparada is None:
+                    motivo = "no existe"
+                else:
+                    _, nuevo, revision, stock_anterior = preparada
+                    if id_producto in tocados:
+                        # La revisión y el stock del cache ya no valen: los cambió una línea anterior del lote
+                        revision, stock_anterior = campos.get("revision"), campos.get("stock_anterior")
+                    operacion = ("actualizar", nuevo, revision, stock_anterior)
+                    modificados[id_producto] = nuevo
+            elif tipo == "eliminar":
+                # Los que se dan de alta en el mismo lote existen ya en la transacción
+                if datos[0] not in self._productos and datos[0] not in nuevos:
+                    motivo = "no existe"
+                operacion = ("eliminar", datos[0])
+            elif tipo == "ajustar":
+                _, motivos = self._validar_ajustes([tuple(datos)])
+                motivo = motivos[0]["motivo"] if motivos else None
+                operacion = ("ajustar", *datos)
+            else:
+                motivo = f"operación desconocida: {tipo!r}"
+            if motivo:
+                fallidas.append({"linea": linea, "motivo": motivo})
+            else:
+                validas.append((linea, operacion))
+                tocados.add(datos[0] if tipo != "agregar" else datos[0].id_producto)
+        ids: List[Optional[int]] = [None] * len(operaciones)
+        if not validas or todo_o_nada and fallidas:
+            return {"aplicadas": 0, "ids": ids, "fallidas": fallidas}
+        self.vaciar_escrituras()
+        try:
+            aplicados, fallidas_bd = self.repositorio.aplicar_operaciones([o for _, o in validas], todo_o_nada)
+        except Exception as e:
+            print(f"Error al aplicar lote de operaciones: {e}")
+            raise
+        for (linea, _), id_producto in zip(validas, aplicados):
+            ids[linea] = id_producto
+        fallidas.extend({"linea": validas[i][0], "motivo": motivo} for i, motivo in fallidas_bd)
+        releer = [i for i in dict.fromkeys(aplicados) if i is not None]
+        if releer:
+            self._aplicar_leidos(self._leer_productos(releer))
+        return {"aplicadas": len(aplicados) - aplicados.count(None), "ids": ids,
+                "fallidas": sorted(fallidas, key=lambda f: f["linea"])}
+
+    def iterar_desde_db(self, lote: int = 1000):
+        # Recorre la tabla por id en bloques (keyset) sin cargarla entera en memoria
+        for row in self.repositorio.iterar(lote):
+            yield Producto.from_row(row)
+
+    def sincronizar(self) -> int:
+        """Aplica los cambios hechos por otros procesos desde la última versión vista.
+
+        Devuelve cuántos productos se refrescaron. Si el registro ya se purgó por
+        encima de nuestra versión, recarga el catálogo completo.
+        """
+        with self._lock_sync:
+            self._ultima_sync = time.monotonic()
+            try:
+                generacion = self._generacion
+                minima, cambios = self.repositorio.cambios_desde(self._version)
+                if minima is not None and minima > self._version + 1:
+                    self._recargar()
+                    return len(self._productos)
+                frescos = self._leer_productos(self._ids_cambiados(cambios)) if cambios else {}
+                self._aplicar_sincronizados(cambios, frescos, generacion)
+                return len(frescos)
+            except Exception as e:
+                print(f"Error al sincronizar productos: {e}")
+                raise
+
+    def _ids_cambiados(self, cambios: List[Dict]) -> Dict[int, None]:
+        # Solo importa el estado actual de cada producto tocado; lo que aún está en la cola
+        # de escritura diferida es más nuevo que la BD y no se pisa
+        ids = {row["id_producto"]: None for row in cambios}
+        if self._cola:
+            ids = {i: None for i in ids if not self._cola.pendiente(i)}
+        return ids
+
+    def _leer_productos(self, ids) -> Dict[int, Optional[Producto]]:
+        # Relee de la BD los productos indicados; None indica que ya no existe
+        return {
+            id_producto: Producto.from_row(row) if row is not None else None
+            for id_producto, row in self.repositorio.leer(ids).items()
+        }
+
+    def _aplicar_leidos(self, leidos: Dict[int, Optional[Producto]]):
+        for id_producto, producto in leidos.items():
+            if producto is not None:
+                self._guardar_en_cache(producto)
+            else:
+                self._quitar_de_cache(id_producto)
+
+    def _aplicar_sincronizados(self, cambios: List[Dict], frescos: Dict[int, Optional[Producto]], generacion: int):
+        # Bajo el lock del cache: si nadie lo tocó desde que se leyeron los cambios, no hay huecos
+        # y no queda nada por volcar, el cache es exactamente la BD en la versión alcanzada
+        with self._lock_cache:
+            ajeno = self._generacion != generacion
+            self._aplicar_leidos(frescos)
+            if cambios:
+                self._avanzar_version(cambios)
+            if not ajeno and self._hueco_desde is None and not (self._cola and self._cola.hay_pendientes()):
+                self._generacion_compartida = self._generacion
+
+    def _avanzar_version(self, cambios: List[Dict]):
+        # Las versiones se asignan al insertar pero se ven al confirmar: un hueco puede ser una
+        # transacción aún abierta. No se avanza más allá del hueco (lo posterior se vuelve a
+        # aplicar, es idempotente) salvo que lleve más de espera_huecos segundos (rollback).
+        versiones = [row["version"] for row in cambios]
+        nueva = self._version
+        for version in versiones:
+            if version != nueva + 1:
+                break
+            nueva = version
+        if nueva == versiones[-1]:
+            self._hueco_desde = None
+        elif self._hueco_desde is None:
+            self._hueco_desde = time.monotonic()
+        elif time.monotonic() - self._hueco_desde > self.espera_huecos:
+            nueva = versiones[-1]
+            self._hueco_desde = None
+        if nueva != self._version:
+            self._version_en = next(float(row["creado_en"]) for row in cambios if row["version"] == nueva)
+        self._version = nueva
+
+    def sincronizar_si_toca(self) -> int:
+        # Pensado para llamarse en cada petición: solo consulta la BD cada intervalo_sync segundos
+        if time.monotonic() - self._ultima_sync < self.intervalo_sync:
+            return 0
+        if self._lock_sync.locked():
+            return 0
+        try:
+            return self.sincronizar()
+        except Exception:
+            return 0
+
+    # Modo ASGI (asgi.py): las mismas operaciones como corrutinas. Las lecturas del catálogo
+    # (listar_pagina, buscar_por_nombre, obtener...) salen de memoria y no necesitan versión
+    # asíncrona; lo que va a la BD usa crear_repositorio_asincrono (aiomysql con MySQL). Con
+    # escritura diferida la cola trabaja con hilos, así que se usa la versión síncrona en un hilo.
+
+    def _repositorio_async(self):
+        if self._repo_async is None:
+            from almacenamiento_asincrono import crear_repositorio_asincrono
+            self._repo_async = crear_repositorio_asincrono(self.repositorio)
+        return self._repo_async
+
+    async def _leer_productos_async(self, ids) -> Dict[int, Optional[Producto]]:
+        return {
+            id_producto: Producto.from_row(row) if row is not None else None
+            for id_producto, row in (await self._repositorio_async().leer(ids)).items()
+        }
+
+    async def agregar_producto_async(self, producto: Producto) -> bool:
+        if producto.id_producto is not None and producto.id_producto in self._productos:
+            return False
+        if self._cola:
+            return await asyncio.to_thread(self.agregar_producto, producto)
+        try:
+            producto.id_producto = await self._repositorio_async().insertar(producto)
+            self._guardar_en_cache(producto)
+            return True
+        except Exception as e:
+            print(f"Error al agregar producto: {e}")
+            return False
+
+    async def eliminar_producto_async(self, id_producto: int) -> bool:
+        if id_producto not in self._productos:
+            return False
+        if self._cola:
+            return await asyncio.to_thread(self.eliminar_producto, id_producto)
+        try:
+            await self._repositorio_async().eliminar(id_producto)
+            self._quitar_de_cache(id_producto)
+            return True
+        except Exception as e:
+            print(f"Error al eliminar producto: {e}")
+            return False
+
+    async def actualizar_producto_async(self, id_producto: int, nombre: Optional[str] = None, precio: Optional[float] = None,
+                                        stock: Optional[int] = None, imagen: Optional[str] = None,
+                                        revision: Optional[int] = None, stock_anterior: Optional[int] = None) -> bool:
+        if self._cola:
+            return await asyncio.to_thread(self.actualizar_producto, id_producto, nombre, precio, stock, imagen,
+                                           revision, stock_anterior)
+        preparada = self._preparar_actualizacion(id_producto, nombre, precio, stock, imagen, revision, stock_anterior)
+        if preparada is None:
+            return False
+        _, nuevo, revision, stock_anterior = preparada
+        try:
+            fila = await self._repositorio_async().actualizar(nuevo, revision=revision, stock_anterior=stock_anterior)
+            if fila is None:
+                print(f"Conflicto al actualizar producto {id_producto}: se modificó en otro proceso")
+                self._aplicar_leidos(await self._leer_productos_async([id_producto]))
+                return False
+            self._guardar_en_cache(Producto.from_row(fila))
+            return True
+        except Exception as e:
+            print(f"Error al actualizar producto: {e}")
+            return False
+
+    async def ajustar_stock_lote_async(self, ajustes: List[Tuple[int, int]], todo_o_nada: bool = False) -> Dict:
+        if self._cola:
+            return await asyncio.to_thread(self.ajustar_stock_lote, ajustes, todo_o_nada)
+        validos, fallidas = self._validar_ajustes(ajustes)
+        if not validos or todo_o_nada and fallidas:
+            return {"aplicadas": 0, "fallidas": fallidas, "stock": {}}
+        try:
+            stock, fallidas_bd, version = await self._repositorio_async().ajustar_stock(
+                [(id_producto, delta) for _, id_producto, delta in validos], todo_o_nada
+            )
+        except Exception as e:
+            print(f"Error al ajustar stock: {e}")
+            raise
+        faltan = self._aplicar_stock(stock, version) if stock else []
+        if faltan:
+            self._aplicar_leidos(await self._leer_productos_async(faltan))
+        return self._resultado_ajustes(validos, fallidas, stock, fallidas_bd)
+
+    async def sincronizar_async(self) -> int:
+        """Como sincronizar; si ya hay una sincronización en curso (en un hilo o en otra tarea) no hace nada.
+
+        El lock de hilos se toma sin esperar, así que nunca bloquea el bucle de eventos.
+        """
+        if not self._lock_sync.acquire(blocking=False):
+            return 0
+        try:
+            self._ultima_sync = time.monotonic()
+            generacion = self._generacion
+            minima, cambios = await self._repositorio_async().cambios_desde(self._version)
+            if minima is not None and minima > self._version + 1:
+                await asyncio.to_thread(self._recargar)
+                return len(self._productos)
+            frescos = await self._leer_productos_async(self._ids_cambiados(cambios)) if cambios else {}
+            self._aplicar_sincronizados(cambios, frescos, generacion)
+            return len(frescos)
+        except Exception as e:
+            print(f"Error al sincronizar productos: {e}")
+            raise
+        finally:
+            self._lock_sync.release()
+
+    def _recargar(self):
+        self.vaciar_escrituras()
+        self._cargar_desde_db()
+
+    async def sincronizar_si_toca_async(self) -> int:
+        if time.monotonic() - self._ultima_sync < self.intervalo_sync:
+            return 0
+        try:
+            return await self.sincronizar_async()
+        except Exception:
+            return 0
+
+    def purgar_cambios(self, conservar_horas: int = 24) -> int:
+        # Los workers que lleven más tiempo sin sincronizar harán una recarga completa
+        try:
+            return self.repositorio.purgar_cambios(conservar_horas)
+        except Exception as e:
+            print(f"Error al purgar cambios: {e}")
+            return 0
+
+    def stock_en(self, id_producto: int, fecha: datetime) -> int:
+        # Lo pendiente de la escritura diferida también cuenta como ya ocurrido
+        self.vaciar_escrituras()
+        try:
+            return self.repositorio.stock_en(id_producto, fecha)
+        except Exception as e:
+            print(f"Error al consultar el stock histórico: {e}")
+            raise
+
+    def movimientos_stock(self, id_producto: int, desde: datetime, hasta: datetime,
+                          limite: Optional[int] = None) -> Tuple[int, List[Dict]]:
+        self.vaciar_escrituras()
+        try:
+            return self.repositorio.movimientos_stock(id_producto, desde, hasta, limite)
+        except Exception as e:
+            print(f"Error al leer los movimientos de stock: {e}")
+            raise
+
+    def tomar_instantaneas(self, hasta: Optional[datetime] = None, retraso: float = 60) -> int:
+        try:
+            return self.repositorio.tomar_instantaneas(hasta, retraso)
+        except Exception as e:
+            print(f"Error al tomar instantáneas de stock: {e}")
+            return 0
+
+    def buscar_por_nombre(self, nombre: str) -> List[Producto]:
+        # Se resuelve con el índice en memoria: un LIKE '%q%' no puede usar índices en MySQL.
+        # Índice y catálogo se leen bajo el mismo lock: una baja entre medias daría KeyError
+        with self._lock_cache:
+            return [self._productos[i] for i in self._indice.buscar(nombre)]
+
+    def buscar_por_prefijo(self, nombre: str) -> List[Producto]:
+        with self._lock_cache:
+            return [self._productos[i] for i in self._indice.buscar_prefijo(nombre)]
+
+    @staticmethod
+    def _clave(producto: Producto, campo: str) -> Tuple:
+        if campo == "id":
+            return (producto.id_producto,)
+        return (normalizar(producto.nombre), producto.id_producto)
+
+    def listar_pagina(self, cursor: Optional[str] = None, limit: int = 50, orden: str = "id", q: Optional[str] = None) -> Tuple[List[Producto], Optional[str]]:
+        """Devuelve (productos, cursor_siguiente). cursor_siguiente es None en la última página.
+
+        Lanza ValueError si el orden o el cursor no son válidos.
+        """
+        campo, descendente = validar_orden(orden)
+        with self._lock_cache:
+            if q:
+                encontrados = (self._productos[i] for i in self._indice.buscar(q))
+                claves = sorted(self._clave(p, campo) for p in encontrados)
+                pagina, siguiente = pagina_de(claves, cursor, limit, descendente)
+            else:
+                pagina, siguiente = self._orden[campo].pagina(cursor, limit, descendente)
+            return [self._productos[clave[-1]] for clave in pagina], siguiente
+
+    def resumen(self, limite_bajo_stock: int = 20) -> Dict:
+        """Totales del inventario sin recorrer el catálogo.
+
+        {"productos", "unidades", "valor", "bandas": {"suficiente", "bajo", "agotado"},
+        "bajo_stock": cuántos tienen stock <= 5, "productos_bajo_stock": los primeros
+        limite_bajo_stock de ellos, de menor a mayor stock}
+        """
+        with self._lock_cache:
+            totales = self._resumen.totales()
+            bajos = [self._productos[i] for _, i in self._resumen.bajo_stock(limite_bajo_stock)]
+        totales["productos_bajo_stock"] = bajos
+        return totales
+
+    def recorrer(self, cursor: Optional[str] = None, orden: str = "id", q: Optional[str] = None, bloque: int = 1000):
+        """Genera todos los productos desde cursor en el orden dado, por bloques de claves.
+
+        Como listar_pagina pero sin límite (para respuestas en streaming); la búsqueda se
+        resuelve una sola vez. Lanza ValueError si el orden o el cursor no son válidos.
+        """
+        campo, descendente = validar_orden(orden)
+        claves = None
+        if q:
+            with self._lock_cache:
+                claves = sorted(self._clave(p, campo) for p in (self._productos[i] for i in self._indice.buscar(q)))
+        while True:
+            if claves is None:
+                with self._lock_cache:
+                    pagina, cursor = self._orden[campo].pagina(cursor, bloque, descendente)
+            else:
+                pagina, cursor = pagina_de(claves, cursor, bloque, descendente)
+            for clave in pagina:
+                producto = self._productos.get(clave[-1])
+                if producto is not None:
+                    yield producto
+            if cursor is None:
+                return
+
+    def marca(self) -> Tuple[str, float]:
+        """(etiqueta, instante) del estado actual del cache: cambian con cada alta, baja o cambio.
+
+        La etiqueta sirve de ETag y el instante (epoch) de Last-Modified. Se toma antes de leer
+        los datos: un cambio posterior da otra etiqueta y el cliente no se queda con lo viejo.
+        Con el cache al día de una versión de productos_cambios, ambos salen de ella y son los
+        mismos en todos los workers; con cambios propios aún sin sincronizar la etiqueta es de
+        esta instancia y no hay instante (None).
+        """
+        with self._lock_cache:
+            if self._generacion == self._generacion_compartida:
+                return f"v{self._version}", self._version_en
+            return f"{self._instancia}-{self._version}-{self._generacion}", None
 
     def mostrar_todos(self) -> List[Producto]:
         return list(self._productos.values())
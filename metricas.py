@@ -0,0 +1,382 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("metricas")
+
+# Umbrales de los registros de lentitud (milisegundos)
+CONSULTA_LENTA_MS = float(os.environ.get("METRICAS_CONSULTA_LENTA_MS", "100"))
+PETICION_LENTA_MS = float(os.environ.get("METRICAS_PETICION_LENTA_MS", "1000"))
+# Con varios workers de gunicorn, carpeta donde cada uno deja sus métricas para sumarlas en /metrics
+METRICAS_DIR = os.environ.get("METRICAS_DIR")
+
+BUCKETS_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Sentencias distintas con etiqueta propia; el resto se agrupa en "otras"
+MAX_SENTENCIAS = 200
+
+AYUDA = {
+    "db_consultas_total": ("counter", "Consultas ejecutadas por sentencia normalizada"),
+    "db_consulta_segundos": ("histogram", "Duración de cada consulta por sentencia normalizada"),
+    "db_conexion_espera_segundos": ("histogram", "Tiempo para obtener una conexión del pool"),
+    "http_peticiones_total": ("counter", "Peticiones atendidas por ruta, método y estado"),
+    "http_peticion_segundos": ("histogram", "Duración de las peticiones por ruta (sin el envío en streaming)"),
+    "http_consultas_por_peticion": ("histogram", "Consultas a la BD por petición y ruta"),
+    "plantilla_render_segundos": ("histogram", "Tiempo de renderizado por plantilla"),
+    "login_intentos_total": ("counter", "Intentos de login por resultado (ok, fallo, limitado, saturado)"),
+}
+
+_RE_CADENA = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalizar_sql(sql: str) -> str:
+    # Sin literales ni espacios de más: "... WHERE id IN (%s, %s, %s)" -> "... WHERE id IN (...)"
+    sql = _RE_CADENA.sub("?", sql)
+    sql = _RE_NUMERO.sub("?", sql).replace("%s", "?")
+    sql = _RE_LISTA.sub("(...)", sql)
+    return _RE_ESPACIOS.sub(" ", sql).strip()[:300]
+
+
+class MedidasPeticion:
+    def __init__(self):
+        self.consultas = 0
+        self.segundos_bd = 0.0
+        self.segundos_conexion = 0.0
+        self.segundos_plantillas = 0.0
+        self.mas_lenta: Optional[Tuple[float, str]] = None
+        self.inicio: Optional[float] = None
+        self.plantillas: List[float] = []
+
+
+class ContadorConsultas:
+    """Lo que lleva la petición actual: consultas y tiempos (MedidasPeticion).
+
+    Se guarda en una ContextVar: cada hilo de un worker síncrono y cada tarea del modo
+    ASGI tiene sus medidas, y asyncio.to_thread las comparte con el hilo que lanza.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "_actual", ContextVar("medidas_peticion"))
+
+    def _medidas(self) -> MedidasPeticion:
+        try:
+            return self._actual.get()
+        except LookupError:
+            medidas = MedidasPeticion()
+            self._actual.set(medidas)
+            return medidas
+
+    def __getattr__(self, nombre):
+        return getattr(self._medidas(), nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._medidas(), nombre, valor)
+
+    def reiniciar(self):
+        previas = self._medidas().consultas
+        self._actual.set(MedidasPeticion())
+        return previas
+
+
+contador_consultas = ContadorConsultas()
+
+
+class Registro:
+    """Contadores e histogramas del proceso, en formato de texto de Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[Tuple, float] = {}  # (nombre, etiquetas) -> valor
+        self._histogramas: Dict[Tuple, List] = {}  # (nombre, etiquetas) -> [buckets, cuentas, suma, n]
+        self._sentencias = set()
+
+    def sumar(self, nombre: str, etiquetas: Tuple = (), valor: float = 1):
+        clave = (nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre: str, etiquetas: Tuple, valor: float, buckets=BUCKETS_SEGUNDOS):
+        clave = (nombre, etiquetas)
+        with self._lock:
+            h = self._histogramas.get(clave)
+            if h is None:
+                h = self._histogramas[clave] = [buckets, [0] * len(buckets), 0.0, 0]
+            for i, limite in enumerate(buckets):
+                if valor <= limite:
+                    h[1][i] += 1
+                    break
+            h[2] += valor
+            h[3] += 1
+
+    def etiqueta_sentencia(self, sql: str) -> str:
+        with self._lock:
+            if sql in self._sentencias:
+                return sql
+            if len(self._sentencias) < MAX_SENTENCIAS:
+                self._sentencias.add(sql)
+                return sql
+        return "otras"
+
+    def instantanea(self) -> Dict:
+        with self._lock:
+            return {
+                "contadores": [[n, [list(e) for e in et], v] for (n, et), v in self._contadores.items()],
+                "histogramas": [[n, [list(e) for e in et], list(h[0]), list(h[1]), h[2], h[3]]
+                                for (n, et), h in self._histogramas.items()],
+            }
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+            self._sentencias.clear()
+
+
+registro = Registro()
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(pares, extra: str = "") -> str:
+    partes = [f'{k}="{_escapar(v)}"' for k, v in pares]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _formato(numero: float) -> str:
+    return repr(float(numero)) if isinstance(numero, float) else str(numero)
+
+
+def _sumar_instantaneas(instantaneas: List[Dict]) -> Tuple[Dict, Dict]:
+    contadores, histogramas = {}, {}
+    for inst in instantaneas:
+        for nombre, etiquetas, valor in inst["contadores"]:
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            contadores[clave] = contadores.get(clave, 0) + valor
+        for nombre, etiquetas, buckets, cuentas, suma, n in inst["histogramas"]:
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            h = histogramas.setdefault(clave, [buckets, [0] * len(buckets), 0.0, 0])
+            h[1] = [a + b for a, b in zip(h[1], cuentas)]
+            h[2] += suma
+            h[3] += n
+    return contadores, histogramas
+
+
+def _ruta_instantanea(pid: int) -> str:
+    return os.path.join(METRICAS_DIR, f"metricas-{pid}.json")
+
+
+def guardar_instantanea():
+    # Escritura atómica: /metrics de otro worker nunca lee un archivo a medias
+    if not METRICAS_DIR:
+        return
+    os.makedirs(METRICAS_DIR, exist_ok=True)
+    ruta = _ruta_instantanea(os.getpid())
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(registro.instantanea(), f)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def _instantaneas() -> List[Dict]:
+    if not METRICAS_DIR:
+        return [registro.instantanea()]
+    guardar_instantanea()
+    resultado = []
+    for ruta in glob.glob(os.path.join(METRICAS_DIR, "metricas-*.json")):
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                resultado.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return resultado
+
+
+def exponer(indicadores: Optional[Dict[str, Tuple[str, Dict]]] = None) -> str:
+    """Texto para /metrics: contadores e histogramas (de todos los workers con METRICAS_DIR).
+
+    indicadores: {nombre: (ayuda, {etiqueta: valor})} con valores del momento (gauges) de
+    este proceso, como el estado del pool o de las caches; llevan la etiqueta pid.
+    """
+    contadores, histogramas = _sumar_instantaneas(_instantaneas())
+    lineas = []
+    nombres = sorted({n for n, _ in contadores} | {n for n, _ in histogramas})
+    for nombre in nombres:
+        tipo, ayuda = AYUDA.get(nombre, ("untyped", nombre))
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for (n, etiquetas), valor in sorted(contadores.items()):
+            if n == nombre:
+                lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_formato(valor)}")
+        for (n, etiquetas), (buckets, cuentas, suma, total) in sorted(histogramas.items()):
+            if n != nombre:
+                continue
+            acumulado = 0
+            for limite, cuenta in zip(buckets, cuentas):
+                acumulado += cuenta
+                le = 'le="%s"' % _formato(limite)
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas, le)} {acumulado}")
+            le = 'le="+Inf"'
+            lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas, le)} {total}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_formato(suma)}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {total}")
+    pid = ("pid", os.getpid())
+    for nombre, (ayuda, valores) in sorted((indicadores or {}).items()):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} gauge")
+        for etiqueta, valor in valores.items():
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                lineas.append(f"{nombre}{_etiquetas([pid, ('dato', etiqueta)])} {_formato(valor)}")
+    return "\n".join(lineas) + "\n"
+
+
+def medir_consulta(sql: str, duracion: float, lote: bool = False):
+    # La llaman los cursores (CursorMedido) después de cada execute/executemany
+    normalizada = normalizar_sql(sql)
+    etiqueta = (("sql", registro.etiqueta_sentencia(normalizada)),)
+    registro.sumar("db_consultas_total", etiqueta)
+    registro.observar("db_consulta_segundos", etiqueta, duracion)
+    contador_consultas.consultas += 1
+    contador_consultas.segundos_bd += duracion
+    if contador_consultas.mas_lenta is None or duracion > contador_consultas.mas_lenta[0]:
+        contador_consultas.mas_lenta = (duracion, normalizada)
+    if duracion * 1000 >= CONSULTA_LENTA_MS:
+        log.warning("Consulta lenta (%.1f ms%s): %s", duracion * 1000, ", executemany" if lote else "", normalizada)
+
+
+def medir_conexion(duracion: float):
+    registro.observar("db_conexion_espera_segundos", (), duracion)
+    contador_consultas.segundos_conexion += duracion
+
+
+class CursorMedido:
+    """Envuelve un cursor de la BD: cuenta y cronometra cada consulta."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, *args, **kwargs)
+        finally:
+            medir_consulta(sql, time.perf_counter() - inicio)
+
+    def executemany(self, sql, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, *args, **kwargs)
+        finally:
+            medir_consulta(sql, time.perf_counter() - inicio, lote=True)
+
+
+class CursorMedidoAsincrono(CursorMedido):
+    """Lo mismo para los cursores de aiomysql (modo ASGI), cuyos execute son corrutinas."""
+
+    async def execute(self, sql, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return await self._cursor.execute(sql, *args, **kwargs)
+        finally:
+            medir_consulta(sql, time.perf_counter() - inicio)
+
+    async def executemany(self, sql, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return await self._cursor.executemany(sql, *args, **kwargs)
+        finally:
+            medir_consulta(sql, time.perf_counter() - inicio, lote=True)
+
+
+# Clave del environ WSGI: la petición ya la mide el servidor ASGI (asgi.py), la app Flask no la cuenta otra vez
+MEDIDA_EXTERNA = "metricas.externa"
+_ultimo_guardado = [0.0]
+
+
+def empezar_peticion():
+    contador_consultas.reiniciar()
+    contador_consultas.inicio = time.perf_counter()
+
+
+def terminar_peticion(ruta: str, metodo: str, estado: int, url: str):
+    if contador_consultas.inicio is None:
+        return
+    duracion = time.perf_counter() - contador_consultas.inicio
+    registro.sumar("http_peticiones_total", (("ruta", ruta), ("metodo", metodo), ("estado", estado)))
+    registro.observar("http_peticion_segundos", (("ruta", ruta),), duracion)
+    registro.observar("http_consultas_por_peticion", (("ruta", ruta),), contador_consultas.consultas, BUCKETS_CONSULTAS)
+    if duracion * 1000 >= PETICION_LENTA_MS:
+        lenta = contador_consultas.mas_lenta
+        log.warning(
+            "Petición lenta (%.1f ms): %s %s -> %s | consultas=%d bd=%.1f ms conexión=%.1f ms plantillas=%.1f ms%s",
+            duracion * 1000, metodo, url, estado,
+            contador_consultas.consultas, contador_consultas.segundos_bd * 1000,
+            contador_consultas.segundos_conexion * 1000, contador_consultas.segundos_plantillas * 1000,
+            f" | más lenta {lenta[0] * 1000:.1f} ms: {lenta[1]}" if lenta else "",
+        )
+    # Con varios workers, cada uno publica lo suyo como mucho cada 2 s
+    if METRICAS_DIR and time.monotonic() - _ultimo_guardado[0] > 2:
+        _ultimo_guardado[0] = time.monotonic()
+        try:
+            guardar_instantanea()
+        except OSError as e:
+            log.error("No se pudieron guardar las métricas en %s: %s", METRICAS_DIR, e)
+
+
+def instrumentar(app, indicadores: Optional[Callable[[], Dict]] = None):
+    """Mide cada petición de la app: duración, consultas, conexión y plantillas.
+
+    Registra la ruta /metrics (formato Prometheus; indicadores() añade los valores del
+    momento) y avisa en el log "metricas" de las peticiones más lentas que PETICION_LENTA_MS.
+    """
+    from flask import Response, before_render_template, request, template_rendered
+
+    @app.before_request
+    def empezar_medicion():
+        if not request.environ.get(MEDIDA_EXTERNA):
+            empezar_peticion()
+
+    @app.after_request
+    def terminar_medicion(response):
+        if not request.environ.get(MEDIDA_EXTERNA):
+            terminar_peticion(request.endpoint or "sin_ruta", request.method, response.status_code,
+                              request.full_path.rstrip("?"))
+        return response
+
+    def antes_de_plantilla(sender, template, context, **extra):
+        contador_consultas.plantillas.append(time.perf_counter())
+
+    def plantilla_renderizada(sender, template, context, **extra):
+        if not contador_consultas.plantillas:
+            return
+        duracion = time.perf_counter() - contador_consultas.plantillas.pop()
+        registro.observar("plantilla_render_segundos", (("plantilla", template.name or "cadena"),), duracion)
+        if not contador_consultas.plantillas:
+            contador_consultas.segundos_plantillas += duracion  # Las anidadas ya cuentan en la exterior
+
+    before_render_template.connect(antes_de_plantilla, app, weak=False)
+    template_rendered.connect(plantilla_renderizada, app, weak=False)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(exponer(indicadores() if indicadores else None),
+                        mimetype="text/plain; version=0.0.4; charset=utf-8")
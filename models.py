@@ -1,4 +1,8 @@
-from conexion.conexion import obtener_conexion
+import os
+import threading
+import time
+from collections import OrderedDict
+from conexion.conexion import obtener_conexion, pool_async
 from flask_login import UserMixin
 
 class Usuario(UserMixin):
@@ -8,6 +12,64 @@ class Usuario(UserMixin):
         self.email = email
         self.password = password
 
+class CacheUsuarios:
+    """Cache LRU con TTL de objetos Usuario por id, segura entre hilos del mismo worker."""
+
+    def __init__(self, max_items=1000, ttl=300):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._datos = OrderedDict()  # id -> (usuario, expira)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, id_usuario):
+        clave = str(id_usuario)
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                usuario, expira = entrada
+                if expira > time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self.hits += 1
+                    return usuario
+                del self._datos[clave]
+            self.misses += 1
+        return None
+
+    def guardar(self, usuario):
+        clave = str(usuario.id)
+        with self._lock:
+            self._datos[clave] = (usuario, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, id_usuario=None):
+        with self._lock:
+            if id_usuario is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(str(id_usuario), None)
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "items": len(self._datos),
+                "max_items": self.max_items,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+cache_usuarios = CacheUsuarios(
+    max_items=int(os.environ.get("USER_CACHE_SIZE", "1000")),
+    ttl=float(os.environ.get("USER_CACHE_TTL", "300")),
+)
+
 def cargar_usuario_por_id(id_usuario):
     try:
         conn = obtener_conexion()
@@ -35,3 +97,62 @@ def cargar_usuario_por_email(email):
     except Exception as e:
         print(f"Error al cargar usuario por email: {e}")
     return None
+
+def cargar_usuario_cacheado(id_usuario):
+    # Usado por Flask-Login en cada petición autenticada: evita ir a la tabla usuarios
+    usuario = cache_usuarios.obtener(id_usuario)
+    if usuario is None:
+        usuario = cargar_usuario_por_id(id_usuario)
+        if usuario is not None:
+            cache_usuarios.guardar(usuario)
+    return usuario
+
+# Modo ASGI (asgi.py): las mismas búsquedas con el pool de aiomysql, sin bloquear el bucle de eventos
+async def cargar_usuario_por_id_async(id_usuario):
+    try:
+        async with pool_async.transaccion() as cursor:
+            await cursor.execute("SELECT id_usuario, nombre, email, password FROM usuarios WHERE id_usuario = %s", (id_usuario,))
+            row = await cursor.fetchone()
+        if row:
+            return Usuario(row['id_usuario'], row['nombre'], row['email'], row['password'])
+    except Exception as e:
+        print(f"Error al cargar usuario por ID: {e}")
+    return None
+
+async def cargar_usuario_por_email_async(email):
+    try:
+        async with pool_async.transaccion() as cursor:
+            await cursor.execute("SELECT id_usuario, nombre, email, password FROM usuarios WHERE email = %s", (email,))
+            row = await cursor.fetchone()
+        if row:
+            return Usuario(row['id_usuario'], row['nombre'], row['email'], row['password'])
+    except Exception as e:
+        print(f"Error al cargar usuario por email: {e}")
+    return None
+
+async def cargar_usuario_cacheado_async(id_usuario):
+    usuario = cache_usuarios.obtener(id_usuario)
+    if usuario is None:
+        usuario = await cargar_usuario_por_id_async(id_usuario)
+        if usuario is not None:
+            cache_usuarios.guardar(usuario)
+    return usuario
+
+def invalidar_usuario(id_usuario=None):
+    cache_usuarios.invalidar(id_usuario)
+
+def actualizar_password(id_usuario, password_hash):
+    try:
+        conn = obtener_conexion()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE usuarios SET password = %s WHERE id_usuario = %s", (password_hash, id_usuario))
+        conn.commit()
+        actualizado = cursor.rowcount > 0
+        cursor.close()
+        conn.close()
+        return actualizado
+    except Exception as e:
+        print(f"Error al actualizar contraseña: {e}")
+        return False
+    finally:
+        invalidar_usuario(id_usuario)
@@ -0,0 +1,141 @@
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from importacion import CAMPOS, TAMANO_LOTE, _valor, validar_fila
+from inventario import Inventario
+
+# Una operación por línea (JSON Lines), en el campo "op":
+#   {"op": "agregar", "nombre": "Café", "precio": 4.5, "stock": 10}        (id_producto e imagen opcionales)
+#   {"op": "actualizar", "id_producto": 7, "precio": 5, "revision": 3}    (solo los campos enviados)
+#   {"op": "eliminar", "id_producto": 7}
+#   {"op": "ajustar", "id_producto": 7, "delta": -2}
+#   {"op": "buscar", "q": "café", "limite": 20}
+OPERACIONES = ("agregar", "actualizar", "eliminar", "ajustar", "buscar")
+
+
+def _entero(valor) -> Optional[int]:
+    if isinstance(valor, bool):
+        return None
+    try:
+        return int(str(valor).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def producto_fila(producto) -> Dict:
+    return dict(zip(CAMPOS + ["revision"], map(_valor, (*producto.to_tuple(include_id=True), producto.revision))))
+
+
+def leer_operacion(inv: Inventario, fila: Dict) -> Tuple[Optional[Tuple], Optional[Dict]]:
+    """Valida una línea y la convierte en la operación de Inventario.aplicar_operaciones.
+
+    Devuelve (operación, None) o (None, errores por campo como en la importación).
+    """
+    if "__error__" in fila:
+        return None, {"fila": [fila["__error__"]]}
+    op = fila.get("op")
+    if op not in OPERACIONES or op == "buscar":
+        return None, {"op": [f"Operación no válida: {op!r} (use {', '.join(OPERACIONES)})"]}
+    if op == "agregar":
+        producto, errores = validar_fila(fila)
+        return ("agregar", producto) if producto else None, errores or None
+
+    id_producto = _entero(fila.get("id_producto"))
+    if id_producto is None or id_producto <= 0:
+        return None, {"id_producto": ["El id debe ser un entero positivo."]}
+    if op == "eliminar":
+        return ("eliminar", id_producto), None
+    if op == "ajustar":
+        delta = fila.get("delta")
+        if not isinstance(delta, int) or isinstance(delta, bool) or delta == 0:
+            return None, {"delta": ["El delta debe ser un entero distinto de 0."]}
+        return ("ajustar", id_producto, delta), None
+
+    # actualizar: se validan los campos enviados junto con el resto del producto, como en la API
+    campos = {k: fila[k] for k in ("nombre", "precio", "stock", "imagen") if k in fila}
+    actual = inv.obtener(id_producto)
+    if actual is None:
+        return None, {"id_producto": ["No existe el producto."]}
+    _, errores = validar_fila({**producto_fila(actual), **campos})
+    if errores:
+        return None, errores
+    for clave in ("revision", "stock_anterior"):
+        if clave in fila:
+            valor = fila[clave]
+            if not isinstance(valor, int) or isinstance(valor, bool):
+                return None, {clave: [f"{clave} debe ser un entero."]}
+            campos[clave] = valor
+    if "precio" in campos:
+        campos["precio"] = float(campos["precio"])
+    if "stock" in campos:
+        campos["stock"] = int(campos["stock"])
+    if "imagen" in campos:
+        campos["imagen"] = str(campos["imagen"] or "").strip()
+    return ("actualizar", id_producto, campos), None
+
+
+def buscar(inv: Inventario, fila: Dict) -> Dict:
+    q = str(fila.get("q") or "").strip()
+    limite = _entero(fila.get("limite", 20)) or 20
+    productos = inv.buscar_por_nombre(q)[:max(1, limite)] if q else []
+    return {"productos": [producto_fila(p) for p in productos]}
+
+
+def aplicar(inv: Inventario, filas: Iterable[Tuple[int, Dict]], tamano_lote: int = TAMANO_LOTE,
+            todo_o_nada: bool = False) -> Iterator[Dict]:
+    """Aplica las operaciones en lotes de tamano_lote, una transacción por lote.
+
+    Genera un resultado por línea y en el mismo orden: {"linea", "op", "ok"} más
+    "id_producto" (o "productos" en las búsquedas) si se aplicó, o "errores" si no. Una
+    búsqueda cierra el lote en curso, así ve todo lo anterior; las modificaciones se validan
+    contra el catálogo de antes de su lote. Con todo_o_nada, una línea inválida o fallida
+    deja sin aplicar el resto de su lote. Si la BD falla, el lote se revierte y todas sus
+    líneas llevan el error.
+    """
+    lote: List[Tuple[int, str, Optional[Tuple], Optional[Dict]]] = []
+
+    def vaciar():
+        operaciones = [(linea, operacion) for linea, _, operacion, _ in lote if operacion is not None]
+        invalidas = len(operaciones) < len(lote)
+        resultado, error = None, None
+        if operaciones and not (todo_o_nada and invalidas):
+            try:
+                resultado = inv.aplicar_operaciones([o for _, o in operaciones], todo_o_nada)
+            except Exception as e:
+                error = f"Lote de las líneas {lote[0][0]}-{lote[-1][0]} revertido: {e}"
+        fallidas = {f["linea"]: f["motivo"] for f in resultado["fallidas"]} if resultado else {}
+        indice = {linea: i for i, (linea, _) in enumerate(operaciones)}
+        for linea, op, operacion, errores in lote:
+            salida = {"linea": linea, "op": op}
+            i = indice.get(linea)
+            if errores:
+                salida.update(ok=False, errores=errores)
+            elif error:
+                salida.update(ok=False, errores={"lote": [error]})
+            elif resultado is None:
+                salida.update(ok=False, errores={"lote": ["No aplicada: hay líneas inválidas en el lote (todo o nada)."]})
+            elif i in fallidas:
+                salida.update(ok=False, errores={"op": [fallidas[i]]})
+            elif resultado["ids"][i] is None:
+                salida.update(ok=False, errores={"lote": ["No aplicada: falló otra línea del lote (todo o nada)."]})
+            else:
+                salida.update(ok=True, id_producto=resultado["ids"][i])
+            yield salida
+        lote.clear()
+
+    for linea, fila in filas:
+        op = fila.get("op") if "__error__" not in fila else None
+        if op == "buscar":
+            yield from vaciar()
+            yield {"linea": linea, "op": op, "ok": True, **buscar(inv, fila)}
+            continue
+        operacion, errores = leer_operacion(inv, fila)
+        lote.append((linea, op, operacion, errores))
+        if len(lote) >= tamano_lote:
+            yield from vaciar()
+    if lote:
+        yield from vaciar()
+
+
+def escribir(resultado: Dict) -> str:
+    return json.dumps(resultado, ensure_ascii=False, default=str) + "\n"
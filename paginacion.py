@@ -0,0 +1,69 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right, insort
+from typing import List, Optional, Sequence, Tuple
+
+ORDENES = ("id", "-id", "nombre", "-nombre")
+
+
+def codificar_cursor(clave: Tuple) -> str:
+    crudo = json.dumps(list(clave), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valor = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode("utf-8"))
+        if not isinstance(valor, list) or not valor:
+            raise ValueError
+        return tuple(valor)
+    except Exception:
+        raise ValueError(f"Cursor inválido: {cursor!r}")
+
+
+def validar_orden(orden: str) -> Tuple[str, bool]:
+    if orden not in ORDENES:
+        raise ValueError(f"Orden no soportado: {orden!r} (use {', '.join(ORDENES)})")
+    return orden.lstrip("-"), orden.startswith("-")
+
+
+def pagina_de(claves: Sequence[Tuple], cursor: Optional[str], limit: int, descendente: bool) -> Tuple[List[Tuple], Optional[str]]:
+    # Búsqueda por clave (keyset): se salta directo a la posición del cursor con bisect,
+    # así la página N cuesta lo mismo que la primera.
+    clave = decodificar_cursor(cursor) if cursor else None
+    if clave is not None and claves and (len(clave) != len(claves[0]) or any(type(a) is not type(b) for a, b in zip(clave, claves[0]))):
+        raise ValueError(f"Cursor inválido para este orden: {cursor!r}")
+    if not descendente:
+        inicio = bisect_right(claves, clave) if clave is not None else 0
+        fin = min(inicio + limit, len(claves))
+        pagina = list(claves[inicio:fin])
+        hay_mas = fin < len(claves)
+    else:
+        fin = bisect_left(claves, clave) if clave is not None else len(claves)
+        inicio = max(fin - limit, 0)
+        pagina = list(reversed(claves[inicio:fin]))
+        hay_mas = inicio > 0
+    siguiente = codificar_cursor(pagina[-1]) if pagina and hay_mas else None
+    return pagina, siguiente
+
+
+class ClavesOrdenadas:
+    """Lista ordenada de claves (tuplas) mantenida incrementalmente."""
+
+    def __init__(self, claves=()):
+        self._claves: List[Tuple] = sorted(claves)
+
+    def __len__(self):
+        return len(self._claves)
+
+    def agregar(self, clave: Tuple):
+        insort(self._claves, clave)
+
+    def quitar(self, clave: Tuple):
+        i = bisect_left(self._claves, clave)
+        if i < len(self._claves) and self._claves[i] == clave:
+            del self._claves[i]
+
+    def pagina(self, cursor: Optional[str], limit: int, descendente: bool = False):
+        return pagina_de(self._claves, cursor, limit, descendente)
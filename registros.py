@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+import mmap
+import os
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Cada cuántas escrituras (por proceso) se revisa si hay que compactar el log
+COMPACTAR_CADA = 1000
+
+
+@contextmanager
+def bloqueo_archivo(path: Path):
+    # Bloqueo exclusivo entre procesos sobre un archivo .lock al lado del de datos
+    lock_path = path.with_name(path.name + ".lock")
+    with open(lock_path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RegistroJSONL:
+    """Registros JSON de solo anexado: una línea por objeto.
+
+    agregar() es O(1) (no relee el archivo) y se serializa entre workers con un lock de
+    archivo. Si un proceso muere a mitad de una línea, esa línea queda inválida: los
+    lectores la saltan y compactar() la elimina.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._escrituras = 0
+        self._lineas_cortadas = 0
+
+    def agregar(self, item: Dict):
+        linea = (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+        with bloqueo_archivo(self.path):
+            with open(self.path, "a+b") as f:
+                # Si la última línea quedó cortada, se aísla para no pegarle la nueva
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                        self._lineas_cortadas += 1
+                f.write(linea)
+        self._escrituras += 1
+        # Solo se reescribe el archivo si desde la última compactación apareció basura
+        if self._escrituras % COMPACTAR_CADA == 0 and self._lineas_cortadas:
+            self.compactar()
+            self._lineas_cortadas = 0
+
+    def iterar(self) -> Iterator[Dict]:
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for linea in f:
+                item = self._decodificar(linea)
+                if item is not None:
+                    yield item
+
+    @staticmethod
+    def _decodificar(linea: str):
+        linea = linea.strip()
+        if not linea:
+            return None
+        try:
+            item = json.loads(linea)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
+
+    def leer_pagina(self, pagina: int = 1, por_pagina: int = 50) -> Tuple[List[Dict], bool]:
+        # Devuelve (items, hay_mas) leyendo solo hasta el final de la página pedida
+        inicio = (max(pagina, 1) - 1) * por_pagina
+        items = []
+        for i, item in enumerate(self.iterar()):
+            if i < inicio:
+                continue
+            if len(items) == por_pagina:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def compactar(self) -> int:
+        # Reescribe el log sin líneas inválidas; el reemplazo es atómico (os.replace)
+        if not self.path.exists():
+            return 0
+        descartadas = 0
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with bloqueo_archivo(self.path):
+            with open(self.path, "r", encoding="utf-8", errors="replace") as origen, \
+                    open(tmp, "w", encoding="utf-8") as destino:
+                for linea in origen:
+                    item = self._decodificar(linea)
+                    if item is None:
+                        descartadas += bool(linea.strip())
+                        continue
+                    destino.write(json.dumps(item, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+        return descartadas
+
+    def migrar_desde_array(self, json_path: Path) -> int:
+        """Convierte una sola vez un archivo con un array JSON al formato JSON Lines.
+
+        El original se renombra a *.migrado para no volver a migrarlo.
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+        with bloqueo_archivo(self.path):
+            if not json_path.exists():
+                return 0
+            with open(json_path, "r", encoding="utf-8") as f:
+                try:
+                    data = json.load(f)
+                except Exception:
+                    data = []
+            with open(self.path, "a", encoding="utf-8") as f:
+                for item in data if isinstance(data, list) else []:
+                    if isinstance(item, dict):
+                        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            os.replace(json_path, json_path.with_name(json_path.name + ".migrado"))
+        return len(data) if isinstance(data, list) else 0
+
+
+class ArchivoIndexado:
+    """Archivo de texto de solo anexado con un índice de offsets al lado (<archivo>.idx).
+
+    El índice guarda, por cada registro, el offset donde termina (uint64). Con él se
+    salta directo a la página N o a los últimos N registros y se leen con mmap, sin
+    recorrer el archivo. Se mantiene al escribir con agregar() y, si el archivo creció
+    por otra vía, se completa desde el último offset indexado (nunca desde el principio).
+
+    En modo CSV un salto de línea dentro de comillas no cierra el registro.
+    """
+
+    def __init__(self, path: Path, es_csv: bool = False, cabecera: Optional[str] = None):
+        self.path = Path(path)
+        self.idx_path = self.path.with_name(self.path.name + ".idx")
+        self.es_csv = es_csv
+        self.cabecera = cabecera
+
+    def agregar(self, texto: str):
+        with bloqueo_archivo(self.path):
+            self._ponerse_al_dia()
+            with open(self.path, "a+b") as f:
+                datos = texto.encode("utf-8")
+                if f.seek(0, os.SEEK_END) == 0:
+                    if self.cabecera:
+                        datos = self.cabecera.encode("utf-8") + datos
+                else:
+                    # Si la última línea no terminó en salto, se cierra antes de anexar
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        datos = b"\n" + datos
+                f.write(datos)
+            self._ponerse_al_dia()
+
+    def _leer_fines(self, desde: int, cantidad: int) -> array:
+        fines = array("Q")
+        if cantidad <= 0:
+            return fines
+        with open(self.idx_path, "rb") as f:
+            f.seek(desde * 8)
+            fines.frombytes(f.read(cantidad * 8))
+        return fines
+
+    def _estado_indice(self) -> Tuple[int, int]:
+        # (registros indexados, offset indexado hasta)
+        if not self.idx_path.exists():
+            return 0, 0
+        tamano = self.idx_path.stat().st_size
+        if tamano % 8:
+            # Escritura del índice a medias: se descarta el último valor incompleto
+            with open(self.idx_path, "r+b") as f:
+                f.truncate(tamano - tamano % 8)
+            tamano -= tamano % 8
+        total = tamano // 8
+        return total, (self._leer_fines(total - 1, 1)[0] if total else 0)
+
+    def _ponerse_al_dia(self) -> int:
+        total, hasta = self._estado_indice()
+        tamano = self.path.stat().st_size if self.path.exists() else 0
+        if tamano < hasta:
+            # El archivo se reescribió o truncó: el índice ya no sirve
+            self.idx_path.unlink()
+            total, hasta = 0, 0
+        if tamano == hasta:
+            return total
+        nuevos = array("Q")
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            inicio = hasta
+            pos = hasta
+            while True:
+                salto = m.find(b"\n", pos)
+                if salto == -1:
+                    break
+                # En CSV, un número impar de comillas indica que el salto está dentro de un campo
+                if self.es_csv and m[inicio:salto].count(b'"') % 2:
+                    pos = salto + 1
+                    continue
+                nuevos.append(salto + 1)
+                inicio = pos = salto + 1
+        with open(self.idx_path, "ab") as f:
+            nuevos.tofile(f)
+        return total + len(nuevos)
+
+    def total(self) -> int:
+        with bloqueo_archivo(self.path):
+            total = self._ponerse_al_dia()
+        return total - (1 if self.cabecera and total else 0)
+
+    def _leer(self, desde: int, cantidad: int) -> List[str]:
+        # desde/cantidad en registros de datos (sin contar la cabecera)
+        if cantidad <= 0:
+            return []
+        if self.cabecera:
+            desde += 1
+        if desde:
+            fines = self._leer_fines(desde - 1, cantidad + 1)
+        else:
+            fines = array("Q", [0]) + self._leer_fines(0, cantidad)
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            crudos = [m[a:b].decode("utf-8", errors="replace") for a, b in zip(fines, fines[1:])]
+        if self.es_csv:
+            return [", ".join(fila) for fila in csv.reader(io.StringIO("".join(crudos)))]
+        return [linea.strip() for linea in crudos]
+
+    def leer_pagina(self, pagina: int = 1, por_pagina: int = 50) -> Tuple[List[str], bool]:
+        total = self.total()
+        desde = (max(pagina, 1) - 1) * por_pagina
+        cantidad = max(min(por_pagina, total - desde), 0)
+        return self._leer(desde, cantidad), desde + cantidad < total
+
+    def ultimas(self, n: int) -> List[str]:
+        total = self.total()
+        n = min(n, total)
+        return self._leer(total - n, n)
@@ -0,0 +1,78 @@
+import threading
+from bisect import bisect_left, insort
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+# Las mismas franjas que colorea inventario.html: > 5 verde, > 0 amarillo, 0 rojo
+STOCK_BAJO = 5
+BANDAS = ("suficiente", "bajo", "agotado")
+
+
+def banda(stock: int) -> str:
+    if stock > STOCK_BAJO:
+        return "suficiente"
+    return "bajo" if stock > 0 else "agotado"
+
+
+def centimos(precio) -> int:
+    # El valor se acumula en céntimos enteros: sumar y restar floats en cada cambio acumula error
+    return int((Decimal(str(precio)) * 100).to_integral_value())
+
+
+class ResumenInventario:
+    """Totales del inventario mantenidos incrementalmente en cada alta, baja o cambio.
+
+    Inventario quita la versión anterior de un producto y agrega la nueva; consultar los
+    totales no recorre el catálogo. Guarda también, ordenados por (stock, id), los productos
+    con stock <= STOCK_BAJO.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.construir(())
+
+    def construir(self, productos):
+        with self._lock:
+            self._productos = 0
+            self._unidades = 0
+            self._valor = 0
+            self._bandas: Dict[str, int] = dict.fromkeys(BANDAS, 0)
+            self._bajo_stock: List[Tuple[int, int]] = []
+        for producto in productos:
+            self.agregar(producto)
+
+    def agregar(self, producto):
+        with self._lock:
+            self._productos += 1
+            self._unidades += producto.stock
+            self._valor += centimos(producto.precio) * producto.stock
+            self._bandas[banda(producto.stock)] += 1
+            if producto.stock <= STOCK_BAJO:
+                insort(self._bajo_stock, (producto.stock, producto.id_producto))
+
+    def quitar(self, producto):
+        with self._lock:
+            self._productos -= 1
+            self._unidades -= producto.stock
+            self._valor -= centimos(producto.precio) * producto.stock
+            self._bandas[banda(producto.stock)] -= 1
+            if producto.stock <= STOCK_BAJO:
+                clave = (producto.stock, producto.id_producto)
+                i = bisect_left(self._bajo_stock, clave)
+                if i < len(self._bajo_stock) and self._bajo_stock[i] == clave:
+                    del self._bajo_stock[i]
+
+    def totales(self) -> Dict:
+        with self._lock:
+            return {
+                "productos": self._productos,
+                "unidades": self._unidades,
+                "valor": self._valor / 100,
+                "bandas": dict(self._bandas),
+                "bajo_stock": len(self._bajo_stock),
+            }
+
+    def bajo_stock(self, limite: int = 20) -> List[Tuple[int, int]]:
+        # (stock, id_producto) de menor a mayor stock; primero los agotados
+        with self._lock:
+            return self._bajo_stock[:limite]